@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, g, request, jsonify, render_template, stream_with_context, url_for
 from flask_cors import CORS
 import rsa
 import base64
@@ -6,7 +6,35 @@ import re
 import os
 from io import StringIO
 from werkzeug.utils import secure_filename
+import hashlib
 import logging
+import threading
+import uuid
+
+from utils import backend, emoji_codec, prepared_key
+from utils.blocks import BlockLimitError, block_count
+from utils.compression import CHOICES as COMPRESSION_CHOICES, DecompressionError
+from utils.crypto import decrypt_bytes, decrypt_many, encrypt_bytes
+from utils.idempotency import IdempotencyCache, IdempotencyConflict
+from utils.jobs import JobManager, MemoryJobStore, SQLiteJobStore
+from utils.key_cache import KeyCache, key_fingerprint
+from utils.key_check import check_key_pair, pair_fingerprint
+from utils.key_pool import KeyPairPool, PoolTimeout, parse_targets
+from utils.key_store import KeyStore
+from utils.metrics import NOOP_TIMER, MetricsRegistry
+from utils.rate_limit import (
+    REFERENCE_BITS, MemoryBucketStore, RateLimiter, SQLiteBucketStore, estimate_bits, key_cost, keygen_cost
+)
+from utils.signing import DEFAULT_HASH, SIGNATURE_HASHES, SignatureVerifier, sign_hash
+from utils.static_cache import CachedBody, StaticFiles, cached_response
+from utils.streaming import StreamDecryptor, encrypt_stream
+from utils.structured_log import ensure_listener, parse_levels, route_logger, setup_logging
+from utils.transport import (
+    BINARY_MIMETYPE, TEXT_FORMATS, accepts_binary, decode_ciphertext, encode_ciphertext,
+    input_format, is_binary_body, output_format
+)
+from utils.ttl_cache import TTLCache
+from utils.workers import CryptoWorkerPool, PoolSaturated
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})  # Enable CORS for all routes and origins
@@ -14,28 +42,132 @@ CORS(app, resources={r"/*": {"origins": "*"}})  # Enable CORS for all routes and
 # =============================================
 # Configuration
 # =============================================
-MAX_MESSAGE_LENGTH = 1000  # characters
+MAX_MESSAGE_LENGTH = 4 * 1024 * 1024  # bytes of UTF-8; longer than one RSA block is sent as an envelope or blocks
+ENCRYPTION_MODES = {'auto', 'rsa', 'envelope', 'blocks'}
+ENCRYPTION_MODE_DEFAULT = os.environ.get('ENCRYPTION_MODE', 'auto')  # 'blocks' keeps long messages pure RSA
+MAX_RSA_BLOCKS = int(os.environ.get('MAX_RSA_BLOCKS', 1024))  # blocks per multi-block ciphertext
+# Compression is opt-in: it changes the plaintext inside the ciphertext,
+# which plain PKCS#1 clients cannot undo, and leaks through its length
+COMPRESSION_DEFAULT = os.environ.get('COMPRESSION', 'none')
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 1000))  # items per batch request
+MAX_VERIFY_BATCH_SIZE = int(os.environ.get('MAX_VERIFY_BATCH_SIZE', 10000))  # signatures per /verify/batch
 ALLOWED_EXTENSIONS = {'pem', 'key'}
-EMOJI_MAPPING = [
-    "😀", "😃", "😄", "😁", "😆", "😅", "😂", "🤣", "😊", "😇",
-    "🙂", "🙃", "😉", "😌", "😍", "🥰", "😘", "😗", "😙", "😚",
-    "😋", "😛", "😝", "😜", "🤪", "🤨", "🧐", "🤓", "😎", "🥸",
-    "🤩", "🥳", "😏", "😒", "😞", "😔", "😟", "😕", "🙁", "☹️",
-    "😣", "😖", "😫", "😩", "🥺", "😢", "😭", "😤", "😠", "😡",
-    "🤬", "🤯", "😳", "🥵", "🥶", "😱", "😨", "😰", "😥", "😓",
-    "🫣", "🤗", "🫡", "🤔", "🫢", "🤭", "🤫", "🤥", "😶"
-]
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('app.log'),
-        logging.StreamHandler()
-    ]
+FILE_CHUNK_SIZE = int(os.environ.get('FILE_CHUNK_SIZE', 64 * 1024))  # bytes per streamed frame
+KEY_CACHE_MAX_ENTRIES = int(os.environ.get('KEY_CACHE_MAX_ENTRIES', 1024))
+KEY_CACHE_TTL = int(os.environ.get('KEY_CACHE_TTL', 3600))  # seconds
+KEY_STORE_PATH = os.environ.get('KEY_STORE_PATH', os.path.join('user_keys', 'keys.db'))
+KEY_STORE_CACHE_SIZE = int(os.environ.get('KEY_STORE_CACHE_SIZE', 1024))  # parsed keys kept in memory
+VALIDATION_MODES = {'fast', 'full'}
+VALIDATION_CACHE_MAX_ENTRIES = int(os.environ.get('VALIDATION_CACHE_MAX_ENTRIES', 4096))
+VALIDATION_CACHE_TTL = int(os.environ.get('VALIDATION_CACHE_TTL', 3600))  # seconds
+
+RSA_WORKERS = int(os.environ.get('RSA_WORKERS', os.cpu_count() or 1))  # 0 runs private-key ops inline
+RSA_WORKER_QUEUE = int(os.environ.get('RSA_WORKER_QUEUE', 0)) or None  # defaults to 4 per worker
+RSA_WORKER_RETRY_AFTER = int(os.environ.get('RSA_WORKER_RETRY_AFTER', 1))  # seconds
+KEY_POOL_TARGETS = parse_targets(os.environ.get('KEY_POOL_TARGETS', '2048:4,3072:2,4096:2'))
+KEY_POOL_WORKERS = int(os.environ.get('KEY_POOL_WORKERS', max((os.cpu_count() or 1) // 2, 1)))
+KEY_POOL_WAIT_TIMEOUT = int(os.environ.get('KEY_POOL_WAIT_TIMEOUT', 300))  # seconds
+KEYGEN_MAX_CONCURRENT = int(os.environ.get('KEYGEN_MAX_CONCURRENT', 4))  # /keys/generate requests at once
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+RATE_LIMIT_RATE = float(os.environ.get('RATE_LIMIT_RATE', 5))  # tokens/second; a 2048-bit private-key op costs 1
+RATE_LIMIT_BURST = float(os.environ.get('RATE_LIMIT_BURST', 20))
+RATE_LIMIT_STORE_PATH = os.environ.get('RATE_LIMIT_STORE_PATH')  # SQLite file shared by workers; in memory when unset
+RATE_LIMIT_API_KEYS = os.environ.get('RATE_LIMIT_API_KEYS', '')  # comma-separated X-API-Key values with their own buckets
+JOB_TYPES = {'encrypt', 'decrypt', 'keygen'}
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_QUEUE = int(os.environ.get('JOB_QUEUE', 0)) or None  # defaults to 16 per worker
+JOB_TTL = int(os.environ.get('JOB_TTL', 3600))  # seconds a job's result is kept
+JOB_STORE_PATH = os.environ.get('JOB_STORE_PATH')  # SQLite file; jobs stay in memory when unset
+JOB_MAX_WAIT = int(os.environ.get('JOB_MAX_WAIT', 30))  # longest long-poll in seconds
+STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', 365 * 24 * 3600))  # seconds for content-hashed URLs
+PAGE_TEMPLATES = ('index.html', 'encrypt.html', 'decrypt.html')
+IDEMPOTENCY_MAX_ENTRIES = int(os.environ.get('IDEMPOTENCY_MAX_ENTRIES', 10000))  # responses kept in memory
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 24 * 3600))  # seconds a response can be replayed
+IDEMPOTENCY_SPILL_PATH = os.environ.get('IDEMPOTENCY_SPILL_PATH')  # SQLite file for entries evicted from memory
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+# Parsed keys registered through /keys, addressed by opaque handles
+key_cache = KeyCache(max_entries=KEY_CACHE_MAX_ENTRIES, ttl=KEY_CACHE_TTL)
+
+# Persistent keys addressed by key id
+key_store = KeyStore(KEY_STORE_PATH, cache_size=KEY_STORE_CACHE_SIZE)
+
+# Fast /validate_keys results, keyed by a fingerprint of both PEMs
+validation_cache = TTLCache(max_entries=VALIDATION_CACHE_MAX_ENTRIES, ttl=VALIDATION_CACHE_TTL)
+
+# /encrypt responses replayed for retries carrying the same Idempotency-Key
+idempotency_cache = IdempotencyCache(
+    max_entries=IDEMPOTENCY_MAX_ENTRIES,
+    ttl=IDEMPOTENCY_TTL,
+    spill_path=IDEMPOTENCY_SPILL_PATH
+)
+
+# Static files with their hashes and compressed variants, read once
+static_files = StaticFiles(app.static_folder)
+
+# Rendered page templates, keyed by (template, script root)
+rendered_pages = {}
+
+# Private-key operations run here, off the request thread
+worker_pool = CryptoWorkerPool(
+    workers=RSA_WORKERS,
+    max_pending=RSA_WORKER_QUEUE,
+    retry_after=RSA_WORKER_RETRY_AFTER
 )
 
+# Pre-generated key pairs for /keys/generate, refilled in the background.
+# An empty pool holds a request until a pair is ready, so only a few may
+# be in /keys/generate at once.
+key_pool = KeyPairPool(targets=KEY_POOL_TARGETS, workers=KEY_POOL_WORKERS)
+keygen_slots = threading.BoundedSemaphore(KEYGEN_MAX_CONCURRENT)
+
+# Slow encrypt/decrypt/keygen requests submitted through /jobs
+job_manager = JobManager(
+    store=SQLiteJobStore(JOB_STORE_PATH, ttl=JOB_TTL) if JOB_STORE_PATH else MemoryJobStore(ttl=JOB_TTL),
+    workers=JOB_WORKERS,
+    max_pending=JOB_QUEUE,
+    retry_after=RSA_WORKER_RETRY_AFTER
+)
+
+# Per-client token buckets in front of the private-key endpoints. Only
+# allowlisted API keys get a bucket of their own; anything else a client
+# could rotate freely, so other requests are keyed by address.
+rate_limit_api_keys = {
+    hashlib.sha256(api_key.strip().encode()).hexdigest()[:32]
+    for api_key in RATE_LIMIT_API_KEYS.split(',') if api_key.strip()
+}
+rate_limiter = RateLimiter(
+    rate=RATE_LIMIT_RATE,
+    burst=RATE_LIMIT_BURST,
+    store=SQLiteBucketStore(RATE_LIMIT_STORE_PATH) if RATE_LIMIT_STORE_PATH else MemoryBucketStore()
+) if RATE_LIMIT_ENABLED else None
+
+# Per-stage latency histograms and service gauges served at /metrics
+metrics = MetricsRegistry(enabled=os.environ.get('METRICS_ENABLED', '1') == '1')
+
+# Configure logging: JSON lines written by a background thread, with
+# rotation. Plaintext is never logged, only sizes and outcomes.
+log_listener = setup_logging(
+    path=os.environ.get('LOG_FILE', 'app.log'),  # empty logs to stdout only
+    level=os.environ.get('LOG_LEVEL', 'INFO'),
+    max_bytes=int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024)),
+    backup_count=int(os.environ.get('LOG_BACKUP_COUNT', 5)),
+    rotate_when=os.environ.get('LOG_ROTATE_WHEN'),  # e.g. 'midnight' for time-based rotation
+    route_levels=parse_levels(os.environ.get('LOG_ROUTE_LEVELS', ''))  # e.g. 'decrypt=WARNING'
+)
+logging.info('RSA arithmetic backend selected', extra={'backend': backend.name})
+encrypt_log = route_logger('encrypt')
+decrypt_log = route_logger('decrypt')
+encrypt_batch_log = route_logger('encrypt_batch')
+decrypt_batch_log = route_logger('decrypt_batch')
+encrypt_file_log = route_logger('encrypt_file')
+decrypt_file_log = route_logger('decrypt_file')
+sign_log = route_logger('sign')
+verify_log = route_logger('verify')
+verify_batch_log = route_logger('verify_batch')
+keys_log = route_logger('keys')
+jobs_log = route_logger('jobs')
+
 # =============================================
 # Helper Functions
 # =============================================
@@ -83,17 +215,335 @@ def validate_rsa_key(key_str, is_private=False):
                 return False, f"Invalid public key format: {str(e)}"
             
     except Exception as e:
-        logging.error(f"Key validation error: {str(e)}")
+        keys_log.error(f"Key validation error: {str(e)}")
         return False, f"Key validation error: {str(e)}"
 
+def get_request_data():
+    """Return the request payload from a JSON body, form fields or query string
+
+    Requests with a raw octet-stream body pass their options (key handle,
+    format, mode) in the query string. Returns a (data, error) tuple; a
+    JSON body must be an object.
+    """
+    data = request.get_json(silent=True)
+    if data is not None and not isinstance(data, dict):
+        return None, 'JSON body must be an object'
+    if not data:
+        return request.values, None
+    return data, None
+
+def resolve_key(data, kind):
+    """Load a 'public' or 'private' key from a PEM field, key handle or key id
+
+    Only public keys can be looked up by key id. PEM keys are refused in
+    the query string, which ends up in access logs, proxy logs and browser
+    history; there only handles and key ids are accepted. Returns a
+    (key, error) tuple where exactly one of the two is None.
+    """
+    if f'{kind}_key' in request.args:
+        return None, f'Do not send the {kind} key in the query string; register it with /keys and pass {kind}_key_handle'
+    key_id = data.get('public_key_id') if kind == 'public' else None
+    if key_id:
+        if not isinstance(key_id, str):
+            return None, 'Key id must be a string'
+        key = key_store.get(key_id, 'public')
+        if key is None:
+            return None, 'Unknown key id'
+        return key, None
+
+    handle = data.get(f'{kind}_key_handle')
+    if handle:
+        if not isinstance(handle, str):
+            return None, 'Key handle must be a string'
+        entry = key_cache.get(handle, kind)
+        if entry is None:
+            return None, 'Unknown or expired key handle'
+        return entry.key, None
+
+    key_str = data.get(f'{kind}_key')
+    if not key_str:
+        return None, f'Missing {kind} key'
+    if not isinstance(key_str, str):
+        return None, f'The {kind} key must be a PEM string'
+    key_class = rsa.PrivateKey if kind == 'private' else rsa.PublicKey
+    try:
+        return key_class.load_pkcs1(key_str.strip().encode()), None
+    except Exception:
+        return None, f'Invalid {kind} key format'
+
+def start_request_timer(route):
+    """Start timing a request's stages; recorded by record_request_metrics"""
+    timer = metrics.request_timer(route)
+    g.request_timer = timer
+    return timer
+
+# Service stats that only ever grow, exported as counters
+COUNTER_STATS = {
+    'hits', 'misses', 'evictions', 'expirations', 'cache_hits', 'cache_misses', 'completed',
+    'submitted', 'rejected', 'admitted', 'served', 'empty_hits', 'spilled', 'replays', 'conflicts',
+}
+
+def stat_samples(prefix, stats, labels=None):
+    """Metric samples for a stats() dict, typing monotonic values as counters"""
+    for name, value in stats.items():
+        if name in COUNTER_STATS:
+            yield f'{prefix}_{name}_total', labels or {}, value, 'counter'
+        else:
+            yield f'{prefix}_{name}', labels or {}, value, 'gauge'
+
+def collect_service_gauges():
+    """Samples for the caches, worker and job pools and key pair pool"""
+    yield 'rsa_backend_info', {'backend': backend.name}, 1
+    yield from stat_samples('rsa_key_cache', key_cache.stats())
+    yield from stat_samples('rsa_key_store', key_store.stats())
+    yield from stat_samples('rsa_validation_cache', validation_cache.stats())
+    yield from stat_samples('rsa_idempotency_cache', idempotency_cache.stats())
+    yield from stat_samples('rsa_worker_pool', worker_pool.stats())
+    yield from stat_samples('rsa_jobs', job_manager.stats())
+    if rate_limiter is not None:
+        yield from stat_samples('rsa_rate_limit', rate_limiter.stats())
+    for key_size, stats in key_pool.stats().items():
+        yield from stat_samples('rsa_key_pool', stats, {'key_size': key_size})
+
+metrics.register_collector(collect_service_gauges)
+
+def private_decrypt(data, priv_key):
+    """Run a single RSA block decryption on the worker pool
+
+    Each process keeps prepared keys (CRT values and blinding pair) for
+    the private keys it has seen, so repeat decryptions skip that setup.
+    """
+    return worker_pool.run(prepared_key.decrypt, data, priv_key)
+
+def client_id():
+    """Identify the client for rate limiting by allowlisted API key, else by address"""
+    api_key = request.headers.get('X-API-Key')
+    if api_key:
+        digest = hashlib.sha256(api_key.encode()).hexdigest()[:32]
+        if digest in rate_limit_api_keys:
+            return 'key:' + digest
+    return f'ip:{request.remote_addr}'
+
+def estimate_key_bits(data, kind):
+    """Estimate a request's key size without parsing any PEM"""
+    handle = data.get(f'{kind}_key_handle')
+    if isinstance(handle, str) and handle:
+        entry = key_cache.peek(handle)
+        return entry.bits if entry is not None else REFERENCE_BITS
+    key_str = data.get(f'{kind}_key')
+    if isinstance(key_str, str) and key_str:
+        return estimate_bits(key_str.strip(), kind)
+    return REFERENCE_BITS
+
+def ciphertext_blocks(encrypted_text, private_key_data, fmt):
+    """Private-key operations a ciphertext needs: one per block of a container"""
+    if not isinstance(encrypted_text, str):
+        return 1
+    try:
+        encrypted_bytes = decode_ciphertext(encrypted_text, fmt)
+    except (TypeError, ValueError):
+        return 1
+    return min(block_count(encrypted_bytes, private_key_data) or 1, MAX_RSA_BLOCKS)
+
+def admit_request(route, data, count=1, cost=None):
+    """Charge the client for count private-key operations, or for cost tokens
+
+    Returns a 429 response when the client is over its limit, else None.
+    """
+    if rate_limiter is None:
+        return None
+    if cost is None:
+        cost = count * key_cost(estimate_key_bits(data, 'private'))
+    allowed, retry_after = rate_limiter.admit(client_id(), cost)
+    if allowed:
+        return None
+    metrics.inc('rsa_rate_limited_total', route=route)
+    response = jsonify({'error': 'Rate limit exceeded, please retry later'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def encrypt_request_digest(message_bytes, mode, compression, fmt):
+    """Digest of everything besides the key that shapes an /encrypt response"""
+    digest = hashlib.sha256(f'{mode}\0{compression}\0{fmt}\0'.encode())
+    digest.update(message_bytes)
+    return digest.hexdigest()
+
+def replayed_response(stored):
+    """Rebuild a response kept in the idempotency cache"""
+    body, content_type = stored
+    response = Response(body, content_type=content_type)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def busy_response(e):
+    """Build the 503 returned when the worker pool is saturated"""
+    response = jsonify({'error': 'Server is busy, please retry later'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
 def bytes_to_emojis(data):
     """Convert bytes to emoji sequence"""
-    return ''.join([EMOJI_MAPPING[b % len(EMOJI_MAPPING)] for b in data])
+    return emoji_codec.encode(data)
 
 def emojis_to_bytes(emoji_str):
-    """Convert emoji sequence back to bytes"""
-    emoji_map = {e: i for i, e in enumerate(EMOJI_MAPPING)}
-    return bytes([emoji_map[e] for e in emoji_str if e in emoji_map])
+    """Convert emoji sequence back to bytes, raising ValueError on unknown symbols"""
+    return emoji_codec.decode(emoji_str)
+
+def get_compression(data):
+    """Return (compression, error) for a request's compression field"""
+    compression = data.get('compression', COMPRESSION_DEFAULT)
+    if compression not in COMPRESSION_CHOICES:
+        return None, f"Compression must be one of: {', '.join(COMPRESSION_CHOICES)}"
+    return compression, None
+
+def encrypt_item(message, public_key_data, mode=ENCRYPTION_MODE_DEFAULT, fmt='emoji', compression=COMPRESSION_DEFAULT):
+    """Encrypt one batch message, returning a result or error dict"""
+    if not isinstance(message, str):
+        return {'error': 'Message must be a string'}
+    message_bytes = message.encode('utf-8')
+    if len(message_bytes) > MAX_MESSAGE_LENGTH:
+        return {'error': f'Message exceeds {MAX_MESSAGE_LENGTH} bytes'}
+    try:
+        encrypted_bytes = encrypt_bytes(message_bytes, public_key_data, mode, compression, MAX_RSA_BLOCKS)
+        return {'encrypted_text': encode_ciphertext(encrypted_bytes, fmt)}
+    except OverflowError:
+        return {'error': 'Message is too long for a single RSA block; use envelope mode'}
+    except BlockLimitError as e:
+        return {'error': str(e)}
+    except Exception as e:
+        return {'error': f'Encryption failed: {str(e)}'}
+
+def decode_item(encrypted_text, fmt):
+    """Return (ciphertext bytes, error dict) for one batch ciphertext"""
+    if not isinstance(encrypted_text, str):
+        return None, {'error': 'Encrypted text must be a string'}
+    try:
+        return decode_ciphertext(encrypted_text, fmt), None
+    except ValueError as e:
+        return None, {'error': f'Invalid {fmt} sequence: {str(e)}'}
+
+def decrypted_item(plaintext, error=None):
+    """Build a batch result dict from a plaintext or the exception raised instead"""
+    if error is None:
+        try:
+            return {'decrypted_text': plaintext.decode('utf-8')}
+        except UnicodeDecodeError:
+            return {'error': 'Decrypted data is not valid UTF-8 text'}
+    if isinstance(error, rsa.pkcs1.DecryptionError):
+        return {'error': 'The private key does not match the public key used for encryption'}
+    if isinstance(error, BlockLimitError):
+        return {'error': str(error)}
+    if isinstance(error, DecompressionError):
+        return {'error': f'Invalid compressed payload: {str(error)}'}
+    return {'error': f'Decryption failed: {str(error)}'}
+
+def decrypt_item(encrypted_text, private_key_data, fmt='emoji'):
+    """Decrypt one ciphertext, returning a result or error dict"""
+    encrypted_bytes, error = decode_item(encrypted_text, fmt)
+    if error:
+        return error
+    try:
+        decrypted_bytes = decrypt_bytes(encrypted_bytes, private_key_data, private_decrypt, MAX_MESSAGE_LENGTH,
+                                        worker_pool, MAX_RSA_BLOCKS)
+    except PoolSaturated:
+        raise
+    except Exception as e:
+        return decrypted_item(None, e)
+    return decrypted_item(decrypted_bytes)
+
+def decrypt_items(encrypted_texts, private_key_data, fmt='emoji'):
+    """Decrypt batch ciphertexts in parallel, returning a result or error dict each
+
+    Items are split into contiguous groups, one per worker but never more
+    than the pool has free slots, and the groups run together through
+    worker_pool.run_all. Raises PoolSaturated when no slot is free.
+    """
+    results = [None] * len(encrypted_texts)
+    pending = []
+    for index, encrypted_text in enumerate(encrypted_texts):
+        encrypted_bytes, error = decode_item(encrypted_text, fmt)
+        if error:
+            results[index] = error
+        else:
+            pending.append((index, encrypted_bytes))
+    if not pending:
+        return results
+
+    groups = max(1, min(worker_pool.workers, worker_pool.available(), len(pending)))
+    size = -(-len(pending) // groups)
+    chunks = [pending[start:start + size] for start in range(0, len(pending), size)]
+    outcomes = worker_pool.run_all(decrypt_many, [
+        ([encrypted_bytes for _, encrypted_bytes in chunk], private_key_data, MAX_MESSAGE_LENGTH, MAX_RSA_BLOCKS)
+        for chunk in chunks
+    ])
+    for chunk, outcome in zip(chunks, outcomes):
+        for (index, _), (plaintext, error) in zip(chunk, outcome):
+            results[index] = decrypted_item(plaintext, error)
+    return results
+
+def key_pair_response(pub_key, priv_key, key_size, pooled, register=False, store=False):
+    """Build the JSON body describing a newly issued key pair
+
+    With store the pair is saved in the key store and its key id returned.
+    """
+    response = {
+        'public_key': pub_key.save_pkcs1().decode(),
+        'private_key': priv_key.save_pkcs1().decode(),
+        'key_size': key_size,
+        'pooled': pooled,
+    }
+    if register:
+        response['public_key_handle'] = key_cache.register(pub_key).handle
+        response['private_key_handle'] = key_cache.register(priv_key).handle
+    if store:
+        response['key_id'] = uuid.uuid4().hex
+        key_store.put(response['key_id'], pub_key, priv_key)
+    return response
+
+def get_flag(data, field):
+    """Return (value, error) for an optional true/false field
+
+    Form and query values arrive as strings, so 'false', '0', 'no' and
+    'off' must count as false rather than as non-empty strings.
+    """
+    value = data.get(field)
+    if value is None or isinstance(value, bool):
+        return bool(value), None
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value), None
+    if isinstance(value, str):
+        if value.strip().lower() in ('1', 'true', 'yes', 'on'):
+            return True, None
+        if value.strip().lower() in ('', '0', 'false', 'no', 'off'):
+            return False, None
+    return None, f"'{field}' must be true or false"
+
+def get_batch_items(data, field, max_items=MAX_BATCH_SIZE):
+    """Return (items, error) for a batch request's list field"""
+    items = data.get(field)
+    if not isinstance(items, list):
+        return None, f"'{field}' must be a list"
+    if len(items) > max_items:
+        return None, f'Batch exceeds {max_items} items'
+    return items, None
+
+def verify_item(verifier, item, fmt):
+    """Verify one /verify/batch item, returning a result or error dict"""
+    if not isinstance(item, dict):
+        return {'error': 'Item must be an object with message and signature'}
+    message, signature = item.get('message'), item.get('signature')
+    if not isinstance(message, str) or not isinstance(signature, str):
+        return {'error': 'Message and signature must be strings'}
+    try:
+        signature_bytes = decode_ciphertext(signature, fmt)
+    except ValueError as e:
+        return {'error': f'Invalid {fmt} sequence: {str(e)}'}
+    try:
+        return {'valid': True, 'hash': verifier.verify(message.encode('utf-8'), signature_bytes)}
+    except rsa.pkcs1.VerificationError:
+        return {'valid': False, 'hash': None}
 
 def sanitize_input(text, max_length):
     """Sanitize and validate user input"""
@@ -104,38 +554,109 @@ def sanitize_input(text, max_length):
         return None
     return text
 
-def validate_key_pair(public_key_str, private_key_str):
-    """Validate that the public and private keys form a valid pair"""
+def validate_key_pair(public_key_str, private_key_str, timer=NOOP_TIMER, mode='fast'):
+    """Validate that the public and private keys form a valid pair
+
+    The fast mode checks the private key's components against the public
+    key arithmetically and memoizes the result. The full mode also runs an
+    encrypt/decrypt round trip through the worker pool.
+    """
     try:
         # Clean up the keys
         public_key_str = public_key_str.strip()
         private_key_str = private_key_str.strip()
+
+        if mode == 'fast':
+            fingerprint = pair_fingerprint(public_key_str, private_key_str)
+            cached = validation_cache.get(fingerprint)
+            if cached is not None:
+                return cached
         
         # Load the keys
         try:
-            pub_key = rsa.PublicKey.load_pkcs1(public_key_str.encode())
-            priv_key = rsa.PrivateKey.load_pkcs1(private_key_str.encode())
+            with timer.stage('key_load'):
+                pub_key = rsa.PublicKey.load_pkcs1(public_key_str.encode())
+                priv_key = rsa.PrivateKey.load_pkcs1(private_key_str.encode())
         except Exception as e:
             return False, f"Failed to load keys: {str(e)}"
+        timer.key_size = pub_key.n.bit_length()
         
         # Verify they are a pair by checking their modulus (n)
         if pub_key.n != priv_key.n:
             return False, "Keys do not form a valid pair"
+
+        with timer.stage('check'):
+            result = check_key_pair(pub_key, priv_key)
+        if mode == 'fast':
+            validation_cache.set(fingerprint, result)
+            return result
+        if not result[0]:
+            return result
         
         # Test encryption/decryption with a small message
         test_message = "test"
         try:
-            encrypted = rsa.encrypt(test_message.encode(), pub_key)
-            decrypted = rsa.decrypt(encrypted, priv_key).decode()
+            with timer.stage('rsa'):
+                encrypted = rsa.encrypt(test_message.encode(), pub_key)
+                decrypted = private_decrypt(encrypted, priv_key).decode()
             if decrypted != test_message:
                 return False, "Key pair validation failed"
+        except PoolSaturated:
+            raise
         except Exception as e:
             return False, f"Key pair test failed: {str(e)}"
         
         return True, "Keys are valid and form a pair"
+    except PoolSaturated:
+        raise
     except Exception as e:
         return False, f"Key validation error: {str(e)}"
 
+def render_page(template):
+    """Serve a page template rendered once and held in memory
+
+    The templates have no per-request content, so after the first render
+    every hit is served from memory, or with a 304 when unchanged. Debug
+    mode renders on every request so template edits show up.
+    """
+    if app.debug:
+        return render_template(template)
+    key = (template, request.script_root)
+    page = rendered_pages.get(key)
+    if page is None:
+        page = CachedBody(render_template(template).encode('utf-8'), 'text/html; charset=utf-8')
+        rendered_pages[key] = page
+    # Pages keep their URLs, so clients revalidate each time
+    return cached_response(page, request, 'no-cache')
+
+def prerender_pages():
+    """Render every page template ahead of the first request"""
+    with app.test_request_context():
+        for template in PAGE_TEMPLATES:
+            render_page(template)
+
+@app.url_defaults
+def static_url_version(endpoint, values):
+    """Add the content hash to static URLs so they can be cached for good"""
+    if endpoint == 'static' and 'v' not in values:
+        version = static_files.version(values.get('filename', ''))
+        if version:
+            values['v'] = version
+
+def serve_static(filename):
+    """Serve a static file from memory, replacing Flask's static view"""
+    cached = static_files.get(filename)
+    if cached is None or app.debug:
+        return app.send_static_file(filename)
+    if request.args.get('v') == cached.version:
+        cache_control = f'public, max-age={STATIC_MAX_AGE}, immutable'
+    else:
+        # Unversioned or stale URL: the content behind it may change
+        cache_control = 'no-cache'
+    return cached_response(cached, request, cache_control)
+
+app.view_functions['static'] = serve_static
+
 # =============================================
 # Routes
 # =============================================
@@ -143,125 +664,735 @@ def validate_key_pair(public_key_str, private_key_str):
 @app.route('/')
 def home():
     """Render the main interface"""
-    return render_template('index.html')
+    return render_page('index.html')
 
 @app.route('/encrypt')
 def encrypt_page():
     """Render the encryption page"""
-    return render_template('encrypt.html')
+    return render_page('encrypt.html')
 
 @app.route('/decrypt')
 def decrypt_page():
     """Render the decryption page"""
-    return render_template('decrypt.html')
+    return render_page('decrypt.html')
 
 @app.route('/encrypt', methods=['POST'])
 def encrypt():
+    timer = start_request_timer('encrypt')
     try:
-        message = request.form['message']
-        public_key = request.form['public_key']
+        with timer.stage('parse'):
+            data, error = get_request_data()
+            if error:
+                return jsonify({'error': error}), 400
+            if is_binary_body(request):
+                # Raw octet-stream body: the body is the message itself
+                message_bytes = request.get_data()
+            else:
+                message = data.get('message')
+                if message is None:
+                    return jsonify({'error': 'Missing message'}), 400
+                if not isinstance(message, str):
+                    return jsonify({'error': 'Message must be a string'}), 400
+                message_bytes = message.encode('utf-8')
+            if len(message_bytes) > MAX_MESSAGE_LENGTH:
+                return jsonify({'error': f'Message exceeds {MAX_MESSAGE_LENGTH} bytes'}), 400
+            mode = data.get('mode', ENCRYPTION_MODE_DEFAULT)
+            if not isinstance(mode, str) or mode not in ENCRYPTION_MODES:
+                return jsonify({'error': f'Unknown encryption mode: {mode}'}), 400
+            compression, error = get_compression(data)
+            if error:
+                return jsonify({'error': error}), 400
+            fmt, error = output_format(request, data)
+            if error:
+                return jsonify({'error': error}), 400
         
-        # Log the input lengths for debugging
-        print(f"Message length: {len(message)}")
-        print(f"Public key length: {len(public_key)}")
+        # Load the public key from its PEM text or a registered handle
+        with timer.stage('key_load'):
+            public_key_data, error = resolve_key(data, 'public')
+        if error:
+            encrypt_log.info('Public key rejected', extra={'error': error})
+            return jsonify({'error': error}), 400
+        timer.key_size = public_key_data.n.bit_length()
         
-        # Load the public key
-        try:
-            public_key_data = rsa.PublicKey.load_pkcs1(public_key.encode())
-            print("Public key loaded successfully")
-        except Exception as e:
-            print(f"Error loading public key: {str(e)}")
-            return jsonify({'error': 'Invalid public key format'}), 400
+        # Retries with the same Idempotency-Key get the first response back
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if idempotency_key is not None:
+            if not 0 < len(idempotency_key) <= MAX_IDEMPOTENCY_KEY_LENGTH:
+                return jsonify({'error': f'Idempotency-Key must be 1 to {MAX_IDEMPOTENCY_KEY_LENGTH} characters'}), 400
+            fingerprint = key_fingerprint(public_key_data)
+            request_digest = encrypt_request_digest(message_bytes, mode, compression, fmt)
+            try:
+                stored = idempotency_cache.get(idempotency_key, fingerprint, request_digest)
+            except IdempotencyConflict as e:
+                return jsonify({'error': str(e)}), 422
+            if stored:
+                return replayed_response(stored)
         
         # Encrypt the message
         try:
-            encrypted_bytes = rsa.encrypt(message.encode('utf-8'), public_key_data)
-            print(f"Encrypted to {len(encrypted_bytes)} bytes")
-            encrypted_emojis = bytes_to_emojis(encrypted_bytes)
-            print(f"Converted to {len(encrypted_emojis)} emojis")
-            return jsonify({'encrypted_text': encrypted_emojis})
+            # Messages too long for one RSA block are wrapped in an envelope,
+            # or split across RSA blocks in blocks mode. Public-key work stays
+            # in this thread so the worker pool is left to private-key requests.
+            with timer.stage('rsa'):
+                encrypted_bytes = encrypt_bytes(message_bytes, public_key_data, mode, compression,
+                                                MAX_RSA_BLOCKS)
+            encrypt_log.debug('Message encrypted', extra={
+                'message_bytes': len(message_bytes),
+                'ciphertext_bytes': len(encrypted_bytes),
+                'key_size': timer.key_size,
+                'format': fmt,
+            })
+            if fmt == 'binary':
+                response = Response(encrypted_bytes, mimetype=BINARY_MIMETYPE)
+            else:
+                with timer.stage('encode'):
+                    encrypted_text = encode_ciphertext(encrypted_bytes, fmt)
+                with timer.stage('serialize'):
+                    response = jsonify({'encrypted_text': encrypted_text, 'format': fmt})
+            if idempotency_key is not None:
+                stored = idempotency_cache.put(idempotency_key, fingerprint, request_digest,
+                                               response.get_data(), response.content_type)
+                if stored:
+                    # A concurrent retry finished first; answer as it did
+                    return replayed_response(stored)
+            return response
+        except IdempotencyConflict as e:
+            return jsonify({'error': str(e)}), 422
+        except OverflowError:
+            encrypt_log.info('Message too long for a single RSA block', extra={'message_bytes': len(message_bytes)})
+            return jsonify({'error': 'Message is too long for a single RSA block; use envelope mode'}), 400
+        except BlockLimitError as e:
+            encrypt_log.info('Message needs too many RSA blocks', extra={'message_bytes': len(message_bytes)})
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
-            print(f"Error during encryption: {str(e)}")
+            encrypt_log.error(f"Error during encryption: {str(e)}")
             return jsonify({'error': f'Encryption failed: {str(e)}'}), 500
             
     except Exception as e:
-        print(f"Unexpected error in encrypt endpoint: {str(e)}")
+        encrypt_log.error(f"Unexpected error in encrypt endpoint: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/decrypt', methods=['POST'])
 def decrypt():
+    timer = start_request_timer('decrypt')
     try:
-        encrypted_text = request.form['encrypted_text']
-        private_key = request.form['private_key']
+        with timer.stage('parse'):
+            data, error = get_request_data()
+            if error:
+                return jsonify({'error': error}), 400
+            limited = admit_request('decrypt', data)
+            if limited:
+                return limited
+            fmt, error = input_format(request, data)
+            if error:
+                return jsonify({'error': error}), 400
+            
+            if fmt == 'binary':
+                encrypted_bytes = request.get_data()
+            else:
+                encrypted_text = data.get('encrypted_text')
+                if encrypted_text is None:
+                    return jsonify({'error': 'Missing encrypted text'}), 400
+                if not isinstance(encrypted_text, str):
+                    return jsonify({'error': 'Encrypted text must be a string'}), 400
         
-        # Log the input lengths for debugging
-        print(f"Encrypted text length: {len(encrypted_text)}")
-        print(f"Private key length: {len(private_key)}")
+        if fmt != 'binary':
+            # Convert emojis (or base64) back to bytes
+            try:
+                with timer.stage('decode'):
+                    encrypted_bytes = decode_ciphertext(encrypted_text, fmt)
+            except ValueError as e:
+                decrypt_log.info('Ciphertext rejected', extra={'format': fmt, 'error': str(e)})
+                return jsonify({'error': f'Invalid {fmt} sequence: {str(e)}'}), 400
         
-        # Convert emojis back to bytes
-        try:
-            encrypted_bytes = emojis_to_bytes(encrypted_text)
-            print(f"Converted to {len(encrypted_bytes)} bytes")
-        except ValueError as e:
-            print(f"Error converting emojis to bytes: {str(e)}")
-            return jsonify({'error': f'Invalid emoji sequence: {str(e)}'}), 400
+        # Load the private key from its PEM text or a registered handle
+        with timer.stage('key_load'):
+            private_key_data, error = resolve_key(data, 'private')
+        if error:
+            decrypt_log.info('Private key rejected', extra={'error': error})
+            return jsonify({'error': error}), 400
+        timer.key_size = private_key_data.n.bit_length()
         
-        # Load the private key
-        try:
-            private_key_data = rsa.PrivateKey.load_pkcs1(private_key.encode())
-            print("Private key loaded successfully")
-        except Exception as e:
-            print(f"Error loading private key: {str(e)}")
-            return jsonify({'error': 'Invalid private key format'}), 400
+        # A multi-block ciphertext costs one private-key operation per block
+        blocks = block_count(encrypted_bytes, private_key_data)
+        if blocks and blocks > 1:
+            limited = admit_request('decrypt', data, min(blocks, MAX_RSA_BLOCKS) - 1)
+            if limited:
+                return limited
         
         # Decrypt the message
         try:
-            decrypted_bytes = rsa.decrypt(encrypted_bytes, private_key_data)
-            print(f"Decrypted to {len(decrypted_bytes)} bytes")
-            decrypted_text = decrypted_bytes.decode('utf-8')
-            print(f"Decoded message: {decrypted_text[:50]}...")  # Print first 50 chars
-            return jsonify({'decrypted_text': decrypted_text})
-        except rsa.pkcs1.DecryptionError as e:
-            print(f"Decryption error: {str(e)}")
+            with timer.stage('rsa'):
+                decrypted_bytes = decrypt_bytes(encrypted_bytes, private_key_data, private_decrypt, MAX_MESSAGE_LENGTH,
+                                                worker_pool, MAX_RSA_BLOCKS)
+            decrypt_log.debug('Message decrypted', extra={
+                'ciphertext_bytes': len(encrypted_bytes),
+                'plaintext_bytes': len(decrypted_bytes),
+                'key_size': timer.key_size,
+            })
+            if accepts_binary(request):
+                return Response(decrypted_bytes, mimetype=BINARY_MIMETYPE)
+            try:
+                decrypted_text = decrypted_bytes.decode('utf-8')
+            except UnicodeDecodeError:
+                return jsonify({'error': 'Decrypted data is not valid UTF-8 text; '
+                                         'send Accept: application/octet-stream to receive raw bytes'}), 400
+            with timer.stage('serialize'):
+                return jsonify({'decrypted_text': decrypted_text})
+        except PoolSaturated as e:
+            decrypt_log.warning('Worker pool saturated')
+            return busy_response(e)
+        except rsa.pkcs1.DecryptionError:
+            decrypt_log.info('Decryption failed', extra={'ciphertext_bytes': len(encrypted_bytes)})
             return jsonify({'error': 'The private key does not match the public key used for encryption'}), 400
+        except BlockLimitError as e:
+            decrypt_log.info('Ciphertext has too many RSA blocks', extra={'error': str(e)})
+            return jsonify({'error': str(e)}), 400
+        except DecompressionError as e:
+            decrypt_log.info('Compressed payload rejected', extra={'error': str(e)})
+            return jsonify({'error': f'Invalid compressed payload: {str(e)}'}), 400
         except Exception as e:
-            print(f"Unexpected error during decryption: {str(e)}")
+            decrypt_log.error(f"Unexpected error during decryption: {str(e)}")
             return jsonify({'error': f'Decryption failed: {str(e)}'}), 500
             
     except Exception as e:
-        print(f"Unexpected error in decrypt endpoint: {str(e)}")
+        decrypt_log.error(f"Unexpected error in decrypt endpoint: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/encrypt/batch', methods=['POST'])
+def encrypt_batch():
+    """Encrypt many messages for one public key, loading the key once"""
+    try:
+        data = request.get_json(silent=True)
+        if not data or not isinstance(data, dict):
+            return jsonify({'error': 'Batch requests require a JSON body'}), 400
+        messages, error = get_batch_items(data, 'messages')
+        if error:
+            return jsonify({'error': error}), 400
+        mode = data.get('mode', ENCRYPTION_MODE_DEFAULT)
+        if not isinstance(mode, str) or mode not in ENCRYPTION_MODES:
+            return jsonify({'error': f'Unknown encryption mode: {mode}'}), 400
+        compression, error = get_compression(data)
+        if error:
+            return jsonify({'error': error}), 400
+        fmt = data.get('format', 'emoji')
+        if fmt not in TEXT_FORMATS:
+            return jsonify({'error': f"Format must be one of: {', '.join(TEXT_FORMATS)}"}), 400
+
+        public_key_data, error = resolve_key(data, 'public')
+        if error:
+            return jsonify({'error': error}), 400
+
+        results = [encrypt_item(message, public_key_data, mode, fmt, compression) for message in messages]
+        return jsonify({'results': results})
+
+    except Exception as e:
+        encrypt_batch_log.error(f"Batch encryption error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/decrypt/batch', methods=['POST'])
+def decrypt_batch():
+    """Decrypt many ciphertexts with one private key, loading the key once"""
+    try:
+        data = request.get_json(silent=True)
+        if not data or not isinstance(data, dict):
+            return jsonify({'error': 'Batch requests require a JSON body'}), 400
+        encrypted_texts, error = get_batch_items(data, 'encrypted_texts')
+        if error:
+            return jsonify({'error': error}), 400
+        limited = admit_request('decrypt_batch', data, len(encrypted_texts))
+        if limited:
+            return limited
+
+        fmt = data.get('format', 'emoji')
+        if fmt not in TEXT_FORMATS:
+            return jsonify({'error': f"Format must be one of: {', '.join(TEXT_FORMATS)}"}), 400
+
+        private_key_data, error = resolve_key(data, 'private')
+        if error:
+            return jsonify({'error': error}), 400
+        # Items that are multi-block containers cost one operation per block
+        extra_blocks = sum(ciphertext_blocks(encrypted_text, private_key_data, fmt) - 1
+                           for encrypted_text in encrypted_texts)
+        if extra_blocks:
+            limited = admit_request('decrypt_batch', data, extra_blocks)
+            if limited:
+                return limited
+
+        return jsonify({'results': decrypt_items(encrypted_texts, private_key_data, fmt)})
+
+    except PoolSaturated as e:
+        return busy_response(e)
+    except Exception as e:
+        decrypt_batch_log.error(f"Batch decryption error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def file_response(chunks, suffix):
+    """Stream chunks back as an attachment named after the uploaded file"""
+    response = Response(stream_with_context(chunks), mimetype=BINARY_MIMETYPE)
+    filename = secure_filename(request.args.get('filename', ''))
+    if filename:
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}{suffix}"'
+    return response
+
+@app.route('/encrypt/file', methods=['POST'])
+def encrypt_file():
+    """Encrypt a raw request body of any size, streaming the result back
+
+    The body is read in FILE_CHUNK_SIZE pieces and never buffered whole, so
+    the key must be passed as public_key_handle or public_key_id in the
+    query string.
+    """
+    try:
+        public_key_data, error = resolve_key(request.args, 'public')
+        if error:
+            return jsonify({'error': error}), 400
+        chunks = encrypt_stream(request.stream.read, public_key_data, FILE_CHUNK_SIZE)
+        return file_response(chunks, '.enc')
+
+    except Exception as e:
+        encrypt_file_log.error(f"File encryption error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/decrypt/file', methods=['POST'])
+def decrypt_file():
+    """Decrypt a stream produced by /encrypt/file, streaming the plaintext back
+
+    Frames are authenticated one at a time; if a later frame fails to
+    authenticate the response is cut short, so clients must treat an
+    incomplete response as a failed decryption.
+    """
+    try:
+        limited = admit_request('decrypt_file', request.args)
+        if limited:
+            return limited
+        private_key_data, error = resolve_key(request.args, 'private')
+        if error:
+            return jsonify({'error': error}), 400
+        try:
+            decryptor = StreamDecryptor(request.stream.read, private_key_data, private_decrypt)
+        except rsa.pkcs1.DecryptionError:
+            return jsonify({'error': 'The private key does not match the public key used for encryption'}), 400
+        return file_response(decryptor.chunks(), '.dec')
+
+    except PoolSaturated as e:
+        return busy_response(e)
+    except Exception as e:
+        decrypt_file_log.error(f"File decryption error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/sign', methods=['POST'])
+def sign():
+    """Sign a message with a private key (PKCS#1 v1.5)"""
+    timer = start_request_timer('sign')
+    try:
+        with timer.stage('parse'):
+            data, error = get_request_data()
+            if error:
+                return jsonify({'error': error}), 400
+            limited = admit_request('sign', data)
+            if limited:
+                return limited
+            if is_binary_body(request):
+                message_bytes = request.get_data()
+            else:
+                message = data.get('message')
+                if message is None:
+                    return jsonify({'error': 'Missing message'}), 400
+                if not isinstance(message, str):
+                    return jsonify({'error': 'Message must be a string'}), 400
+                message_bytes = message.encode('utf-8')
+            hash_method = data.get('hash', DEFAULT_HASH)
+            if hash_method not in SIGNATURE_HASHES:
+                return jsonify({'error': f"Hash must be one of: {', '.join(SIGNATURE_HASHES)}"}), 400
+            fmt, error = output_format(request, data)
+            if error:
+                return jsonify({'error': error}), 400
+
+        with timer.stage('key_load'):
+            private_key_data, error = resolve_key(data, 'private')
+        if error:
+            return jsonify({'error': error}), 400
+        timer.key_size = private_key_data.n.bit_length()
+
+        # Only the digest goes to the worker, however long the message
+        with timer.stage('rsa'):
+            digest = rsa.compute_hash(message_bytes, hash_method)
+            signature = worker_pool.run(sign_hash, digest, private_key_data, hash_method)
+        if fmt == 'binary':
+            return Response(signature, mimetype=BINARY_MIMETYPE)
+        with timer.stage('serialize'):
+            return jsonify({'signature': encode_ciphertext(signature, fmt), 'hash': hash_method, 'format': fmt})
+
+    except PoolSaturated as e:
+        return busy_response(e)
+    except OverflowError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        sign_log.error(f"Signing error: {str(e)}")
+        return jsonify({'error': f'Signing failed: {str(e)}'}), 500
+
+@app.route('/verify', methods=['POST'])
+def verify():
+    """Check a message's signature against a public key"""
+    timer = start_request_timer('verify')
+    try:
+        with timer.stage('parse'):
+            data, error = get_request_data()
+            if error:
+                return jsonify({'error': error}), 400
+            message, signature = data.get('message'), data.get('signature')
+            if message is None or signature is None:
+                return jsonify({'error': 'Both message and signature are required'}), 400
+            fmt = data.get('format', 'emoji')
+            if fmt not in TEXT_FORMATS:
+                return jsonify({'error': f"Format must be one of: {', '.join(TEXT_FORMATS)}"}), 400
+
+        with timer.stage('key_load'):
+            public_key_data, error = resolve_key(data, 'public')
+        if error:
+            return jsonify({'error': error}), 400
+        timer.key_size = public_key_data.n.bit_length()
+
+        with timer.stage('rsa'):
+            result = verify_item(SignatureVerifier(public_key_data), {'message': message, 'signature': signature}, fmt)
+        if 'error' in result:
+            return jsonify(result), 400
+        return jsonify(result)
+
+    except Exception as e:
+        verify_log.error(f"Verification error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/verify/batch', methods=['POST'])
+def verify_batch():
+    """Verify many (message, signature) pairs against one public key
+
+    The key is parsed once and each item costs one public-exponent
+    exponentiation. Batches hold up to MAX_VERIFY_BATCH_SIZE items.
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not data or not isinstance(data, dict):
+            return jsonify({'error': 'Batch requests require a JSON body'}), 400
+        items, error = get_batch_items(data, 'items', MAX_VERIFY_BATCH_SIZE)
+        if error:
+            return jsonify({'error': error}), 400
+        fmt = data.get('format', 'emoji')
+        if fmt not in TEXT_FORMATS:
+            return jsonify({'error': f"Format must be one of: {', '.join(TEXT_FORMATS)}"}), 400
+
+        public_key_data, error = resolve_key(data, 'public')
+        if error:
+            return jsonify({'error': error}), 400
+
+        verifier = SignatureVerifier(public_key_data)
+        results = [verify_item(verifier, item, fmt) for item in items]
+        return jsonify({'results': results})
+
+    except Exception as e:
+        verify_batch_log.error(f"Batch verification error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/validate_keys', methods=['POST'])
 def validate_keys():
     """Validate that the public and private keys form a valid pair"""
+    timer = start_request_timer('validate_keys')
     try:
-        data = request.json
-        if not data:
-            return jsonify({'valid': False, 'error': 'No data provided'}), 400
+        with timer.stage('parse'):
+            data = request.get_json(silent=True)
+            if not data or not isinstance(data, dict):
+                return jsonify({'valid': False, 'error': 'No data provided'}), 400
+            mode = data.get('mode', 'fast')
+            if not isinstance(mode, str) or mode not in VALIDATION_MODES:
+                return jsonify({'valid': False, 'error': f"Mode must be one of: {', '.join(sorted(VALIDATION_MODES))}"}), 400
+            # Only full validation performs a private-key operation
+            if mode == 'full':
+                limited = admit_request('validate_keys', data)
+                if limited:
+                    return limited
+                
+            public_key = data.get('public_key')
+            private_key = data.get('private_key')
             
-        public_key = data.get('public_key')
-        private_key = data.get('private_key')
-        
-        if not public_key or not private_key:
-            return jsonify({'valid': False, 'error': 'Both public and private keys are required'}), 400
-            
-        # Clean up the keys
-        public_key = public_key.strip()
-        private_key = private_key.strip()
+            if not public_key or not private_key:
+                return jsonify({'valid': False, 'error': 'Both public and private keys are required'}), 400
+            if not isinstance(public_key, str) or not isinstance(private_key, str):
+                return jsonify({'valid': False, 'error': 'Keys must be PEM strings'}), 400
+                
+            # Clean up the keys
+            public_key = public_key.strip()
+            private_key = private_key.strip()
         
         # Validate the key pair
-        is_valid, message = validate_key_pair(public_key, private_key)
+        is_valid, message = validate_key_pair(public_key, private_key, timer, mode)
         
-        return jsonify({
-            'valid': is_valid,
-            'error': None if is_valid else message
-        })
+        with timer.stage('serialize'):
+            return jsonify({
+                'valid': is_valid,
+                'error': None if is_valid else message
+            })
         
+    except PoolSaturated as e:
+        return busy_response(e)
     except Exception as e:
-        logging.error(f"Key validation error: {str(e)}")
+        keys_log.error(f"Key validation error: {str(e)}")
         return jsonify({'valid': False, 'error': str(e)}), 500
 
+@app.route('/keys', methods=['POST'])
+def register_keys():
+    """Parse keys once and return handles usable by /encrypt and /decrypt"""
+    try:
+        data, error = get_request_data()
+        if error:
+            return jsonify({'error': error}), 400
+        if not data.get('public_key') and not data.get('private_key'):
+            return jsonify({'error': 'A public or private key is required'}), 400
+
+        response = {}
+        if data.get('private_key'):
+            private_key_data, error = resolve_key(data, 'private')
+            if error:
+                return jsonify({'error': error}), 400
+            entry = key_cache.register(private_key_data)
+            response['private_key_handle'] = entry.handle
+            # The public half is implied by the private key
+            if not data.get('public_key'):
+                public_entry = key_cache.register(rsa.PublicKey(private_key_data.n, private_key_data.e))
+                response['public_key_handle'] = public_entry.handle
+
+        if data.get('public_key'):
+            public_key_data, error = resolve_key(data, 'public')
+            if error:
+                return jsonify({'error': error}), 400
+            if 'private_key_handle' in response and public_key_data.n != private_key_data.n:
+                return jsonify({'error': 'Keys do not form a valid pair'}), 400
+            entry = key_cache.register(public_key_data)
+            response['public_key_handle'] = entry.handle
+
+        response.update({
+            'fingerprint': entry.fingerprint,
+            'key_size': entry.bits,
+            'expires_in': key_cache.ttl,
+        })
+        return jsonify(response)
+
+    except Exception as e:
+        keys_log.error(f"Key registration error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/keys/stats', methods=['GET'])
+def key_cache_stats():
+    """Report key cache hit/miss/eviction counters"""
+    return jsonify(key_cache.stats())
+
+@app.route('/keys/generate', methods=['POST'])
+def generate_key_pair():
+    """Issue a key pair from the pre-generated pool"""
+    try:
+        data, error = get_request_data()
+        if error:
+            return jsonify({'error': error}), 400
+        try:
+            key_size = int(data.get('key_size', 2048))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Key size must be an integer'}), 400
+        if key_size not in KEY_POOL_TARGETS:
+            sizes = ', '.join(str(bits) for bits in sorted(KEY_POOL_TARGETS))
+            return jsonify({'error': f'Key size must be one of: {sizes}'}), 400
+        register, error = get_flag(data, 'register')
+        if error:
+            return jsonify({'error': error}), 400
+        store, error = get_flag(data, 'store')
+        if error:
+            return jsonify({'error': error}), 400
+
+        # Every pair served starts the generation of a replacement
+        limited = admit_request('keys_generate', data, cost=keygen_cost(key_size))
+        if limited:
+            return limited
+        if not keygen_slots.acquire(blocking=False):
+            return busy_response(PoolSaturated(RSA_WORKER_RETRY_AFTER))
+        try:
+            pub_key, priv_key, pooled = key_pool.acquire(key_size, timeout=KEY_POOL_WAIT_TIMEOUT)
+        except PoolTimeout:
+            return busy_response(PoolSaturated(RSA_WORKER_RETRY_AFTER))
+        finally:
+            keygen_slots.release()
+
+        return jsonify(key_pair_response(pub_key, priv_key, key_size, pooled, register, store))
+
+    except Exception as e:
+        keys_log.error(f"Key generation error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def encrypt_job(message, public_key_data, mode, fmt, compression):
+    """Job body for /jobs encrypt requests"""
+    result = encrypt_item(message, public_key_data, mode, fmt, compression)
+    if 'error' in result:
+        raise ValueError(result['error'])
+    return dict(result, format=fmt)
+
+def decrypt_job(encrypted_text, private_key_data, fmt):
+    """Job body for /jobs decrypt requests"""
+    result = decrypt_item(encrypted_text, private_key_data, fmt)
+    if 'error' in result:
+        raise ValueError(result['error'])
+    return result
+
+def keygen_job(key_size, register, store):
+    """Job body for /jobs keygen requests"""
+    pub_key, priv_key, pooled = key_pool.acquire(key_size, timeout=KEY_POOL_WAIT_TIMEOUT)
+    return key_pair_response(pub_key, priv_key, key_size, pooled, register, store)
+
+def prepare_job(data):
+    """Validate a /jobs request and return (kind, fn, args, error)
+
+    Inputs and keys are checked here so that bad requests fail with a 400
+    instead of as a failed job.
+    """
+    kind = data.get('type')
+    if not isinstance(kind, str) or kind not in JOB_TYPES:
+        return None, None, None, f"Job type must be one of: {', '.join(sorted(JOB_TYPES))}"
+
+    if kind == 'keygen':
+        try:
+            key_size = int(data.get('key_size', 2048))
+        except (TypeError, ValueError):
+            return None, None, None, 'Key size must be an integer'
+        if key_size not in KEY_POOL_TARGETS:
+            sizes = ', '.join(str(bits) for bits in sorted(KEY_POOL_TARGETS))
+            return None, None, None, f'Key size must be one of: {sizes}'
+        register, error = get_flag(data, 'register')
+        if error:
+            return None, None, None, error
+        store, error = get_flag(data, 'store')
+        if error:
+            return None, None, None, error
+        return kind, keygen_job, (key_size, register, store), None
+
+    fmt = data.get('format', 'emoji')
+    if fmt not in TEXT_FORMATS:
+        return None, None, None, f"Format must be one of: {', '.join(TEXT_FORMATS)}"
+
+    if kind == 'encrypt':
+        message = data.get('message')
+        if not isinstance(message, str):
+            return None, None, None, 'Missing message'
+        mode = data.get('mode', ENCRYPTION_MODE_DEFAULT)
+        if not isinstance(mode, str) or mode not in ENCRYPTION_MODES:
+            return None, None, None, f'Unknown encryption mode: {mode}'
+        compression, error = get_compression(data)
+        if error:
+            return None, None, None, error
+        public_key_data, error = resolve_key(data, 'public')
+        if error:
+            return None, None, None, error
+        return kind, encrypt_job, (message, public_key_data, mode, fmt, compression), None
+
+    encrypted_text = data.get('encrypted_text')
+    if not isinstance(encrypted_text, str):
+        return None, None, None, 'Missing encrypted text'
+    private_key_data, error = resolve_key(data, 'private')
+    if error:
+        return None, None, None, error
+    return kind, decrypt_job, (encrypted_text, private_key_data, fmt), None
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue an encrypt, decrypt or keygen job and return its id"""
+    try:
+        data, error = get_request_data()
+        if error:
+            return jsonify({'error': error}), 400
+        if data.get('type') == 'decrypt':
+            limited = admit_request('jobs', data)
+            if limited:
+                return limited
+        kind, fn, args, error = prepare_job(data)
+        if error:
+            return jsonify({'error': error}), 400
+        if kind == 'keygen':
+            limited = admit_request('jobs', data, cost=keygen_cost(args[0]))
+            if limited:
+                return limited
+        if kind == 'decrypt':
+            extra_blocks = ciphertext_blocks(*args) - 1
+            if extra_blocks:
+                limited = admit_request('jobs', data, extra_blocks)
+                if limited:
+                    return limited
+
+        job = job_manager.submit(kind, fn, *args)
+        response = jsonify({'job_id': job['id'], 'type': kind, 'status': job['status']})
+        response.status_code = 202
+        response.headers['Location'] = url_for('get_job', job_id=job['id'])
+        return response
+
+    except PoolSaturated as e:
+        return busy_response(e)
+    except Exception as e:
+        jobs_log.error(f"Job submission error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Report a job's status and result
+
+    With ?wait=N the request is held for up to N seconds (capped at
+    JOB_MAX_WAIT) until the job finishes.
+    """
+    try:
+        wait = min(float(request.args.get('wait', 0)), JOB_MAX_WAIT)
+    except ValueError:
+        return jsonify({'error': 'Wait must be a number of seconds'}), 400
+
+    job = job_manager.wait(job_id, wait) if wait > 0 else job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(job)
+
+@app.route('/jobs/stats', methods=['GET'])
+def job_stats():
+    """Report job pool occupancy and store size"""
+    return jsonify(job_manager.stats())
+
+@app.route('/keys/pool/stats', methods=['GET'])
+def key_pool_stats():
+    """Report pooled key pairs and low-water marks per key size"""
+    return jsonify(key_pool.stats())
+
+@app.route('/workers/stats', methods=['GET'])
+def worker_pool_stats():
+    """Report private-key worker pool occupancy"""
+    return jsonify(worker_pool.stats())
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Expose request stage latencies and service gauges for Prometheus"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def start_services():
+    """Start background work; call once in every serving process"""
+    # The listener thread is lost when a server forks after importing the app
+    ensure_listener(log_listener)
+    prerender_pages()
+    key_pool.start()
+
+def shutdown_services():
+    """Stop background work, letting running jobs and RSA calls finish"""
+    key_pool.shutdown()
+    job_manager.shutdown(wait=True)
+    worker_pool.shutdown(wait=True)
+
+@app.after_request
+def record_request_metrics(response):
+    """Record the stage timings collected by start_request_timer"""
+    timer = g.pop('request_timer', None)
+    if timer is not None:
+        timer.finish(response.status_code)
+    return response
+
 # =============================================
 # Error Handlers
 # =============================================
@@ -272,7 +1403,7 @@ def not_found(e):
 
 @app.errorhandler(500)
 def server_error(e):
-    logging.error(f"Server error: {str(e)}")
+    route_logger(request.endpoint or 'app').error(f"Server error: {str(e)}")
     return jsonify({'error': 'Internal server error'}), 500
 
 # =============================================
@@ -283,5 +1414,12 @@ if __name__ == '__main__':
     # Ensure the user_keys directory exists
     os.makedirs('user_keys', exist_ok=True)
     
-    # Start the Flask application
-    app.run(host='127.0.0.1', port=5000, debug=True)
\ No newline at end of file
+    # Start filling the key pair pool before the first request arrives
+    start_services()
+    
+    # Start the Flask development server; use gunicorn.conf.py in production
+    app.run(
+        host=os.environ.get('HOST', '127.0.0.1'),
+        port=int(os.environ.get('PORT', 5000)),
+        debug=os.environ.get('FLASK_DEBUG') == '1'
+    )
\ No newline at end of file
@@ -0,0 +1,179 @@
+"""ASGI entry point for production servers
+
+    uvicorn asgi:application
+    gunicorn -c gunicorn.conf.py
+
+Run a single server process unless the shared stores listed in
+gunicorn.conf.py are configured; key handles, in-memory jobs, rate
+buckets and idempotency entries live in the process that created them.
+
+Flask handlers are synchronous, so each request runs on a bounded thread
+pool of ASGI_THREADS threads while the event loop keeps accepting
+connections, reading request bodies and writing responses. Private-key
+operations inside the handlers are further offloaded to the process pool
+in app.worker_pool. The ASGI lifespan protocol starts the background
+services in each serving process and stops them on graceful shutdown.
+"""
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import app as service
+
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 32))
+
+
+class _RequestBody(io.RawIOBase):
+    """wsgi.input that pulls http.request messages from the event loop
+
+    Bodies are streamed as the handler reads them rather than buffered
+    before the request starts, so /encrypt/file keeps its memory bound.
+    """
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._buffer = b''
+        self._done = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while not self._buffer and not self._done:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message['type'] != 'http.request':
+                # Client disconnected
+                self._done = True
+                break
+            self._buffer = message.get('body', b'')
+            self._done = not message.get('more_body', False)
+        size = min(len(target), len(self._buffer))
+        target[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def build_environ(scope, body):
+    """Translate an ASGI HTTP scope into a WSGI environ"""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BufferedReader(body),
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        if name in environ:
+            # Cookie headers are joined like a single Cookie header would be
+            value = f"{environ[name]}{'; ' if name == 'HTTP_COOKIE' else ','}{value}"
+        environ[name] = value
+    return environ
+
+
+class WSGIApplication:
+    """Serve a WSGI app over ASGI, running it on a thread pool"""
+
+    def __init__(self, wsgi_app, threads=ASGI_THREADS, on_startup=None, on_shutdown=None):
+        self.wsgi_app = wsgi_app
+        self.threads = threads
+        self.on_startup = on_startup
+        self.on_shutdown = on_shutdown
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='asgi')
+        return self._executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._get_executor(), self._handle, scope, receive, send, loop)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    if self.on_startup is not None:
+                        await loop.run_in_executor(None, self.on_startup)
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                # Requests still running finish before services stop
+                if self._executor is not None:
+                    await loop.run_in_executor(None, self._executor.shutdown)
+                if self.on_shutdown is not None:
+                    await loop.run_in_executor(None, self.on_shutdown)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _handle(self, scope, receive, send, loop):
+        """Run one request on a pool thread, streaming the response out"""
+        def send_message(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        response_start = {}
+
+        def start_response(status, headers, exc_info=None):
+            response_start.update({
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                            for name, value in headers],
+            })
+
+        environ = build_environ(scope, _RequestBody(receive, loop))
+        chunks = self.wsgi_app(environ, start_response)
+        try:
+            started = False
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                if not started:
+                    # Headers go out with the first body chunk, so a handler
+                    # failing before then can still change the status
+                    send_message(response_start)
+                    started = True
+                send_message({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if not started:
+                send_message(response_start)
+            send_message({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+
+application = WSGIApplication(
+    service.app,
+    on_startup=service.start_services,
+    on_shutdown=service.shutdown_services
+)
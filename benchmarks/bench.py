@@ -0,0 +1,178 @@
+"""Benchmarks for the crypto, codec and HTTP paths
+
+Run from the repository root:
+
+    python -m benchmarks.bench --output results.json
+    python -m benchmarks.bench --baseline results.json --threshold 0.1
+
+Keys are generated once per size and cached in benchmarks/.keys so every
+run measures the same keys. With --baseline the run exits non-zero if any
+benchmark's ops/sec dropped by more than the threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import rsa
+
+# Private-key operations run inline so timings measure this process only,
+# and the benchmark client is not rate limited
+os.environ.setdefault('RSA_WORKERS', '0')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+
+import app  # noqa: E402
+from utils import backend  # noqa: E402
+from utils.crypto import decrypt_bytes, encrypt_bytes  # noqa: E402
+from utils.signing import SignatureVerifier, sign_hash  # noqa: E402
+
+KEY_DIR = Path(__file__).parent / '.keys'
+DEFAULT_BITS = (1024, 2048, 3072, 4096)
+MESSAGE = b'Hello, this is a benchmark message!'
+LONG_MESSAGE = os.urandom(16 * 1024)  # many RSA blocks in 'blocks' mode
+
+
+def load_keys(bits):
+    """Return a cached (pub_key, priv_key) pair, generating it on first use"""
+    KEY_DIR.mkdir(exist_ok=True)
+    path = KEY_DIR / f'{bits}.pem'
+    if not path.exists():
+        print(f"Generating {bits}-bit benchmark key...", file=sys.stderr)
+        _, priv_key = rsa.newkeys(bits)
+        path.write_bytes(priv_key.save_pkcs1())
+    priv_key = rsa.PrivateKey.load_pkcs1(path.read_bytes())
+    return rsa.PublicKey(priv_key.n, priv_key.e), priv_key
+
+
+def measure(fn, iterations, max_seconds, warmup=3):
+    """Time fn() per call and summarize ops/sec and latency percentiles"""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    deadline = time.perf_counter() + max_seconds
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+        # Slow operations stop early once they have enough samples
+        if len(latencies) >= 5 and time.perf_counter() > deadline:
+            break
+    latencies.sort()
+    return {
+        'iterations': len(latencies),
+        'ops_per_sec': len(latencies) / sum(latencies),
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+def benchmarks_for(bits):
+    """Yield (name, callable) pairs covering one key size"""
+    pub_key, priv_key = load_keys(bits)
+    pub_pem = pub_key.save_pkcs1()
+    priv_pem = priv_key.save_pkcs1()
+    ciphertext = encrypt_bytes(MESSAGE, pub_key)
+    emojis = app.bytes_to_emojis(ciphertext)
+    client = app.app.test_client()
+    pub_str, priv_str = pub_pem.decode(), priv_pem.decode()
+
+    yield 'key_load_public', lambda: rsa.PublicKey.load_pkcs1(pub_pem)
+    yield 'key_load_private', lambda: rsa.PrivateKey.load_pkcs1(priv_pem)
+    yield 'encrypt', lambda: encrypt_bytes(MESSAGE, pub_key)
+    yield 'decrypt', lambda: decrypt_bytes(ciphertext, priv_key)
+    blocks = encrypt_bytes(LONG_MESSAGE, pub_key, 'blocks')
+    yield 'encrypt_blocks', lambda: encrypt_bytes(LONG_MESSAGE, pub_key, 'blocks')
+    # Runs on app.worker_pool, so set RSA_WORKERS to measure the parallel speedup
+    yield 'decrypt_blocks', lambda: decrypt_bytes(blocks, priv_key, pool=app.worker_pool)
+    yield 'validate_key_pair', lambda: app.validate_key_pair(pub_str, priv_str)
+    yield 'validate_key_pair_full', lambda: app.validate_key_pair(pub_str, priv_str, mode='full')
+    digest = rsa.compute_hash(MESSAGE, 'SHA-256')
+    signature = sign_hash(digest, priv_key)
+    verifier = SignatureVerifier(pub_key)
+    yield 'sign', lambda: sign_hash(digest, priv_key)
+    yield 'verify', lambda: verifier.verify(MESSAGE, signature)
+    yield 'bytes_to_emojis', lambda: app.bytes_to_emojis(ciphertext)
+    yield 'emojis_to_bytes', lambda: app.emojis_to_bytes(emojis)
+    yield 'http_encrypt', lambda: client.post('/encrypt', data={'message': MESSAGE.decode(), 'public_key': pub_str})
+    yield 'http_decrypt', lambda: client.post('/decrypt', data={'encrypted_text': emojis, 'private_key': priv_str})
+
+
+def run(bit_sizes, iterations, max_seconds, only=None):
+    results = {}
+    for bits in bit_sizes:
+        for name, fn in benchmarks_for(bits):
+            if only and name not in only:
+                continue
+            key = f'{name}[{bits}]'
+            results[key] = measure(fn, iterations, max_seconds)
+            stats = results[key]
+            print(f"{key:<28} {stats['ops_per_sec']:>12.1f} ops/s  "
+                  f"p50 {stats['p50_ms']:>9.3f} ms  p99 {stats['p99_ms']:>9.3f} ms")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return the benchmarks whose ops/sec regressed beyond threshold"""
+    regressions = []
+    for key, stats in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        change = stats['ops_per_sec'] / before['ops_per_sec'] - 1
+        marker = ''
+        if change < -threshold:
+            regressions.append(key)
+            marker = '  <-- regression'
+        print(f"{key:<28} {change:>+8.1%}{marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the crypto, codec and HTTP paths')
+    parser.add_argument('--bits', default=','.join(map(str, DEFAULT_BITS)),
+                        help='Comma-separated key sizes (default: 1024,2048,3072,4096)')
+    parser.add_argument('--iterations', type=int, default=200,
+                        help='Maximum timed calls per benchmark (default: 200)')
+    parser.add_argument('--max-seconds', type=float, default=2.0,
+                        help='Time budget per benchmark (default: 2.0)')
+    parser.add_argument('--only', help='Comma-separated benchmark names to run')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--baseline', help='Compare against a previous JSON result file')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Allowed ops/sec drop versus the baseline (default: 0.10)')
+    args = parser.parse_args()
+
+    bit_sizes = [int(bits) for bits in args.bits.split(',')]
+    only = set(args.only.split(',')) if args.only else None
+    results = run(bit_sizes, args.iterations, args.max_seconds, only)
+
+    if args.output:
+        report = {
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'rsa': rsa.__version__,
+                'backend': backend.name,
+            },
+            'results': results,
+        }
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())['results']
+        print(f"\nChange versus {args.baseline}:")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,29 @@
 import rsa
+import argparse
+import mmap
 import os
+import struct
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from rsa import common
+
+from utils.compression import DecompressionError, decompress
+from utils.crypto import decrypt_bytes
+from utils.prepared_key import PreparedPrivateKey
+
+# Per-process state for bulk decryption, set up by _init_bulk_worker
+_bulk_key = None
+_bulk_records = None
 
 def decrypt_data(encrypted_data, private_key_path='user_keys/private_key.pem'):
     """
     Decrypt data using a private key
     
+    Accepts either a single RSA block or a hybrid envelope produced for
+    messages longer than one block.
+    
     Args:
         encrypted_data (bytes): The encrypted data to decrypt
         private_key_path (str): Path to the private key file (default: 'user_keys/private_key.pem')
@@ -21,8 +40,8 @@ def decrypt_data(encrypted_data, private_key_path='user_keys/private_key.pem'):
         with open(private_key_path, 'rb') as f:
             private_key = rsa.PrivateKey.load_pkcs1(f.read())
         
-        # Decrypt the data
-        decrypted_data = rsa.decrypt(encrypted_data, private_key)
+        # Decrypt the data, unwrapping the envelope format and compression if present
+        decrypted_data = decrypt_bytes(encrypted_data, private_key)
         
         # Convert bytes to string
         return decrypted_data.decode('utf-8')
@@ -32,7 +51,114 @@ def decrypt_data(encrypted_data, private_key_path='user_keys/private_key.pem'):
     except Exception as e:
         raise Exception(f"Decryption error: {str(e)}")
 
+def load_private_key(private_key_path):
+    """Load a PEM private key from disk"""
+    if not os.path.exists(private_key_path):
+        raise FileNotFoundError(f"Private key file not found at {private_key_path}")
+    with open(private_key_path, 'rb') as f:
+        return rsa.PrivateKey.load_pkcs1(f.read())
+
+def _init_bulk_worker(input_path, private_key_path):
+    """Prepare the key once and memory-map the archive in each worker process"""
+    global _bulk_key, _bulk_records
+    _bulk_key = PreparedPrivateKey(load_private_key(private_key_path))
+    with open(input_path, 'rb') as f:
+        _bulk_records = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def _decrypt_record_range(start, count):
+    """Decrypt records [start, start + count) from the mapped archive
+
+    Records compressed before encryption are decompressed transparently.
+    """
+    block_size = _bulk_key.block_size
+    plaintexts = []
+    for index in range(start, start + count):
+        offset = index * block_size
+        try:
+            plaintexts.append(decompress(_bulk_key.decrypt(_bulk_records[offset:offset + block_size])))
+        except rsa.pkcs1.DecryptionError:
+            raise ValueError(f"Decryption failed for record {index}") from None
+        except DecompressionError as e:
+            raise ValueError(f"Invalid compressed record {index}: {str(e)}") from None
+    return plaintexts
+
+def decrypt_bulk(input_path, output_path, private_key_path='user_keys/private_key.pem',
+                 jobs=None, batch_size=1024, lines=False):
+    """
+    Decrypt an archive of concatenated fixed-size RSA blocks
+    
+    The record size is the key's modulus size in bytes. Workers memory-map
+    the archive themselves, so only record ranges and plaintexts cross
+    process boundaries, and at most two batches per worker are in flight.
+    
+    Args:
+        input_path (str): File of concatenated ciphertext records
+        output_path (str): Where to write plaintexts, in record order
+        private_key_path (str): Path to the private key file
+        jobs (int): Number of worker processes (default: CPU count)
+        batch_size (int): Records decrypted per task
+        lines (bool): Write newline-terminated records instead of
+            4-byte big-endian length-prefixed ones
+    
+    Returns:
+        int: The number of records decrypted
+    """
+    block_size = common.byte_size(load_private_key(private_key_path).n)
+    total_size = os.path.getsize(input_path)
+    if total_size % block_size:
+        raise ValueError(f"Archive size {total_size} is not a multiple of the {block_size}-byte record size")
+    record_count = total_size // block_size
+    jobs = jobs or os.cpu_count() or 1
+    
+    ranges = ((start, min(batch_size, record_count - start)) for start in range(0, record_count, batch_size))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_bulk_worker,
+                             initargs=(input_path, private_key_path)) as executor, \
+            open(output_path, 'wb') as out:
+        in_flight = deque()
+        for start, count in ranges:
+            in_flight.append(executor.submit(_decrypt_record_range, start, count))
+            # Bound buffering: wait for the oldest batch before queueing more
+            while len(in_flight) >= jobs * 2:
+                _write_records(out, in_flight.popleft().result(), lines)
+        while in_flight:
+            _write_records(out, in_flight.popleft().result(), lines)
+    
+    return record_count
+
+def _write_records(out, plaintexts, lines):
+    if lines:
+        out.write(b''.join(plaintext + b'\n' for plaintext in plaintexts))
+    else:
+        out.write(b''.join(struct.pack('>I', len(plaintext)) + plaintext for plaintext in plaintexts))
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Decrypt RSA-encrypted data')
+    parser.add_argument('--bulk', metavar='ARCHIVE',
+                        help='Decrypt a file of concatenated fixed-size ciphertext records')
+    parser.add_argument('--output', default='decrypted_records.bin',
+                        help='Output file for --bulk (default: decrypted_records.bin)')
+    parser.add_argument('--key', default='user_keys/private_key.pem',
+                        help='Private key file (default: user_keys/private_key.pem)')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Worker processes for --bulk (default: CPU count)')
+    parser.add_argument('--batch-size', type=int, default=1024,
+                        help='Records per worker task for --bulk (default: 1024)')
+    parser.add_argument('--lines', action='store_true',
+                        help='Write newline-terminated records instead of length-prefixed ones')
+    args = parser.parse_args()
+    
+    if args.bulk:
+        try:
+            start_time = time.time()
+            count = decrypt_bulk(args.bulk, args.output, args.key, args.jobs, args.batch_size, args.lines)
+            elapsed = time.time() - start_time
+            print(f"\n✅ Decrypted {count} records to {args.output}")
+            print(f"⏱️ {elapsed:.2f} seconds ({count / elapsed if elapsed else 0:.0f} records/sec)")
+        except Exception as e:
+            print(f"\n❌ Error: {str(e)}")
+            sys.exit(1)
+        sys.exit(0)
+    
     # Example usage
     try:
         # Read encrypted data from a file (you would need to have this file)
@@ -40,7 +166,7 @@ if __name__ == '__main__':
             encrypted_data = f.read()
         
         # Decrypt the data
-        decrypted_message = decrypt_data(encrypted_data)
+        decrypted_message = decrypt_data(encrypted_data, args.key)
         print("\n✅ Message decrypted successfully!")
         print("\nDecrypted message:")
         print("-" * 50)
@@ -1,18 +1,24 @@
 import rsa
+import argparse
 import os
 import sys
 import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-def generate_rsa_keys(key_size=4096):
+from utils.key_store import DEFAULT_PATH, KeyStore
+
+def generate_rsa_keys(key_size=4096, jobs=1):
     """Generate a pair of RSA keys with specified key size"""
     try:
         print(f"\n🔐 Generating {key_size}-bit RSA keys...")
-        print("This may take a few moments for {key_size}-bit keys...")
+        print(f"This may take a few moments for {key_size}-bit keys...")
         
         start_time = time.time()
         
-        # Generate the key pair
-        (pubkey, privkey) = rsa.newkeys(key_size)
+        # Generate the key pair; with jobs > 1 the prime candidate search for
+        # p and q is spread over that many processes
+        (pubkey, privkey) = rsa.newkeys(key_size, poolsize=jobs)
         
         # Calculate generation time
         generation_time = time.time() - start_time
@@ -36,7 +42,7 @@ def generate_rsa_keys(key_size=4096):
             print(f"\n⚠️ Warning: Generated key size is {actual_key_size} bits instead of {key_size} bits")
         
         print("\n✅ Keys generated successfully!")
-        print(f"⏱️ Generation time: {generation_time:.2f} seconds")
+        print(f"⏱️ Generation time: {generation_time:.2f} seconds ({1 / generation_time:.2f} keys/sec)")
         print(f"🔑 Key size: {actual_key_size} bits")
         
         print("\n📄 Public Key (user_keys/public_key.pem):")
@@ -60,17 +66,71 @@ def generate_rsa_keys(key_size=4096):
         print(f"\n❌ Error generating keys: {str(e)}")
         sys.exit(1)
 
+def _timed_newkeys(key_size):
+    """Generate one key pair in a worker process and time it"""
+    start_time = time.time()
+    pubkey, privkey = rsa.newkeys(key_size)
+    return pubkey, privkey, time.time() - start_time
+
+def generate_key_batch(key_size=4096, count=1, jobs=1, store_path=DEFAULT_PATH):
+    """Generate count key pairs across jobs processes into the key store
+
+    Each pair gets a unique id. The batch is written in one transaction,
+    so an interrupted run stores no keys.
+    """
+    try:
+        print(f"\n🔐 Generating {count} {key_size}-bit RSA key pairs using {jobs} processes...")
+        start_time = time.time()
+        entries = []
+        
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(_timed_newkeys, key_size) for _ in range(count)]
+            for index, future in enumerate(as_completed(futures), 1):
+                pubkey, privkey, generation_time = future.result()
+                
+                key_id = uuid.uuid4().hex
+                entries.append((key_id, pubkey, privkey))
+                
+                print(f"   [{index}/{count}] {key_id}: {generation_time:.2f} seconds")
+        
+        KeyStore(store_path).put_many(entries)
+        
+        total_time = time.time() - start_time
+        print("\n✅ Keys generated successfully!")
+        print(f"⏱️ Total time: {total_time:.2f} seconds")
+        print(f"🚀 Throughput: {count / total_time:.2f} keys/sec")
+        print(f"\n💾 Keys have been saved to {os.path.abspath(store_path)}")
+        return [key_id for key_id, _, _ in entries]
+        
+    except Exception as e:
+        print(f"\n❌ Error generating keys: {str(e)}")
+        sys.exit(1)
+
 if __name__ == '__main__':
-    # Allow custom key size through command line argument
+    parser = argparse.ArgumentParser(description='Generate RSA key pairs')
+    parser.add_argument('key_size', nargs='?', default='4096',
+                        help='Key size in bits (default: 4096)')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of processes to generate with (default: 1)')
+    parser.add_argument('--count', type=int, default=1,
+                        help='Number of key pairs to generate; more than one stores '
+                             'each pair in the key store under a unique id (default: 1)')
+    parser.add_argument('--store', default=DEFAULT_PATH,
+                        help=f'Key store file for batches (default: {DEFAULT_PATH})')
+    args = parser.parse_args()
+    
     key_size = 4096  # Default to 4096 bits
-    if len(sys.argv) > 1:
-        try:
-            key_size = int(sys.argv[1])
-            if key_size < 2048:
-                print("⚠️ Warning: Key sizes below 2048 bits are not recommended for security reasons.")
-                if input("Do you want to continue? (y/n): ").lower() != 'y':
-                    sys.exit(0)
-        except ValueError:
-            print("❌ Invalid key size. Using default 4096 bits.")
+    try:
+        key_size = int(args.key_size)
+        if key_size < 2048:
+            print("⚠️ Warning: Key sizes below 2048 bits are not recommended for security reasons.")
+            if input("Do you want to continue? (y/n): ").lower() != 'y':
+                sys.exit(0)
+    except ValueError:
+        print("❌ Invalid key size. Using default 4096 bits.")
     
-    generate_rsa_keys(key_size) 
\ No newline at end of file
+    jobs = max(args.jobs, 1)
+    if args.count > 1:
+        generate_key_batch(key_size, args.count, jobs, args.store)
+    else:
+        generate_rsa_keys(key_size, jobs) 
\ No newline at end of file
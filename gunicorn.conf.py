@@ -0,0 +1,45 @@
+"""Production launcher settings
+
+    gunicorn -c gunicorn.conf.py
+
+Runs asgi:application under uvicorn workers. Each worker also starts its
+own RSA process pool (RSA_WORKERS, one per core by default), so a single
+web worker already keeps every core busy with private-key work.
+
+One web worker is the default because several features keep their state
+inside the worker process. With WEB_CONCURRENCY above 1, requests land on
+any worker, so:
+
+- key handles from POST /keys are only known to the worker that issued
+  them; use key ids from the key store (public_key_id) instead
+- job ids from POST /jobs need JOB_STORE_PATH so every worker sees them
+- rate limits are per worker unless RATE_LIMIT_STORE_PATH is set
+- Idempotency-Key replays are per worker; IDEMPOTENCY_SPILL_PATH only
+  holds entries evicted from memory, so it does not make them shared
+- every worker would rotate the same LOG_FILE; set LOG_FILE= to log to
+  stdout only and let the process manager collect it
+
+SQLite stores open their connection per process, so preloading the app
+never shares a connection across fork().
+"""
+import os
+
+wsgi_app = 'asgi:application'
+worker_class = 'uvicorn_worker.UvicornWorker'
+
+bind = os.environ.get('BIND', '127.0.0.1:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))  # see above before raising
+
+# Request threads per worker, read by asgi.py
+threads = int(os.environ.get('ASGI_THREADS', 32))
+os.environ['ASGI_THREADS'] = str(threads)
+
+# Import the app once in the master; background threads and pools are
+# started per worker by the ASGI lifespan startup
+preload_app = os.environ.get('PRELOAD', '1') == '1'
+
+keepalive = int(os.environ.get('KEEPALIVE', 5))  # seconds an idle connection stays open
+timeout = int(os.environ.get('WORKER_TIMEOUT', 120))  # seconds before a silent worker is restarted
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', 30))  # seconds to finish requests on shutdown
+
+accesslog = os.environ.get('ACCESS_LOG')  # e.g. '-' for stdout; disabled by default
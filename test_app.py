@@ -0,0 +1,392 @@
+import logging
+import os
+import tempfile
+
+os.environ.setdefault('RSA_WORKERS', '0')
+os.environ.setdefault('LOG_FILE', '')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('KEY_STORE_PATH', os.path.join(tempfile.mkdtemp(), 'keys.db'))
+
+import pytest  # noqa: E402
+import rsa  # noqa: E402
+
+import app  # noqa: E402
+from utils.rate_limit import RateLimiter  # noqa: E402
+from utils.structured_log import JsonFormatter  # noqa: E402
+
+PUB, PRIV = rsa.newkeys(1024)
+PUB_PEM, PRIV_PEM = PUB.save_pkcs1().decode(), PRIV.save_pkcs1().decode()
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = RateLimiter(rate=0.001, burst=0.3)  # two 1024-bit operations
+    monkeypatch.setattr(app, 'rate_limiter', limiter)
+    return limiter
+
+
+def decrypt_request(client, headers=None):
+    ciphertext = app.encode_ciphertext(rsa.encrypt(b'hi', PUB), 'base64')
+    return client.post('/decrypt', json={'encrypted_text': ciphertext, 'private_key': PRIV_PEM,
+                                         'format': 'base64'}, headers=headers)
+
+
+def test_unlisted_api_keys_share_the_address_bucket(client, limiter, monkeypatch):
+    assert [decrypt_request(client).status_code for _ in range(3)] == [200, 200, 429]
+    # Rotating X-API-Key values does not buy a fresh bucket
+    assert decrypt_request(client, {'X-API-Key': 'made-up'}).status_code == 429
+    monkeypatch.setattr(app, 'rate_limit_api_keys', {app.hashlib.sha256(b'partner').hexdigest()[:32]})
+    assert decrypt_request(client, {'X-API-Key': 'partner'}).status_code == 200
+
+
+def test_batch_items_are_charged_per_rsa_block(client, limiter):
+    container = app.encrypt_bytes(os.urandom(1000), PUB, 'blocks')  # 9 blocks
+    body = {'encrypted_texts': [app.encode_ciphertext(container, 'base64')], 'private_key': PRIV_PEM,
+            'format': 'base64'}
+    assert client.post('/decrypt/batch', json=body).status_code == 429
+    assert limiter.rejected == 1
+
+
+def test_encrypt_output_format_negotiation(client):
+    body = {'message': 'hello', 'public_key': PUB_PEM}
+    emoji = client.post('/encrypt', json=body).json
+    assert emoji['format'] == 'emoji'
+    assert app.decrypt_bytes(app.decode_ciphertext(emoji['encrypted_text'], 'emoji'), PRIV) == b'hello'
+    b64 = client.post('/encrypt', json=dict(body, format='base64')).json
+    assert app.decrypt_bytes(app.decode_ciphertext(b64['encrypted_text'], 'base64'), PRIV) == b'hello'
+    raw = client.post('/encrypt', json=body, headers={'Accept': 'application/octet-stream'})
+    assert raw.mimetype == 'application/octet-stream'
+    assert app.decrypt_bytes(raw.data, PRIV) == b'hello'
+    # An explicit format wins over the Accept header
+    assert client.post('/encrypt', json=dict(body, format='base64'),
+                       headers={'Accept': 'application/octet-stream'}).is_json
+    assert client.post('/encrypt', json=dict(body, format='hex')).status_code == 400
+
+
+def test_binary_bodies_and_non_utf8_plaintext(client):
+    handles = client.post('/keys', json={'private_key': PRIV_PEM}).json
+    plaintext = b'\xff\xfe raw bytes'
+    encrypted = client.post('/encrypt', data=plaintext, content_type='application/octet-stream',
+                            query_string={'public_key_handle': handles['public_key_handle'], 'format': 'binary'})
+    assert encrypted.mimetype == 'application/octet-stream'
+
+    def decrypt(accept):
+        return client.post('/decrypt', data=encrypted.data, content_type='application/octet-stream',
+                           query_string={'private_key_handle': handles['private_key_handle']},
+                           headers={'Accept': accept})
+
+    # PEM keys would end up in access logs
+    for path, query in [('/decrypt', {'private_key': PRIV_PEM}), ('/decrypt/file', {'private_key': PRIV_PEM}),
+                        ('/encrypt/file', {'public_key': PUB_PEM})]:
+        response = client.post(path, data=encrypted.data, query_string=query,
+                               content_type='application/octet-stream')
+        assert response.status_code == 400 and 'query string' in response.json['error']
+
+    raw = decrypt('application/octet-stream')
+    assert raw.mimetype == 'application/octet-stream' and raw.data == plaintext
+    as_json = decrypt('application/json')
+    assert as_json.status_code == 400
+    assert 'application/octet-stream' in as_json.json['error']
+
+
+def test_metrics_families_are_contiguous_and_typed(client, monkeypatch):
+    monkeypatch.setattr(app.key_pool, 'stats', lambda: {
+        '2048': {'ready': 1, 'served': 5, 'empty_hits': 0},
+        '4096': {'ready': 0, 'served': 2, 'empty_hits': 1},
+    })
+    client.post('/encrypt', json={'message': 'hi', 'public_key': PUB_PEM})
+    text = client.get('/metrics').get_data(as_text=True)
+
+    # A sample must belong to the family typed most recently, and no family
+    # is typed twice, so every family is one contiguous group
+    types, current = {}, None
+    for line in text.splitlines():
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split()
+            assert name not in types, f'{name} typed twice'
+            types[name], current = kind, name
+            continue
+        sample = line.split('{')[0].split()[0]
+        assert sample in (current, f'{current}_bucket', f'{current}_sum', f'{current}_count'), sample
+    assert types['rsa_key_pool_served_total'] == 'counter'
+    assert types['rsa_key_pool_ready'] == 'gauge'
+    assert types['rsa_worker_pool_completed_total'] == 'counter'
+    assert 'rsa_key_pool_served_total{key_size="4096"} 2' in text
+
+
+@pytest.mark.parametrize('path, body, error', [
+    ('/encrypt', {'message': 5, 'public_key': PUB_PEM}, 'Message must be a string'),
+    ('/encrypt', {'message': 'hi', 'public_key': PUB_PEM, 'mode': ['rsa']}, 'Unknown encryption mode'),
+    ('/encrypt', {'message': 'hi', 'public_key': 42}, 'must be a PEM string'),
+    ('/encrypt', {'message': 'hi', 'public_key_handle': {'a': 1}}, 'Key handle must be a string'),
+    ('/encrypt', ['message', 'hi'], 'JSON body must be an object'),
+    ('/encrypt', 'hi', 'JSON body must be an object'),
+    ('/decrypt', {'encrypted_text': 7, 'private_key': PRIV_PEM}, 'must be a string'),
+    ('/decrypt', {'encrypted_text': 'aGk=', 'format': 'base64', 'private_key_handle': ['h']},
+     'Key handle must be a string'),
+    ('/decrypt', [], 'JSON body must be an object'),
+    ('/sign', {'message': {'a': 1}, 'private_key': PRIV_PEM}, 'must be a string'),
+    ('/encrypt/batch', ['hi'], 'require a JSON body'),
+    ('/validate_keys', {'public_key': 1, 'private_key': 2}, 'must be PEM strings'),
+    ('/jobs', {'type': ['decrypt']}, 'type'),
+    ('/jobs', [1, 2], 'JSON body must be an object'),
+])
+def test_wrong_json_types_are_rejected(client, path, body, error):
+    response = client.post(path, json=body)
+    assert response.status_code == 400
+    assert error in response.json['error']
+
+
+@pytest.fixture
+def fake_keygen(monkeypatch):
+    monkeypatch.setattr(app.key_pool, 'acquire', lambda bits, timeout=None: (PUB, PRIV, True))
+
+
+def test_keygen_flags_parse_form_strings(client, fake_keygen, monkeypatch):
+    monkeypatch.setattr(app, 'rate_limiter', None)
+    response = client.post('/keys/generate', data={'key_size': '2048', 'register': 'false', 'store': 'off'})
+    assert response.status_code == 200
+    assert 'private_key_handle' not in response.json and 'key_id' not in response.json
+    response = client.post('/keys/generate', data={'key_size': '2048', 'register': 'true', 'store': '1'})
+    assert 'private_key_handle' in response.json and 'key_id' in response.json
+    assert client.post('/keys/generate', data={'key_size': '2048', 'store': 'maybe'}).status_code == 400
+    assert client.post('/jobs', data={'type': 'keygen', 'register': 'maybe'}).status_code == 400
+
+
+def test_keygen_is_rate_limited_and_bounded(client, fake_keygen, monkeypatch):
+    monkeypatch.setattr(app, 'rate_limiter', RateLimiter(rate=0.001, burst=10))
+    assert client.post('/keys/generate', json={'key_size': 2048}).status_code == 200
+    assert client.post('/keys/generate', json={'key_size': 2048}).status_code == 429
+    assert client.post('/jobs', json={'type': 'keygen', 'key_size': 2048}).status_code == 429
+
+    monkeypatch.setattr(app, 'rate_limiter', None)
+    monkeypatch.setattr(app, 'keygen_slots', app.threading.BoundedSemaphore(1))
+    app.keygen_slots.acquire()
+    busy = client.post('/keys/generate', json={'key_size': 2048})
+    assert busy.status_code == 503 and 'Retry-After' in busy.headers
+    app.keygen_slots.release()
+
+    def timeout(bits, timeout=None):
+        raise app.PoolTimeout(f'No {bits}-bit key pair available')
+
+    monkeypatch.setattr(app.key_pool, 'acquire', timeout)
+    response = client.post('/keys/generate', json={'key_size': 2048})
+    # Same body and headers as every other busy response
+    assert response.status_code == 503 and response.json == busy.json
+    assert response.headers['Retry-After'] == busy.headers['Retry-After']
+
+
+def test_public_key_work_stays_off_the_worker_pool(client, monkeypatch):
+    pool = app.CryptoWorkerPool(workers=2, max_pending=1)
+    pool._acquire()  # saturated by a long-running private-key request
+    monkeypatch.setattr(app, 'worker_pool', pool)
+    body = {'message': 'x' * 10000, 'public_key': PUB_PEM, 'mode': 'blocks', 'compression': 'none'}  # 86 blocks
+    assert client.post('/encrypt', json=body).status_code == 200
+    response = client.post('/encrypt/batch', json=dict(body, messages=[body.pop('message')]))
+    assert 'encrypted_text' in response.json['results'][0]
+    assert decrypt_request(client).status_code == 503
+
+
+def test_batch_errors_are_reported_per_item(client, monkeypatch):
+    monkeypatch.setattr(app, 'rate_limiter', None)
+    response = client.post('/encrypt/batch', json={'messages': ['one', 7, 'x' * 200, 'two'], 'public_key': PUB_PEM,
+                                                   'mode': 'rsa', 'compression': 'none', 'format': 'base64'})
+    assert response.status_code == 200
+    encrypted, not_text, too_long, last = response.json['results']
+    assert 'must be a string' in not_text['error']
+    assert 'too long' in too_long['error']
+
+    other = rsa.newkeys(512)[0]
+    texts = [encrypted['encrypted_text'], '!!!', app.encode_ciphertext(rsa.encrypt(b'hi', other), 'base64'),
+             app.encode_ciphertext(rsa.encrypt(b'\xff', PUB), 'base64'), None, last['encrypted_text']]
+    response = client.post('/decrypt/batch', json={'encrypted_texts': texts, 'private_key': PRIV_PEM,
+                                                   'format': 'base64'})
+    assert response.status_code == 200
+    results = response.json['results']
+    assert results[0] == {'decrypted_text': 'one'} and results[-1] == {'decrypted_text': 'two'}
+    assert [sorted(result) for result in results[1:-1]] == [['error']] * 4
+    assert 'Invalid base64' in results[1]['error']
+    assert 'UTF-8' in results[3]['error']
+
+
+def test_saturated_pool_answers_503_with_retry_after(client, monkeypatch):
+    monkeypatch.setattr(app, 'rate_limiter', None)
+    pool = app.CryptoWorkerPool(workers=1, max_pending=1, retry_after=9)
+    pool._acquire()
+    monkeypatch.setattr(app, 'worker_pool', pool)
+    response = decrypt_request(client)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '9'
+    assert pool.rejected == 1
+
+
+def test_default_single_block_output_is_plain_pkcs1(client):
+    message = 'a' * 73  # would shrink under compression
+    response = client.post('/encrypt', json={'message': message, 'public_key': PUB_PEM, 'format': 'base64'})
+    ciphertext = app.decode_ciphertext(response.json['encrypted_text'], 'base64')
+    assert rsa.decrypt(ciphertext, PRIV) == message.encode()
+
+
+def test_decrypt_batch_runs_in_parallel_groups(client, monkeypatch):
+    monkeypatch.setattr(app, 'rate_limiter', None)
+    pool = app.CryptoWorkerPool(workers=2, max_pending=3)
+    monkeypatch.setattr(app, 'worker_pool', pool)
+    texts = [app.encode_ciphertext(rsa.encrypt(f'item {i}'.encode(), PUB), 'base64') for i in range(5)]
+    texts[1], texts[3] = 5, app.encode_ciphertext(b'\0' * 128, 'base64')
+    try:
+        response = client.post('/decrypt/batch', json={'encrypted_texts': texts, 'private_key': PRIV_PEM,
+                                                       'format': 'base64'})
+        results = response.json['results']
+        assert [result.get('decrypted_text') for result in results] == ['item 0', None, 'item 2', None, 'item 4']
+        assert 'must be a string' in results[1]['error'] and 'does not match' in results[3]['error']
+
+        # Only one slot free: the batch still runs, as a single group
+        pool._acquire(2)
+        response = client.post('/decrypt/batch', json={'encrypted_texts': texts[::2], 'private_key': PRIV_PEM,
+                                                       'format': 'base64'})
+        assert [result['decrypted_text'] for result in response.json['results']] == ['item 0', 'item 2', 'item 4']
+        pool._acquire()
+        response = client.post('/decrypt/batch', json={'encrypted_texts': texts[:1], 'private_key': PRIV_PEM,
+                                                       'format': 'base64'})
+        assert response.status_code == 503
+    finally:
+        pool.shutdown()
+    # One call per group: two for the first batch, one for the second
+    assert pool.completed == 3
+
+
+def test_only_full_key_validation_is_rate_limited(client, limiter):
+    body = {'public_key': PUB_PEM, 'private_key': PRIV_PEM}
+    assert [client.post('/validate_keys', json=body).json['valid'] for _ in range(5)] == [True] * 5
+    assert limiter.rejected == 0
+    statuses = [client.post('/validate_keys', json=dict(body, mode='full')).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+
+
+def test_plaintext_and_keys_never_reach_log_records(client, caplog):
+    caplog.set_level(logging.DEBUG)
+    secret = 'attack at dawn'
+    encrypted = client.post('/encrypt', json={'message': secret, 'public_key': PUB_PEM, 'format': 'base64'}).json
+    client.post('/decrypt', json={'encrypted_text': encrypted['encrypted_text'], 'private_key': PRIV_PEM,
+                                  'format': 'base64'})
+    client.post('/decrypt', json={'encrypted_text': encrypted['encrypted_text'], 'private_key': 'not a key',
+                                  'format': 'base64'})
+    client.post('/sign', json={'message': secret, 'private_key': PRIV_PEM})
+    assert any(record.name.startswith('app.routes.') for record in caplog.records)
+    formatter = JsonFormatter()
+    for record in caplog.records:
+        line = formatter.format(record)
+        assert secret not in line and 'not a key' not in line
+        assert 'PRIVATE KEY' not in line and 'PUBLIC KEY' not in line
+
+
+def sign_request(client, message, **fields):
+    return client.post('/sign', json=dict({'message': message, 'private_key': PRIV_PEM, 'format': 'base64'}, **fields))
+
+
+def test_sign_verify_round_trip(client, monkeypatch):
+    monkeypatch.setattr(app, 'rate_limiter', None)
+    signed = sign_request(client, 'pay 10', hash='SHA-512').json
+    assert signed['hash'] == 'SHA-512' and signed['format'] == 'base64'
+    body = {'message': 'pay 10', 'signature': signed['signature'], 'public_key': PUB_PEM, 'format': 'base64'}
+    assert client.post('/verify', json=body).json == {'valid': True, 'hash': 'SHA-512'}
+
+    assert client.post('/verify', json=dict(body, message='pay 1000')).json == {'valid': False, 'hash': None}
+    tampered = bytearray(app.decode_ciphertext(signed['signature'], 'base64'))
+    tampered[-1] ^= 1
+    response = client.post('/verify', json=dict(body, signature=app.encode_ciphertext(bytes(tampered), 'base64')))
+    assert response.status_code == 200 and response.json['valid'] is False
+
+
+def test_verify_batch_reports_each_item(client, monkeypatch):
+    monkeypatch.setattr(app, 'rate_limiter', None)
+    signature = sign_request(client, 'one').json['signature']
+    items = [{'message': 'one', 'signature': signature}, {'message': 'two', 'signature': signature},
+             {'message': 'one'}, 'not an object', {'message': 'one', 'signature': '!!!'}]
+    response = client.post('/verify/batch', json={'items': items, 'public_key': PUB_PEM, 'format': 'base64'})
+    assert response.status_code == 200
+    results = response.json['results']
+    assert results[0] == {'valid': True, 'hash': 'SHA-256'} and results[1] == {'valid': False, 'hash': None}
+    assert 'must be strings' in results[2]['error'] and 'must be an object' in results[3]['error']
+    assert 'Invalid base64' in results[4]['error']
+
+
+@pytest.mark.parametrize('path, body, error', [
+    ('/sign', {'private_key': PRIV_PEM}, 'Missing message'),
+    ('/sign', {'message': 'hi'}, 'Missing private key'),
+    ('/sign', {'message': 'hi', 'private_key': 'junk'}, 'Invalid private key format'),
+    ('/sign', {'message': 'hi', 'private_key': PRIV_PEM, 'hash': 'MD4'}, 'Hash must be one of'),
+    ('/verify', {'message': 'hi', 'public_key': PUB_PEM}, 'Both message and signature are required'),
+    ('/verify', {'message': 'hi', 'signature': 'AA==', 'public_key': PUB_PEM, 'format': 'hex'}, 'Format must be'),
+    ('/verify', {'message': 'hi', 'signature': '!!!', 'public_key': PUB_PEM, 'format': 'base64'}, 'Invalid base64'),
+    ('/verify', {'message': 'hi', 'signature': 'AA==', 'format': 'base64'}, 'Missing public key'),
+    ('/verify/batch', {'items': 'x', 'public_key': PUB_PEM}, "'items' must be a list"),
+    ('/verify/batch', {'items': [], 'public_key': 'junk'}, 'Invalid public key format'),
+])
+def test_sign_and_verify_reject_bad_input(client, monkeypatch, path, body, error):
+    monkeypatch.setattr(app, 'rate_limiter', None)
+    response = client.post(path, json=body)
+    assert response.status_code == 400
+    assert error in response.json['error']
+
+
+def idempotent_encrypt(client, key, **fields):
+    body = dict({'message': 'transfer 10', 'public_key': PUB_PEM, 'format': 'base64'}, **fields)
+    return client.post('/encrypt', json=body, headers={'Idempotency-Key': key})
+
+
+def test_idempotent_replay_and_conflict(client):
+    first = idempotent_encrypt(client, 'replay-1')
+    assert first.status_code == 200 and 'Idempotent-Replayed' not in first.headers
+    again = idempotent_encrypt(client, 'replay-1')
+    assert again.headers['Idempotent-Replayed'] == 'true'
+    assert again.data == first.data and again.content_type == first.content_type
+
+    conflict = idempotent_encrypt(client, 'replay-1', message='transfer 1000')
+    assert conflict.status_code == 422 and 'error' in conflict.json
+    assert idempotent_encrypt(client, 'x' * 256).status_code == 400
+
+
+def test_idempotency_does_not_cache_errors(client):
+    too_long = idempotent_encrypt(client, 'error-1', message='x' * 500, mode='rsa')
+    assert too_long.status_code == 400
+    retry = idempotent_encrypt(client, 'error-1', message='x' * 500, mode='rsa')
+    assert retry.status_code == 400 and 'Idempotent-Replayed' not in retry.headers
+    # Nothing was stored, so the key is still free for a different request
+    assert idempotent_encrypt(client, 'error-1', message='x' * 500, mode='envelope').status_code == 200
+
+
+def test_idempotency_replays_entries_spilled_to_sqlite(client, monkeypatch, tmp_path):
+    cache = app.IdempotencyCache(max_entries=1, spill_path=str(tmp_path / 'idempotency.db'))
+    monkeypatch.setattr(app, 'idempotency_cache', cache)
+    first = idempotent_encrypt(client, 'spill-1')
+    idempotent_encrypt(client, 'spill-2')  # pushes spill-1 out of memory
+    assert cache.spilled == 1
+    replay = idempotent_encrypt(client, 'spill-1')
+    assert replay.headers['Idempotent-Replayed'] == 'true' and replay.data == first.data
+    assert idempotent_encrypt(client, 'spill-1', message='other').status_code == 422
+
+
+def test_static_assets_are_versioned_and_cached(client):
+    with app.app.test_request_context():
+        url = app.url_for('static', filename='css/style.css')
+    version = app.static_files.version('css/style.css')
+    assert url == f'/static/css/style.css?v={version}'
+    assert url in client.get('/').get_data(as_text=True)
+
+    versioned = client.get(url)
+    assert versioned.status_code == 200
+    assert versioned.headers['Cache-Control'] == f'public, max-age={app.STATIC_MAX_AGE}, immutable'
+    for stale in ('/static/css/style.css', '/static/css/style.css?v=old'):
+        assert client.get(stale).headers['Cache-Control'] == 'no-cache'
+
+    not_modified = client.get(url, headers={'If-None-Match': versioned.headers['ETag']})
+    assert not_modified.status_code == 304 and not not_modified.data
+
+    for path in ('/static/../app.py', '/static/%2e%2e/app.py', '/static/css/../../app.py'):
+        assert client.get(path).status_code == 404
@@ -0,0 +1,109 @@
+import asyncio
+import io
+import os
+import tempfile
+
+os.environ.setdefault('RSA_WORKERS', '0')
+os.environ.setdefault('LOG_FILE', '')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('KEY_STORE_PATH', os.path.join(tempfile.mkdtemp(), 'keys.db'))
+
+import rsa  # noqa: E402
+
+import app  # noqa: E402
+from asgi import WSGIApplication, build_environ  # noqa: E402
+from utils.streaming import StreamDecryptor  # noqa: E402
+
+PUB, PRIV = rsa.newkeys(512)
+
+
+def http_scope(path='/', method='POST', headers=(), query=b''):
+    return {'type': 'http', 'method': method, 'path': path, 'query_string': query, 'http_version': '1.1',
+            'headers': list(headers), 'server': ('testserver', 80), 'client': ('10.0.0.1', 5000)}
+
+
+def call(application, scope, body_chunks=(b'',)):
+    """Drive one ASGI request, returning the messages the app sent"""
+    async def run():
+        received = [{'type': 'http.request', 'body': chunk, 'more_body': i < len(body_chunks) - 1}
+                    for i, chunk in enumerate(body_chunks)]
+        sent = []
+
+        async def receive():
+            return received.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        await application(scope, receive, send)
+        return sent
+    return asyncio.run(run())
+
+
+def echo_app(environ, start_response):
+    body = environ['wsgi.input'].read()
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [environ.get('HTTP_COOKIE', '').encode(), b'|', environ.get('HTTP_ACCEPT', '').encode(), b'|', body]
+
+
+def test_chunked_body_and_merged_headers():
+    headers = [(b'cookie', b'a=1'), (b'cookie', b'b=2'), (b'accept', b'text/plain'), (b'accept', b'*/*')]
+    sent = call(WSGIApplication(echo_app), http_scope(headers=headers), [b'one ', b'two ', b'three'])
+    assert sent[0]['type'] == 'http.response.start' and sent[0]['status'] == 200
+    body = b''.join(message.get('body', b'') for message in sent[1:])
+    assert body == b'a=1; b=2|text/plain,*/*|one two three'
+    assert sent[-1] == {'type': 'http.response.body', 'body': b'', 'more_body': False}
+
+
+def test_environ_from_scope():
+    environ = build_environ(http_scope('/encrypt', query=b'format=binary',
+                                       headers=[(b'content-type', b'application/json')]), io.BytesIO())
+    assert environ['PATH_INFO'] == '/encrypt' and environ['QUERY_STRING'] == 'format=binary'
+    assert environ['CONTENT_TYPE'] == 'application/json' and 'HTTP_CONTENT_TYPE' not in environ
+    assert environ['REMOTE_ADDR'] == '10.0.0.1'
+
+
+def test_file_response_is_streamed():
+    handle = app.key_cache.register(PUB).handle
+    data = os.urandom(3 * app.FILE_CHUNK_SIZE + 10)
+    chunks = [data[i:i + 50000] for i in range(0, len(data), 50000)]
+    sent = call(WSGIApplication(app.app), http_scope('/encrypt/file', query=f'public_key_handle={handle}'.encode(),
+                                                     headers=[(b'content-type', b'application/octet-stream')]),
+                chunks)
+    assert sent[0]['status'] == 200
+    bodies = [message['body'] for message in sent[1:] if message['body']]
+    # Header plus one message per frame rather than one buffered body
+    assert len(bodies) == 5
+    stream = io.BytesIO(b''.join(bodies))
+    assert b''.join(StreamDecryptor(stream.read, PRIV).chunks()) == data
+
+
+def lifespan(application, messages):
+    """Drive the lifespan protocol, returning the messages the app sent"""
+    async def run():
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        await application({'type': 'lifespan'}, receive, send)
+        return sent
+    return asyncio.run(run())
+
+
+def test_lifespan_startup_and_shutdown():
+    calls = []
+    application = WSGIApplication(echo_app, on_startup=lambda: calls.append('startup'),
+                                  on_shutdown=lambda: calls.append('shutdown'))
+    sent = lifespan(application, [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+    assert sent == [{'type': 'lifespan.startup.complete'}, {'type': 'lifespan.shutdown.complete'}]
+    assert calls == ['startup', 'shutdown']
+
+    def fail():
+        raise RuntimeError('no database')
+
+    sent = lifespan(WSGIApplication(echo_app, on_startup=fail), [{'type': 'lifespan.startup'}])
+    assert sent == [{'type': 'lifespan.startup.failed', 'message': 'no database'}]
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+import rsa
+
+from utils.blocks import BlockLimitError, block_count, open_blocks, seal_blocks
+from utils.crypto import decrypt_bytes, encrypt_bytes
+from utils.workers import CryptoWorkerPool
+
+PUB, PRIV = rsa.newkeys(512)
+MESSAGE = os.urandom(1000)
+
+
+def test_round_trip_and_layout():
+    sealed = seal_blocks(MESSAGE, PUB)
+    assert block_count(sealed, PRIV) == 19  # 53 bytes per 64-byte block
+    assert open_blocks(sealed, PRIV) == MESSAGE
+    assert open_blocks(seal_blocks(b'', PUB), PRIV) == b''
+    # A single RSA block is never taken for a container
+    assert block_count(rsa.encrypt(b'hi', PUB), PRIV) is None
+
+
+def test_parallel_matches_inline():
+    pool = CryptoWorkerPool(workers=2)
+    try:
+        assert open_blocks(seal_blocks(MESSAGE * 4, PUB), PRIV, pool) == MESSAGE * 4
+    finally:
+        pool.shutdown()
+
+
+def test_rejects_tampering_and_limits():
+    sealed = seal_blocks(MESSAGE, PUB)
+    with pytest.raises(rsa.pkcs1.DecryptionError):
+        open_blocks(sealed[:-1], PRIV)
+    with pytest.raises(BlockLimitError):
+        open_blocks(sealed, PRIV, max_blocks=10)
+    with pytest.raises(BlockLimitError):
+        seal_blocks(MESSAGE, PUB, max_blocks=10)
+
+
+def test_blocks_mode():
+    assert len(encrypt_bytes(b'short', PUB, 'blocks')) == 64
+    encrypted = encrypt_bytes(MESSAGE, PUB, 'blocks')
+    assert block_count(encrypted, PRIV) == 19
+    assert decrypt_bytes(encrypted, PRIV) == MESSAGE
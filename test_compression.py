@@ -0,0 +1,44 @@
+import zlib
+
+import pytest
+import rsa
+
+from utils.compression import MARKER, DecompressionError, compress, decompress
+from utils.crypto import decrypt_bytes, encrypt_bytes
+
+PUB, PRIV = rsa.newkeys(1024)
+JSON = b'{"user": "alice", "items": [1, 2, 3]}' * 20
+
+
+def test_round_trip_each_method():
+    for method in ('auto', 'zlib', 'lzma', 'none'):
+        packed = compress(JSON, method)
+        assert decompress(packed) == JSON
+        assert (packed == JSON) == (method == 'none')
+    # Short or incompressible data is left alone
+    assert compress(b'hi', 'auto') == b'hi'
+    assert compress(b'\x01\x02\x03', 'zlib') == b'\x01\x02\x03'
+
+
+def test_marker_prefixed_data_survives():
+    data = MARKER + b'raw bytes'
+    assert compress(data, 'none') != data
+    assert decompress(compress(data, 'none')) == data
+
+
+def test_size_limit_and_corruption():
+    bomb = compress(b'\x00' * 100000, 'zlib')
+    with pytest.raises(DecompressionError):
+        decompress(bomb, max_size=1000)
+    # A header understating the size cannot expand past it
+    lying = bomb[:3] + (10).to_bytes(4, 'big') + bomb[7:]
+    with pytest.raises(DecompressionError):
+        decompress(lying)
+    with pytest.raises(DecompressionError):
+        decompress(MARKER + b'\x01\x00\x00\x00\x05' + zlib.compress(b'hello')[:-2] + b'xx')
+
+
+def test_compressed_message_fits_one_block():
+    encrypted = encrypt_bytes(JSON, PUB, 'rsa', 'zlib')
+    assert len(encrypted) == 128
+    assert decrypt_bytes(encrypted, PRIV) == JSON
@@ -0,0 +1,53 @@
+import struct
+
+import pytest
+import rsa
+
+from decrypt_data import decrypt_bulk
+
+PUB, PRIV = rsa.newkeys(512)
+RECORDS = [f'record {i}'.encode() for i in range(25)]
+
+
+@pytest.fixture
+def key_path(tmp_path):
+    path = tmp_path / 'private_key.pem'
+    path.write_bytes(PRIV.save_pkcs1())
+    return str(path)
+
+
+def write_archive(path, records):
+    path.write_bytes(b''.join(rsa.encrypt(record, PUB) for record in records))
+    return str(path)
+
+
+def read_length_prefixed(data):
+    records = []
+    while data:
+        size = struct.unpack('>I', data[:4])[0]
+        records.append(data[4:4 + size])
+        data = data[4 + size:]
+    return records
+
+
+def test_records_come_back_in_order(tmp_path, key_path):
+    archive = write_archive(tmp_path / 'archive.bin', RECORDS)
+    output = tmp_path / 'out.bin'
+    # Small batches over two workers complete out of order
+    assert decrypt_bulk(archive, str(output), key_path, jobs=2, batch_size=3) == len(RECORDS)
+    assert read_length_prefixed(output.read_bytes()) == RECORDS
+
+    assert decrypt_bulk(archive, str(output), key_path, jobs=2, batch_size=4, lines=True) == len(RECORDS)
+    assert output.read_bytes().splitlines() == RECORDS
+
+
+def test_bad_archive_size_and_bad_record(tmp_path, key_path):
+    archive = tmp_path / 'archive.bin'
+    archive.write_bytes(rsa.encrypt(b'one', PUB) + b'\x00' * 10)
+    with pytest.raises(ValueError, match='Archive size 74 is not a multiple of the 64-byte record size'):
+        decrypt_bulk(str(archive), str(tmp_path / 'out.bin'), key_path, jobs=1)
+
+    # An all-zero block decrypts to zero, which never has valid padding
+    archive.write_bytes(b''.join(rsa.encrypt(record, PUB) for record in RECORDS[:2]) + b'\x00' * 64)
+    with pytest.raises(ValueError, match='record 2'):
+        decrypt_bulk(str(archive), str(tmp_path / 'out.bin'), key_path, jobs=1)
@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+from utils import emoji_codec
+
+
+def test_codec_round_trips_every_byte():
+    data = bytes(range(256)) + os.urandom(512)
+    assert emoji_codec.decode(emoji_codec.encode(data)) == data
+
+
+def test_codec_keeps_legacy_symbols():
+    # Bytes below 69 encode exactly as the original app.py mapping did
+    assert emoji_codec.encode(bytes([0, 39, 68])) == "😀☹️😶"
+
+
+def test_decode_tolerates_whitespace_and_missing_selector():
+    assert emoji_codec.decode("😀 ☹\n😶") == bytes([0, 39, 68])
+
+
+def test_decode_rejects_unknown_symbols():
+    with pytest.raises(ValueError):
+        emoji_codec.decode("😀x")
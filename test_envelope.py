@@ -0,0 +1,56 @@
+import pytest
+import rsa
+
+from utils import envelope
+from utils.crypto import decrypt_bytes, encrypt_bytes
+from utils.envelope import is_envelope
+
+needs_aesgcm = pytest.mark.skipif(envelope.AESGCM is None, reason='cryptography is not installed')
+
+
+def test_envelope_round_trip():
+    pub_key, priv_key = rsa.newkeys(512)
+    message = b'Hello, this is a test message!' * 1000
+
+    encrypted = encrypt_bytes(message, pub_key)
+    assert is_envelope(encrypted, priv_key)
+    assert decrypt_bytes(encrypted, priv_key) == message
+
+    # Short messages still go through a single RSA block
+    short = encrypt_bytes(b'hi', pub_key)
+    assert not is_envelope(short, priv_key)
+    assert decrypt_bytes(short, priv_key) == b'hi'
+
+
+def test_envelope_rejects_tampering():
+    pub_key, priv_key = rsa.newkeys(512)
+    encrypted = bytearray(encrypt_bytes(b'x' * 500, pub_key, mode='envelope'))
+    encrypted[-50] ^= 1
+    with pytest.raises(rsa.pkcs1.DecryptionError):
+        decrypt_bytes(bytes(encrypted), priv_key)
+
+
+@pytest.mark.parametrize('use_aesgcm', [pytest.param(True, marks=needs_aesgcm), False])
+def test_envelope_formats_round_trip(monkeypatch, use_aesgcm):
+    pub_key, priv_key = rsa.newkeys(512)
+    if not use_aesgcm:
+        monkeypatch.setattr(envelope, 'AESGCM', None)
+    encrypted = envelope.seal(b'y' * 300, pub_key)
+    assert encrypted[:4] == (envelope.MAGIC if use_aesgcm else envelope.LEGACY_MAGIC)
+    assert len(encrypted) == 300 + envelope.envelope_overhead(priv_key, encrypted[:4])
+    tampered = bytearray(encrypted)
+    tampered[len(tampered) // 2] ^= 1
+    with pytest.raises(rsa.pkcs1.DecryptionError):
+        envelope.open_envelope(bytes(tampered), priv_key)
+    monkeypatch.undo()
+    # Legacy envelopes still open once cryptography is installed
+    assert envelope.open_envelope(encrypted, priv_key) == b'y' * 300
+
+
+@needs_aesgcm
+def test_aesgcm_envelope_needs_cryptography(monkeypatch):
+    pub_key, priv_key = rsa.newkeys(512)
+    encrypted = envelope.seal(b'z' * 100, pub_key)
+    monkeypatch.setattr(envelope, 'AESGCM', None)
+    with pytest.raises(rsa.pkcs1.DecryptionError, match='cryptography'):
+        envelope.open_envelope(encrypted, priv_key)
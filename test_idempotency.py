@@ -0,0 +1,30 @@
+import pytest
+
+from utils.idempotency import IdempotencyCache, IdempotencyConflict
+
+
+def test_replay_and_conflict():
+    cache = IdempotencyCache(max_entries=10, ttl=60)
+    assert cache.get('retry-1', 'fp', 'digest') is None
+    assert cache.put('retry-1', 'fp', 'digest', b'first', 'application/json') is None
+    # A racing request that stores second gets the first response back
+    assert cache.put('retry-1', 'fp', 'digest', b'second', 'application/json') == (b'first', 'application/json')
+    assert cache.get('retry-1', 'fp', 'digest') == (b'first', 'application/json')
+    # The same idempotency key under another key fingerprint is unrelated
+    assert cache.get('retry-1', 'other', 'digest') is None
+    with pytest.raises(IdempotencyConflict):
+        cache.get('retry-1', 'fp', 'changed')
+    assert cache.stats()['conflicts'] == 1
+
+
+def test_evicted_entries_spill_to_disk(tmp_path):
+    cache = IdempotencyCache(max_entries=2, ttl=60, spill_path=str(tmp_path / 'idempotency.db'))
+    for i in range(5):
+        cache.put(f'key-{i}', 'fp', 'digest', b'body %d' % i, 'text/plain')
+    assert cache.stats()['spilled'] == 3
+    assert cache.get('key-0', 'fp', 'digest') == (b'body 0', 'text/plain')
+    # Without a spill file evicted entries are simply gone
+    memory_only = IdempotencyCache(max_entries=1, ttl=60)
+    memory_only.put('a', 'fp', 'digest', b'a', 'text/plain')
+    memory_only.put('b', 'fp', 'digest', b'b', 'text/plain')
+    assert memory_only.get('a', 'fp', 'digest') is None
@@ -0,0 +1,49 @@
+import threading
+
+import pytest
+
+from utils.jobs import FAILED, SUCCEEDED, JobManager, MemoryJobStore, SQLiteJobStore
+from utils.workers import PoolSaturated
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryJobStore(ttl=60)
+    return SQLiteJobStore(str(tmp_path / 'jobs.db'), ttl=60)
+
+
+def test_job_result_and_failure(store):
+    manager = JobManager(store, workers=1)
+
+    job = manager.submit('add', lambda a, b: {'sum': a + b}, 2, 3)
+    record = manager.wait(job['id'], timeout=5)
+    assert record['status'] == SUCCEEDED
+    assert record['result'] == {'sum': 5}
+
+    def fail():
+        raise ValueError('bad input')
+
+    job = manager.submit('fail', fail)
+    record = manager.wait(job['id'], timeout=5)
+    assert record['status'] == FAILED
+    assert record['error'] == 'bad input'
+
+    assert manager.get('missing') is None
+    manager.shutdown()
+
+
+def test_job_queue_is_bounded():
+    manager = JobManager(MemoryJobStore(), workers=1, max_pending=1)
+    release = threading.Event()
+    job = manager.submit('block', release.wait)
+
+    with pytest.raises(PoolSaturated):
+        manager.submit('block', release.wait)
+    assert manager.wait(job['id'], timeout=0.05)['status'] != SUCCEEDED
+    assert manager.stats()['in_flight'] == 1 and manager.stats()['rejected'] == 1
+
+    release.set()
+    assert manager.wait(job['id'], timeout=5)['status'] == SUCCEEDED
+    manager.shutdown()
+    assert manager.stats()['in_flight'] == 0
@@ -0,0 +1,38 @@
+import time
+
+import rsa
+
+from utils.key_cache import KeyCache, key_fingerprint
+from utils.ttl_cache import TTLCache
+
+
+def test_ttl_cache_lru_and_expiry():
+    cache = TTLCache(max_entries=2, ttl=0.05)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)  # evicts 'b', the least recently used
+    assert cache.get('b') is None
+    assert cache.stats()['evictions'] == 1
+
+    time.sleep(0.06)
+    assert cache.get('a') is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_key_cache_handles():
+    pub_key, priv_key = rsa.newkeys(512)
+    cache = KeyCache(max_entries=4, ttl=60)
+
+    entry = cache.register(priv_key)
+    assert entry.fingerprint == key_fingerprint(pub_key)
+    assert cache.register(priv_key).handle == entry.handle
+    assert cache.get(entry.handle, 'private').key == priv_key
+
+    # A private handle never resolves as a public key and vice versa
+    assert cache.get(entry.handle, 'public') is None
+    assert cache.get('not-a-handle', 'private') is None
+
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
@@ -0,0 +1,39 @@
+import rsa
+
+from utils.key_check import check_key_pair, pair_fingerprint
+
+PUB, PRIV = rsa.newkeys(512)
+
+
+def test_valid_pair():
+    assert check_key_pair(PUB, PRIV) == (True, "Keys are valid and form a pair")
+
+
+def test_mismatched_modulus():
+    other_pub, _ = rsa.newkeys(512)
+    valid, message = check_key_pair(other_pub, PRIV)
+    assert not valid
+    assert message == "Keys do not form a valid pair"
+
+
+def test_corrupted_components():
+    p, q = PRIV.p, PRIV.q
+    fields = dict(n=PRIV.n, e=PRIV.e, d=PRIV.d, p=p, q=q)
+    corruptions = [
+        dict(fields, d=PRIV.d + 2),
+        dict(fields, p=p + 2),
+    ]
+    for values in corruptions:
+        broken = rsa.PrivateKey(values['n'], values['e'], values['d'], values['p'], values['q'])
+        assert not check_key_pair(PUB, broken)[0]
+
+    broken = rsa.PrivateKey(PRIV.n, PRIV.e, PRIV.d, p, q)
+    broken.coef += 1
+    assert not check_key_pair(PUB, broken)[0]
+
+
+def test_pair_fingerprint_depends_on_both_keys():
+    pub_pem = PUB.save_pkcs1().decode()
+    priv_pem = PRIV.save_pkcs1().decode()
+    assert pair_fingerprint(pub_pem, priv_pem) == pair_fingerprint(pub_pem, priv_pem)
+    assert pair_fingerprint(pub_pem, priv_pem) != pair_fingerprint(priv_pem, pub_pem)
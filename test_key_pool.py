@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+from utils.key_pool import KeyPairPool, PoolTimeout, parse_targets
+
+
+def wait_for(condition, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def pool():
+    pool = KeyPairPool(targets={512: 2}, workers=1)
+    yield pool
+    pool.shutdown(wait=True)
+
+
+def test_parse_targets():
+    assert parse_targets('2048:4, 3072:2,') == {2048: 4, 3072: 2}
+
+
+def test_pool_fills_and_refills(pool):
+    pool.start()
+    wait_for(lambda: pool.stats()['512']['ready'] == 2)
+    pub_key, priv_key, pooled = pool.acquire(512, timeout=5)
+    assert pooled and pub_key.n == priv_key.n
+    stats = pool.stats()['512']
+    assert stats['served'] == 1 and stats['low_water_mark'] == 1
+    assert stats['ready'] + stats['pending'] == 2
+    wait_for(lambda: pool.stats()['512']['ready'] == 2)
+    with pytest.raises(ValueError):
+        pool.acquire(1024)
+
+
+def test_empty_pool_waits_or_times_out():
+    pool = KeyPairPool(targets={512: 0}, workers=1)
+    try:
+        with pytest.raises(PoolTimeout):
+            pool.acquire(512, timeout=0)
+        # The timed-out request still started a pair, which the next caller gets
+        assert pool.stats()['512']['empty_hits'] == 1
+        assert pool.stats()['512']['pending'] + pool.stats()['512']['ready'] == 1
+        pub_key, priv_key, pooled = pool.acquire(512, timeout=60)
+        assert pub_key.n == priv_key.n
+        assert pool.stats()['512']['served'] == 1
+    finally:
+        pool.shutdown(wait=True)
+
+
+def test_shutdown_stops_generation_and_restarts_on_demand(pool):
+    pool.start()
+    pool.shutdown(wait=True)
+    assert pool.stats()['512']['pending'] == 0
+    ready = pool.stats()['512']['ready']
+    time.sleep(0.2)
+    assert pool.stats()['512']['ready'] == ready
+    # A later acquire starts the workers again
+    pub_key, priv_key, _ = pool.acquire(512, timeout=60)
+    assert pub_key.n == priv_key.n
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+import rsa
+
+from utils.key_cache import key_fingerprint
+from utils.key_store import KeyExists, KeyStore
+
+PUB, PRIV = rsa.newkeys(512)
+
+
+def test_put_get_and_find(tmp_path):
+    store = KeyStore(str(tmp_path / 'keys.db'))
+    fingerprint = store.put('alice', PUB, PRIV)
+    store.put('bob-public', PUB)
+
+    assert fingerprint == key_fingerprint(PUB)
+    assert store.get('alice') == PUB
+    assert store.get('alice', 'private') == PRIV
+    assert store.get('bob-public', 'private') is None
+    assert store.get('missing') is None
+    assert sorted(store.find(fingerprint)) == ['alice', 'bob-public']
+
+    # A second store on the same file sees the keys without the cache
+    assert KeyStore(str(tmp_path / 'keys.db')).get('alice', 'private') == PRIV
+
+
+def test_batch_is_atomic(tmp_path):
+    store = KeyStore(str(tmp_path / 'keys.db'))
+    store.put('taken', PUB)
+    with pytest.raises(KeyExists):
+        store.put_many([('new', PUB, PRIV), ('taken', PUB, PRIV)])
+    assert store.get('new') is None
+    assert len(store) == 1
+
+    assert store.delete('taken')
+    assert store.get('taken') is None
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork()')
+def test_forked_process_opens_its_own_connection(tmp_path):
+    store = KeyStore(str(tmp_path / 'keys.db'))
+    parent_conn = store._conn
+    pid = os.fork()
+    if pid == 0:
+        ok = store._conn is not parent_conn
+        store.put('child', PUB)
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert store._conn is parent_conn
+    assert store.get('child') == PUB
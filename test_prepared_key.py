@@ -0,0 +1,29 @@
+import os
+
+import pytest
+import rsa
+
+from utils import prepared_key
+
+PUB, PRIV = rsa.newkeys(512)
+
+
+def test_matches_rsa_decrypt():
+    for message in (b'', b'x', os.urandom(53)):
+        crypto = rsa.encrypt(message, PUB)
+        for _ in range(3):  # blinding pair is refreshed between calls
+            assert prepared_key.decrypt(crypto, PRIV) == rsa.decrypt(crypto, PRIV) == message
+
+
+def test_rejects_bad_ciphertext():
+    crypto = rsa.encrypt(b'hello', PUB)
+    for bad in (b'\x00' + crypto, crypto[:-1] + bytes([crypto[-1] ^ 1])):
+        with pytest.raises(rsa.pkcs1.DecryptionError):
+            prepared_key.decrypt(bad, PRIV)
+
+
+def test_cache_is_keyed_by_full_key():
+    assert prepared_key.prepare(PRIV) is prepared_key.prepare(rsa.PrivateKey.load_pkcs1(PRIV.save_pkcs1()))
+    # Same modulus, different private exponent
+    forged = rsa.PrivateKey(PRIV.n, PRIV.e, PRIV.d + 2, PRIV.p, PRIV.q)
+    assert prepared_key.prepare(forged) is not prepared_key.prepare(PRIV)
@@ -0,0 +1,37 @@
+import pytest
+import rsa
+
+from utils.rate_limit import MemoryBucketStore, RateLimiter, SQLiteBucketStore, estimate_bits, key_cost
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryBucketStore()
+    return SQLiteBucketStore(str(tmp_path / 'buckets.db'))
+
+
+def test_bucket_allows_burst_then_rejects(store):
+    limiter = RateLimiter(rate=0.5, burst=3, store=store)
+    assert [limiter.admit('a')[0] for _ in range(4)] == [True, True, True, False]
+    assert limiter.admit('a') == (False, 2)
+    # Buckets are per client
+    assert limiter.admit('b')[0]
+
+
+def test_cost_over_burst_leaves_bucket_in_debt(store):
+    limiter = RateLimiter(rate=1, burst=2, store=store)
+    assert limiter.admit('a', cost=key_cost(4096))[0]
+    # 8 tokens were charged, not just the burst of 2
+    allowed, retry_after = limiter.admit('a', cost=0.1)
+    assert not allowed and retry_after >= 6
+    # A partly refilled bucket cannot start another oversized request
+    assert limiter.admit('b', cost=1)[0]
+    assert not limiter.admit('b', cost=8)[0]
+
+
+def test_estimates_key_size_from_pem():
+    pub, priv = rsa.newkeys(1024)
+    assert abs(estimate_bits(priv.save_pkcs1().decode(), 'private') - 1024) < 64
+    assert abs(estimate_bits(pub.save_pkcs1().decode(), 'public') - 1024) < 64
+    assert key_cost(2048) == 1
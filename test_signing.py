@@ -0,0 +1,29 @@
+import pytest
+import rsa
+
+from utils.signing import SignatureVerifier, sign_hash
+
+PUB, PRIV = rsa.newkeys(1024)
+
+
+def test_signatures_match_rsa():
+    for method in ('SHA-256', 'SHA-512', 'SHA-1'):
+        digest = rsa.compute_hash(b'message', method)
+        signature = sign_hash(digest, PRIV, method)
+        assert signature == rsa.sign(b'message', PRIV, method)
+        assert rsa.verify(b'message', signature, PUB) == method
+        assert SignatureVerifier(PUB).verify(b'message', signature) == method
+
+
+def test_rejects_bad_signatures():
+    verifier = SignatureVerifier(PUB)
+    signature = rsa.sign(b'message', PRIV, 'SHA-256')
+    bad = [
+        (b'other message', signature),
+        (b'message', signature[:-1] + bytes([signature[-1] ^ 1])),
+        (b'message', b'\x00' + signature),
+        (b'message', rsa.sign(b'message', PRIV, 'MD5')),
+    ]
+    for message, sig in bad:
+        with pytest.raises(rsa.pkcs1.VerificationError):
+            verifier.verify(message, sig)
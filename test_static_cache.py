@@ -0,0 +1,49 @@
+import gzip
+
+from flask import Flask, request
+
+from utils.static_cache import CachedBody, StaticFiles, cached_response
+
+BODY = b'body { color: #333; }\n' * 50
+
+
+def make_client(cached):
+    app = Flask(__name__)
+
+    @app.route('/')
+    def page():
+        return cached_response(cached, request, 'no-cache')
+
+    return app.test_client()
+
+
+def test_encodings_and_etags():
+    client = make_client(CachedBody(BODY, 'text/css; charset=utf-8'))
+    plain = client.get('/')
+    zipped = client.get('/', headers={'Accept-Encoding': 'gzip, deflate'})
+    assert plain.data == BODY and plain.headers['Content-Type'] == 'text/css; charset=utf-8'
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(zipped.data) == BODY
+    assert plain.headers['ETag'] != zipped.headers['ETag']
+    assert 'Accept-Encoding' in zipped.headers['Vary']
+
+
+def test_conditional_request():
+    client = make_client(CachedBody(BODY, 'text/css'))
+    etag = client.get('/').headers['ETag']
+    unchanged = client.get('/', headers={'If-None-Match': etag})
+    assert unchanged.status_code == 304 and unchanged.data == b''
+    assert unchanged.headers['ETag'] == etag
+    assert client.get('/', headers={'If-None-Match': '"stale"'}).status_code == 200
+
+
+def test_static_files_are_hashed(tmp_path):
+    (tmp_path / 'css').mkdir()
+    (tmp_path / 'css' / 'a.css').write_bytes(BODY)
+    (tmp_path / 'b.js').write_bytes(b'x')
+    files = StaticFiles(str(tmp_path))
+    assert len(files) == 2
+    assert files.version('css/a.css') == CachedBody(BODY, 'text/css').version
+    assert files.version('missing.css') is None
+    # Tiny files are not worth compressing
+    assert list(files.get('b.js').variants) == ['identity']
@@ -0,0 +1,91 @@
+import io
+import os
+import struct
+
+import pytest
+import rsa
+
+from utils import envelope
+from utils.streaming import LEGACY_MAGIC, MAGIC, MAX_CHUNK_SIZE, StreamDecryptor, encrypt_stream
+
+PUB, PRIV = rsa.newkeys(512)
+CHUNK = 16
+
+
+@pytest.fixture(autouse=True, params=[
+    pytest.param('aesgcm', marks=pytest.mark.skipif(envelope.AESGCM is None, reason='cryptography is not installed')),
+    'legacy',
+])
+def backend(request, monkeypatch):
+    if request.param == 'legacy':
+        monkeypatch.setattr(envelope, 'AESGCM', None)
+    return request.param
+
+
+def frames(data, chunk_size=CHUNK):
+    """Return the header and frames of an encrypted stream separately"""
+    parts = list(encrypt_stream(io.BytesIO(data).read, PUB, chunk_size))
+    return parts[0], parts[1:]
+
+
+def decrypt(stream, priv_key=PRIV):
+    return b''.join(StreamDecryptor(io.BytesIO(stream).read, priv_key).chunks())
+
+
+@pytest.mark.parametrize('size', [0, 1, CHUNK - 1, CHUNK, 3 * CHUNK, 3 * CHUNK + 5])
+def test_round_trip(size):
+    data = os.urandom(size)
+    header, body = frames(data)
+    assert decrypt(header + b''.join(body)) == data
+    # Exact multiples end on a full final frame, not an extra empty one
+    assert len(body) == max(1, -(-size // CHUNK))
+
+
+def test_empty_input_is_one_final_frame():
+    header, body = frames(b'')
+    assert len(body) == 1
+    assert decrypt(header + body[0]) == b''
+
+
+def test_truncated_stream_is_rejected():
+    header, body = frames(os.urandom(3 * CHUNK))
+    stream = header + b''.join(body)
+    for cut in (1, 20, len(body[-1])):
+        with pytest.raises(rsa.pkcs1.DecryptionError):
+            decrypt(stream[:-cut])
+
+
+def test_dropped_and_reordered_frames_are_rejected():
+    header, body = frames(os.urandom(3 * CHUNK))
+    for tampered in (body[:1] + body[2:], [body[1], body[0], body[2]]):
+        with pytest.raises(rsa.pkcs1.DecryptionError):
+            decrypt(header + b''.join(tampered))
+
+
+def test_cleared_final_flag_is_rejected():
+    header, body = frames(os.urandom(2 * CHUNK))
+    (length,) = struct.unpack('>I', body[-1][:4])
+    unflagged = struct.pack('>I', length & 0x7FFFFFFF) + body[-1][4:]
+    with pytest.raises(rsa.pkcs1.DecryptionError):
+        decrypt(header + body[0] + unflagged)
+
+
+def test_wrong_key_is_rejected_before_output():
+    header, body = frames(b'secret')
+    _, other = rsa.newkeys(512)
+    with pytest.raises(rsa.pkcs1.DecryptionError):
+        StreamDecryptor(io.BytesIO(header + b''.join(body)).read, other)
+
+
+def test_oversized_chunk_size_header_is_rejected():
+    header, body = frames(b'data')
+    forged = header[:-4] + struct.pack('>I', MAX_CHUNK_SIZE + 1)
+    with pytest.raises(rsa.pkcs1.DecryptionError):
+        decrypt(forged + b''.join(body))
+
+
+def test_legacy_streams_still_decrypt(backend, monkeypatch):
+    header, body = frames(b'old stream')
+    assert header.startswith(MAGIC if backend == 'aesgcm' else LEGACY_MAGIC)
+    monkeypatch.undo()
+    assert decrypt(header + b''.join(body)) == b'old stream'
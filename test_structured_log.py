@@ -0,0 +1,85 @@
+import json
+import logging
+import os
+import sys
+
+import pytest
+
+from utils.structured_log import JsonFormatter, ensure_listener, parse_levels, route_logger, setup_logging
+
+
+@pytest.fixture(autouse=True)
+def restore_logging():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+    for name in ('encrypt', 'decrypt'):
+        route_logger(name).setLevel(logging.NOTSET)
+
+
+def read_entries(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_json_fields():
+    record = logging.LogRecord('app.routes.encrypt', logging.INFO, __file__, 1, 'Message %s', ('encrypted',), None)
+    record.message_bytes = 12
+    entry = json.loads(JsonFormatter().format(record))
+    assert set(entry) == {'ts', 'level', 'logger', 'msg', 'message_bytes'}
+    assert entry['ts'].endswith('Z') and entry['level'] == 'INFO'
+    assert entry['logger'] == 'app.routes.encrypt' and entry['msg'] == 'Message encrypted'
+
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        record = logging.LogRecord('app', logging.ERROR, __file__, 1, 'failed', None, sys.exc_info())
+    assert 'ValueError: boom' in json.loads(JsonFormatter().format(record))['exc']
+
+
+def test_route_levels(tmp_path):
+    path = str(tmp_path / 'app.log')
+    listener = setup_logging(path, level='INFO', console=False,
+                             route_levels=parse_levels('encrypt=DEBUG, decrypt=warning'))
+    route_logger('encrypt').debug('encrypt detail', extra={'key_size': 2048})
+    route_logger('decrypt').info('decrypt detail')
+    route_logger('decrypt').warning('decrypt problem')
+    logging.getLogger('other').debug('below the root level')
+    listener.stop()
+    assert [(entry['msg'], entry.get('key_size')) for entry in read_entries(path)] == [
+        ('encrypt detail', 2048), ('decrypt problem', None)]
+
+
+def test_rotation_by_size(tmp_path):
+    path = tmp_path / 'app.log'
+    listener = setup_logging(str(path), console=False, max_bytes=500, backup_count=2)
+    for i in range(50):
+        logging.info('record', extra={'i': i})
+    listener.stop()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['app.log', 'app.log.1', 'app.log.2']
+    assert all(p.stat().st_size <= 500 for p in tmp_path.iterdir())
+    assert read_entries(path)[-1]['i'] == 49
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork()')
+def test_forked_process_starts_its_own_listener(tmp_path):
+    path = str(tmp_path / 'app.log')
+    listener = setup_logging(path, console=False)
+    pid = os.fork()
+    if pid == 0:
+        ok = not listener.running
+        ensure_listener(listener)
+        logging.warning('from child')
+        listener.stop()
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert listener.running
+    logging.warning('from parent')
+    listener.stop()
+    assert [entry['msg'] for entry in read_entries(path)] == ['from child', 'from parent']
@@ -0,0 +1,39 @@
+import pytest
+
+from utils.workers import CryptoWorkerPool, PoolSaturated
+
+
+def test_run_all_takes_every_slot_or_none():
+    pool = CryptoWorkerPool(workers=2, max_pending=3, retry_after=7)
+    try:
+        pool._acquire()  # one call already in flight
+        with pytest.raises(PoolSaturated) as excinfo:
+            pool.run_all(pow, [(2, 3)] * 3)
+        assert excinfo.value.retry_after == 7
+        # The two free slots were given back, not held by the failed call
+        assert pool.stats()['in_flight'] == 1 and pool.rejected == 1
+        assert pool.run_all(pow, [(2, 3)] * 2) == [8, 8]
+
+        pool._release_slots()
+        assert pool.run_all(pow, [(2, n) for n in range(3)]) == [1, 2, 4]
+    finally:
+        pool.shutdown()
+    assert pool.stats() == {'workers': 2, 'max_pending': 3, 'in_flight': 0, 'completed': 5, 'rejected': 1}
+
+
+def test_run_rejects_when_saturated():
+    pool = CryptoWorkerPool(workers=1, max_pending=1)
+    pool._acquire()
+    with pytest.raises(PoolSaturated):
+        pool.run(pow, 2, 3)
+    pool._release_slots()
+    try:
+        assert pool.run(pow, 2, 3) == 8
+    finally:
+        pool.shutdown()
+
+
+def test_no_workers_runs_inline():
+    pool = CryptoWorkerPool(workers=0)
+    assert pool.run_all(pow, [(2, 3)] * 100) == [8] * 100
+    assert pool.stats()['in_flight'] == 0
@@ -0,0 +1,45 @@
+"""Big-integer arithmetic backend for private-key operations
+
+Private-key decryption is dominated by the two CRT exponentiations. When
+gmpy2 is installed they run on GMP, otherwise on Python's built-in pow,
+which is what rsa itself uses. Both compute the same integers, so output
+is byte-identical either way.
+
+RSA_BACKEND selects 'auto' (the default: gmpy2 when importable), 'gmpy2'
+or 'python'. It is read at import, so worker processes pick the same
+backend as the process that started them.
+"""
+import logging
+import os
+
+try:
+    import gmpy2
+except ImportError:  # optional accelerator
+    gmpy2 = None
+
+BACKENDS = ('gmpy2', 'python')
+AVAILABLE = BACKENDS if gmpy2 is not None else ('python',)
+
+
+def _select(requested):
+    if requested == 'auto':
+        return AVAILABLE[0]
+    if requested not in BACKENDS:
+        raise ValueError(f"RSA_BACKEND must be one of: auto, {', '.join(BACKENDS)}")
+    if requested not in AVAILABLE:
+        logging.getLogger(__name__).warning(
+            'RSA backend %s is not installed, falling back to python', requested)
+        return 'python'
+    return requested
+
+
+name = _select(os.environ.get('RSA_BACKEND', 'auto'))
+
+if name == 'gmpy2':
+    # powmod returns mpz; number() converts key components once so the
+    # per-call arithmetic stays in GMP
+    powmod = gmpy2.powmod
+    number = gmpy2.mpz
+else:
+    powmod = pow
+    number = int
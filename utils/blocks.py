@@ -0,0 +1,99 @@
+"""Pure-RSA encryption of messages longer than one RSA block
+
+For deployments where policy rules out a symmetric cipher, a message is
+cut into pieces that each fit one PKCS#1 v1.5 block and every piece is
+encrypted on its own. Container layout::
+
+    MAGIC (4) | block count (4) | block 1 | ... | block N
+
+Every block is exactly the key size, so the total length is fixed by the
+count and a container can never be mistaken for a single RSA block or an
+envelope. Decryption can hand groups of blocks to a CryptoWorkerPool,
+which runs them in parallel and returns them in order. Encryption uses
+the small public exponent and always runs in the calling thread, so it
+never takes private-key worker slots.
+"""
+import struct
+
+import rsa
+from rsa import common
+from rsa.pkcs1 import DecryptionError
+
+from utils import prepared_key
+
+MAGIC = b'RSB\x01'
+HEADER_SIZE = len(MAGIC) + 4
+
+# Below this block count the cost of shipping work to another process
+# outweighs running it here
+PARALLEL_DECRYPT_BLOCKS = 2
+
+
+class BlockLimitError(ValueError):
+    """Raised when a container holds more blocks than the caller allows"""
+
+
+def block_payload(key):
+    """Plaintext bytes carried by each block"""
+    return common.byte_size(key.n) - 11
+
+
+def block_count(data, key):
+    """Return the number of blocks in a container, or None if data is not one"""
+    if len(data) < HEADER_SIZE or not data.startswith(MAGIC):
+        return None
+    count = struct.unpack('>I', data[len(MAGIC):HEADER_SIZE])[0]
+    if count == 0 or len(data) != HEADER_SIZE + count * common.byte_size(key.n):
+        return None
+    return count
+
+
+def is_block_container(data, key):
+    """Check whether data is a multi-block container rather than one RSA block"""
+    return block_count(data, key) is not None
+
+
+def decrypt_group(blocks, priv_key):
+    """Decrypt each block with the per-process prepared key"""
+    return [prepared_key.decrypt(block, priv_key) for block in blocks]
+
+
+def _run_grouped(fn, items, key, pool, min_parallel):
+    if pool is None or pool.workers == 0 or len(items) < min_parallel:
+        return fn(items, key)
+    # One contiguous group per worker keeps results in order and sends
+    # the key to each worker only once
+    groups = min(pool.workers, len(items))
+    size = -(-len(items) // groups)
+    results = pool.run_all(fn, [(items[i:i + size], key) for i in range(0, len(items), size)])
+    return [item for group in results for item in group]
+
+
+def seal_blocks(plaintext, pub_key, max_blocks=None):
+    """Encrypt plaintext into a block container for pub_key
+
+    Raises BlockLimitError when it would take more than max_blocks blocks.
+    """
+    payload = block_payload(pub_key)
+    chunks = [plaintext[i:i + payload] for i in range(0, len(plaintext), payload)] or [b'']
+    if max_blocks is not None and len(chunks) > max_blocks:
+        raise BlockLimitError(f'Message needs {len(chunks)} blocks; the limit is {max_blocks}')
+    blocks = [rsa.encrypt(chunk, pub_key) for chunk in chunks]
+    return MAGIC + struct.pack('>I', len(blocks)) + b''.join(blocks)
+
+
+def open_blocks(data, priv_key, pool=None, max_blocks=None):
+    """Decrypt a container produced by seal_blocks()
+
+    Raises rsa.pkcs1.DecryptionError for malformed containers, and
+    BlockLimitError when the container holds more than max_blocks blocks.
+    """
+    count = block_count(data, priv_key)
+    if count is None:
+        raise DecryptionError('Decryption failed')
+    if max_blocks is not None and count > max_blocks:
+        raise BlockLimitError(f'Container holds {count} blocks; the limit is {max_blocks}')
+
+    key_size = common.byte_size(priv_key.n)
+    blocks = [data[offset:offset + key_size] for offset in range(HEADER_SIZE, len(data), key_size)]
+    return b''.join(_run_grouped(decrypt_group, blocks, priv_key, pool, PARALLEL_DECRYPT_BLOCKS))
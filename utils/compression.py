@@ -0,0 +1,84 @@
+"""Optional compression of plaintext before encryption
+
+Compressed plaintext starts with a header::
+
+    MARKER (2) | method (1) | original length (4) | compressed body
+
+MARKER begins with 0xFF, which never occurs in UTF-8 text, so plaintext
+from older clients is never mistaken for a compressed payload. Raw bytes
+that happen to start with MARKER are stored behind a header with method
+'none' so they decrypt unchanged.
+"""
+import lzma
+import struct
+import zlib
+
+MARKER = b'\xffZ'
+HEADER_SIZE = len(MARKER) + 5
+METHOD_IDS = {'none': 0, 'zlib': 1, 'lzma': 2}
+METHOD_NAMES = {value: name for name, value in METHOD_IDS.items()}
+CHOICES = ('auto', 'none', 'zlib', 'lzma')
+
+DEFAULT_THRESHOLD = 64  # bytes; 'auto' leaves anything shorter alone
+DEFAULT_MAX_SIZE = 16 * 1024 * 1024  # bytes a payload may decompress to
+
+
+class DecompressionError(ValueError):
+    """Raised for corrupt compressed payloads or ones over the size limit"""
+
+
+def _header(method, size):
+    return MARKER + struct.pack('>BI', METHOD_IDS[method], size)
+
+
+def compress(data, method='auto', threshold=DEFAULT_THRESHOLD):
+    """Compress data with 'zlib' or 'lzma', or choose with 'auto'
+
+    'auto' uses zlib for data of at least threshold bytes. The compressed
+    form is only kept when it is smaller than the original.
+    """
+    if method == 'auto':
+        method = 'zlib' if len(data) >= threshold else 'none'
+    if method == 'zlib':
+        packed = _header('zlib', len(data)) + zlib.compress(data, 6)
+    elif method == 'lzma':
+        packed = _header('lzma', len(data)) + lzma.compress(data)
+    elif method == 'none':
+        packed = None
+    else:
+        raise ValueError(f"Compression must be one of: {', '.join(CHOICES)}")
+
+    if packed is not None and len(packed) < len(data):
+        return packed
+    if data.startswith(MARKER):
+        return _header('none', len(data)) + data
+    return data
+
+
+def decompress(data, max_size=DEFAULT_MAX_SIZE):
+    """Undo compress(); data without the header is returned unchanged"""
+    if not data.startswith(MARKER):
+        return data
+    if len(data) < HEADER_SIZE:
+        raise DecompressionError('Truncated compression header')
+    method_id, size = struct.unpack('>BI', data[len(MARKER):HEADER_SIZE])
+    method = METHOD_NAMES.get(method_id)
+    if method is None:
+        raise DecompressionError(f'Unknown compression method {method_id}')
+    if size > max_size:
+        raise DecompressionError(f'Decompressed size {size} exceeds the {max_size} byte limit')
+
+    body = data[HEADER_SIZE:]
+    if method == 'none':
+        result = body
+    else:
+        # Stop one byte past the declared size so a payload that lies
+        # about its length cannot expand any further
+        decompressor = zlib.decompressobj() if method == 'zlib' else lzma.LZMADecompressor()
+        try:
+            result = decompressor.decompress(body, size + 1)
+        except (zlib.error, lzma.LZMAError) as e:
+            raise DecompressionError(f'Corrupt {method} payload: {e}') from None
+    if len(result) != size:
+        raise DecompressionError('Decompressed size does not match the header')
+    return result
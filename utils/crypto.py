@@ -1,45 +1,86 @@
 import rsa
-from pathlib import Path
-
-# Emoji mapping for all ASCII characters (32-126)
-EMOJI_TABLE = [
-    "😀", "😃", "😄", "😁", "😆", "😅", "😂", "🤣", "😊", "😇",  # 32-41
-    "🙂", "🙃", "😉", "😌", "😍", "🥰", "😘", "😗", "😙", "😚",  # 42-51
-    "😋", "😛", "😝", "😜", "🤪", "🤨", "🧐", "🤓", "😎", "🥸",  # 52-61
-    "🤩", "🥳", "😏", "😒", "😞", "😔", "😟", "😕", "🙁", "☹️",  # 62-71
-    "😣", "😖", "😫", "😩", "🥺", "😢", "😭", "😤", "😠", "😡",  # 72-81
-    "🤬", "🤯", "😳", "🥵", "🥶", "😱", "😨", "😰", "😥", "😓",  # 82-91
-    "🫣", "🤗", "🫡", "🤔", "🫢", "🤭", "🤫", "🤥", "😶", "🫠",  # 92-101
-    "😐", "🫤", "😑", "😬", "🙄", "😯", "😦", "😧", "😮", "🥱",  # 102-111
-    "😴", "🤤", "😪", "😵", "🫥", "🤐", "🥴", "🤢", "🤮", "🤕",  # 112-121
-    "🤑", "🤠", "😈", "👿", "👹", "👺", "🤡", "💩", "👻", "💀",  # 122-131
-    "☠️", "👽", "👾", "🤖", "🎃", "😺", "😸", "😹", "😻", "😼",  # 132-141
-    "😽", "🙀", "😿", "😾", "🙈", "🙉", "🙊", "💌", "💘", "💝",  # 142-151
-    "💖", "💗", "💓", "💞", "💕", "💟", "❣️", "💔", "❤️", "🧡",  # 152-161
-    "💛", "💚", "💙", "💜", "🤎", "🖤", "🤍", "💋", "💯", "🔥"   # 162-171
-]
-EMOJI_MAP = {e: i+32 for i, e in enumerate(EMOJI_TABLE)}
-
-def generate_keys(key_id):
-    """Generate and save RSA key pair"""
+from rsa import common
+
+from utils import emoji_codec, prepared_key
+from utils.blocks import block_payload, is_block_container, open_blocks, seal_blocks
+from utils.compression import DEFAULT_MAX_SIZE, HEADER_SIZE as COMPRESSION_HEADER_SIZE, compress, decompress
+from utils.envelope import is_envelope, open_envelope, seal
+from utils.key_store import KeyStore
+
+def generate_keys(key_id, store=None):
+    """Generate an RSA key pair and save it in the key store under key_id"""
     pub_key, priv_key = rsa.newkeys(2048)
-    Path('user_keys').mkdir(exist_ok=True)
-    
-    with open(f'user_keys/{key_id}_pub.pem', 'wb') as f:
-        f.write(pub_key.save_pkcs1())
-    with open(f'user_keys/{key_id}_priv.pem', 'wb') as f:
-        f.write(priv_key.save_pkcs1())
+    if store is None:
+        store = KeyStore()
+    store.put(key_id, pub_key, priv_key)
     
     return pub_key.save_pkcs1().decode(), priv_key.save_pkcs1().decode()
 
+def max_block_payload(key):
+    """Largest message a single PKCS#1 v1.5 block can carry for this key"""
+    return common.byte_size(key.n) - 11
+
+def encrypt_bytes(data, pub_key, mode='auto', compression='none', max_blocks=None):
+    """Encrypt bytes as one RSA block, or as an envelope when they don't fit
+
+    mode is 'auto', 'rsa', 'envelope' or 'blocks'. 'blocks' stays pure RSA:
+    data too long for one block is split across a container of at most
+    max_blocks blocks. compression ('auto', 'none', 'zlib' or 'lzma') is
+    applied first, so compressible messages are more likely to fit a
+    single block.
+    """
+    data = compress(data, compression)
+    too_long = len(data) > max_block_payload(pub_key)
+    if mode == 'envelope' or (mode == 'auto' and too_long):
+        return seal(data, pub_key)
+    if mode == 'blocks' and too_long:
+        return seal_blocks(data, pub_key, max_blocks)
+    return rsa.encrypt(data, pub_key)
+
+def decrypt_bytes(data, priv_key, rsa_decrypt=prepared_key.decrypt, max_size=DEFAULT_MAX_SIZE,
+                  pool=None, max_blocks=None):
+    """Decrypt output of encrypt_bytes, detecting envelopes, containers and compression
+
+    rsa_decrypt performs the private-key operation on a single RSA block,
+    so callers can run it outside the current thread; the blocks of a
+    multi-block container run in parallel on pool instead. Containers of
+    more than max_blocks blocks raise BlockLimitError. Compressed payloads
+    may expand to at most max_size bytes, otherwise DecompressionError is
+    raised.
+    """
+    if is_envelope(data, priv_key):
+        plaintext = open_envelope(data, priv_key, rsa_decrypt)
+    elif is_block_container(data, priv_key):
+        if max_blocks is None:
+            # No honest container needs more blocks than max_size bytes fill
+            max_blocks = -(-(max_size + COMPRESSION_HEADER_SIZE) // block_payload(priv_key))
+        plaintext = open_blocks(data, priv_key, pool, max_blocks)
+    else:
+        plaintext = rsa_decrypt(data, priv_key)
+    return decompress(plaintext, max_size)
+
+def decrypt_many(items, priv_key, max_size=DEFAULT_MAX_SIZE, max_blocks=None):
+    """Decrypt each item with decrypt_bytes, for one worker's share of a batch
+
+    Returns a (plaintext, error) pair per item, where error is the
+    exception the item raised, so one bad item does not fail the rest.
+    """
+    results = []
+    for data in items:
+        try:
+            results.append((decrypt_bytes(data, priv_key, max_size=max_size, max_blocks=max_blocks), None))
+        except Exception as e:
+            results.append((None, e))
+    return results
+
 def encrypt_message(message, pub_key):
     """Encrypt text → emojis"""
     pub_key = rsa.PublicKey.load_pkcs1(pub_key.encode())
-    encrypted = rsa.encrypt(message.encode(), pub_key)
-    return ''.join([EMOJI_TABLE[b-32] for b in encrypted if 32 <= b <= 126])
+    encrypted = encrypt_bytes(message.encode(), pub_key)
+    return emoji_codec.encode(encrypted)
 
 def decrypt_message(emojis, priv_key):
     """Decrypt emojis → text"""
     priv_key = rsa.PrivateKey.load_pkcs1(priv_key.encode())
-    encrypted = bytes([EMOJI_MAP[e] for e in emojis if e in EMOJI_MAP])
-    return rsa.decrypt(encrypted, priv_key).decode()
\ No newline at end of file
+    encrypted = emoji_codec.decode(emojis)
+    return decrypt_bytes(encrypted, priv_key).decode()
\ No newline at end of file
@@ -0,0 +1,56 @@
+"""Lossless byte <-> emoji codec with one symbol per byte value
+
+The first 69 symbols are the original app.py mapping, so bytes below 69
+encode exactly as they always have. The remaining 187 are taken in order
+from the Animals/Objects block starting at U+1F400, skipping the two code
+points there that default to text presentation.
+"""
+LEGACY_SYMBOLS = (
+    "😀", "😃", "😄", "😁", "😆", "😅", "😂", "🤣", "😊", "😇",
+    "🙂", "🙃", "😉", "😌", "😍", "🥰", "😘", "😗", "😙", "😚",
+    "😋", "😛", "😝", "😜", "🤪", "🤨", "🧐", "🤓", "😎", "🥸",
+    "🤩", "🥳", "😏", "😒", "😞", "😔", "😟", "😕", "🙁", "☹️",
+    "😣", "😖", "😫", "😩", "🥺", "😢", "😭", "😤", "😠", "😡",
+    "🤬", "🤯", "😳", "🥵", "🥶", "😱", "😨", "😰", "😥", "😓",
+    "🫣", "🤗", "🫡", "🤔", "🫢", "🤭", "🤫", "🤥", "😶",
+)
+_TEXT_PRESENTATION = {0x1F43F, 0x1F441}
+
+ALPHABET = LEGACY_SYMBOLS + tuple(
+    chr(cp) for cp in range(0x1F400, 0x1F500) if cp not in _TEXT_PRESENTATION
+)[:256 - len(LEGACY_SYMBOLS)]
+
+VARIATION_SELECTOR = '\ufe0f'
+
+# Encode table: byte value -> symbol
+ENCODE_TABLE = ALPHABET
+
+# Decode table: base code point -> byte value. Every symbol is a single
+# code point optionally followed by an emoji variation selector, and
+# copy/paste or keyboards often add or drop the selector, so decoding
+# strips selectors first and then needs one lookup per code point.
+DECODE_TABLE = {symbol.rstrip(VARIATION_SELECTOR): value for value, symbol in enumerate(ALPHABET)}
+
+assert len(ALPHABET) == 256 and len(DECODE_TABLE) == 256
+
+
+def encode(data):
+    """Encode bytes as an emoji string, one symbol per byte"""
+    return ''.join(map(ENCODE_TABLE.__getitem__, data))
+
+
+def decode(text):
+    """Decode an emoji string produced by encode()
+
+    Whitespace between symbols is ignored. Raises ValueError on any symbol
+    outside the alphabet.
+    """
+    text = text.replace(VARIATION_SELECTOR, '')
+    try:
+        return bytes(map(DECODE_TABLE.__getitem__, text))
+    except KeyError:
+        pass
+    try:
+        return bytes(map(DECODE_TABLE.__getitem__, ''.join(text.split())))
+    except KeyError as e:
+        raise ValueError(f'Unknown symbol {e.args[0]!r} in emoji sequence') from None
@@ -0,0 +1,127 @@
+"""Hybrid RSA envelope encryption for payloads larger than one RSA block
+
+Envelope layout::
+
+    MAGIC (4) | RSA-wrapped session key (key size) | nonce | body | tag
+
+Only the 32-byte session key goes through RSA. With the cryptography
+package installed the body is sealed with AES-256-GCM (MAGIC RSE\\x02,
+12-byte nonce, 16-byte tag) and the header is authenticated as associated
+data. Without it the body is encrypted with a SHAKE-256 keystream and
+authenticated with HMAC-SHA256, encrypt-then-MAC (LEGACY_MAGIC RSE\\x01,
+16-byte nonce, 32-byte tag). Both formats can always be opened when their
+cipher is available.
+"""
+import hashlib
+import hmac
+import os
+
+import rsa
+from rsa import common
+
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:  # optional; the standard-library construction is used instead
+    AESGCM = None
+
+MAGIC = b'RSE\x02'
+LEGACY_MAGIC = b'RSE\x01'
+SESSION_KEY_SIZE = 32
+GCM_NONCE_SIZE = 12
+GCM_TAG_SIZE = 16
+NONCE_SIZE = 16
+TAG_SIZE = 32
+
+
+def derive_keys(session_key):
+    """Split a session key into independent encryption and MAC keys"""
+    enc_key = hmac.new(session_key, b'envelope-encrypt', hashlib.sha256).digest()
+    mac_key = hmac.new(session_key, b'envelope-authenticate', hashlib.sha256).digest()
+    return enc_key, mac_key
+
+
+def keystream_xor(enc_key, nonce, data):
+    """XOR data with the SHAKE-256 keystream for (enc_key, nonce)"""
+    if not data:
+        return b''
+    stream = hashlib.shake_256(enc_key + nonce).digest(len(data))
+    mixed = int.from_bytes(data, 'big') ^ int.from_bytes(stream, 'big')
+    return mixed.to_bytes(len(data), 'big')
+
+
+def _sizes(magic):
+    """Return (nonce size, tag size) for an envelope version, or None"""
+    if magic == MAGIC:
+        return GCM_NONCE_SIZE, GCM_TAG_SIZE
+    if magic == LEGACY_MAGIC:
+        return NONCE_SIZE, TAG_SIZE
+    return None
+
+
+def envelope_overhead(key, magic=MAGIC):
+    """Return the number of bytes an envelope adds around the body"""
+    nonce_size, tag_size = _sizes(magic)
+    return len(magic) + common.byte_size(key.n) + nonce_size + tag_size
+
+
+def is_envelope(data, key):
+    """Check whether data is an envelope rather than a single RSA block"""
+    magic = data[:len(MAGIC)]
+    return _sizes(magic) is not None and len(data) >= envelope_overhead(key, magic)
+
+
+def seal(plaintext, pub_key):
+    """Encrypt plaintext of any length into an envelope for pub_key
+
+    Uses AES-256-GCM when cryptography is installed, else the legacy
+    keystream and HMAC construction.
+    """
+    session_key = os.urandom(SESSION_KEY_SIZE)
+    if AESGCM is not None:
+        header = MAGIC + rsa.encrypt(session_key, pub_key) + os.urandom(GCM_NONCE_SIZE)
+        return header + AESGCM(session_key).encrypt(header[-GCM_NONCE_SIZE:], plaintext, header)
+
+    enc_key, mac_key = derive_keys(session_key)
+    nonce = os.urandom(NONCE_SIZE)
+    header = LEGACY_MAGIC + rsa.encrypt(session_key, pub_key) + nonce
+    body = keystream_xor(enc_key, nonce, plaintext)
+    tag = hmac.new(mac_key, header + body, hashlib.sha256).digest()
+    return header + body + tag
+
+
+def open_envelope(data, priv_key, unwrap=rsa.decrypt):
+    """Decrypt an envelope produced by seal()
+
+    ``unwrap`` performs the RSA decryption of the session key, so callers
+    can run that private-key operation somewhere else. Raises
+    rsa.pkcs1.DecryptionError when the envelope does not authenticate or
+    is an AES-GCM envelope and cryptography is not installed.
+    """
+    magic = data[:len(MAGIC)]
+    if not is_envelope(data, priv_key):
+        raise rsa.pkcs1.DecryptionError('Decryption failed')
+    if magic == MAGIC and AESGCM is None:
+        raise rsa.pkcs1.DecryptionError('AES-GCM envelopes require the cryptography package')
+
+    nonce_size, tag_size = _sizes(magic)
+    key_size = common.byte_size(priv_key.n)
+    header_size = len(magic) + key_size + nonce_size
+    wrapped_key = data[len(magic):len(magic) + key_size]
+    nonce = data[header_size - nonce_size:header_size]
+
+    session_key = unwrap(wrapped_key, priv_key)
+    if len(session_key) != SESSION_KEY_SIZE:
+        raise rsa.pkcs1.DecryptionError('Decryption failed')
+
+    if magic == MAGIC:
+        try:
+            return AESGCM(session_key).decrypt(nonce, data[header_size:], data[:header_size])
+        except InvalidTag:
+            raise rsa.pkcs1.DecryptionError('Decryption failed')
+
+    enc_key, mac_key = derive_keys(session_key)
+    expected = hmac.new(mac_key, data[:-tag_size], hashlib.sha256).digest()
+    if not hmac.compare_digest(expected, data[-tag_size:]):
+        raise rsa.pkcs1.DecryptionError('Decryption failed')
+    return keystream_xor(enc_key, nonce, data[header_size:-tag_size])
@@ -0,0 +1,116 @@
+"""Replay cache for requests sent with an Idempotency-Key header
+
+PKCS#1 v1.5 padding is random, so encrypting the same message twice gives
+different ciphertexts. A client that retries with the same Idempotency-Key
+gets the first response back byte for byte, for the price of a lookup
+rather than another RSA operation.
+
+Entries are keyed by (idempotency key, key fingerprint) and remember a
+digest of the request they answered: reusing an idempotency key for a
+different request raises IdempotencyConflict instead of replaying the
+wrong response. Entries live in an in-process LRU with a TTL; with
+``spill_path`` set, entries pushed out of memory before expiring are
+written to a SQLite file and read back on a later miss.
+"""
+import threading
+import time
+
+from utils.sqlite_conn import ProcessConnection
+from utils.ttl_cache import TTLCache
+
+
+class IdempotencyConflict(Exception):
+    """Raised when an idempotency key is reused for a different request"""
+
+
+class IdempotencyCache:
+    """Bounded cache of responses by (idempotency key, key fingerprint)"""
+
+    def __init__(self, max_entries=10000, ttl=86400, spill_path=None):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = None
+        if spill_path:
+            self._db = ProcessConnection(spill_path, (
+                'PRAGMA journal_mode=WAL',
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'idempotency_key TEXT NOT NULL, fingerprint TEXT NOT NULL, digest TEXT NOT NULL, '
+                'body BLOB NOT NULL, content_type TEXT NOT NULL, expires REAL NOT NULL, '
+                'PRIMARY KEY (idempotency_key, fingerprint))',
+            ))
+            self._db.get()
+        # (idempotency key, fingerprint) -> (digest, body, content_type, expires)
+        self._memory = TTLCache(max_entries=max_entries, ttl=ttl,
+                                on_evict=self._spill if self._db else None)
+        self._spill_lock = threading.Lock()
+        self._spill_writes = 0
+        self.spilled = 0
+        self.replays = 0
+        self.conflicts = 0
+
+    def _spill(self, cache_key, entry):
+        # Called by TTLCache for expired entries too; only live ones are kept
+        digest, body, content_type, expires = entry
+        now = time.time()
+        if expires <= now:
+            return
+        conn = self._db.get()
+        with self._spill_lock, conn:
+            conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                               cache_key + (digest, body, content_type, expires))
+            self._spill_writes += 1
+            if self._spill_writes % 1000 == 0:
+                conn.execute('DELETE FROM responses WHERE expires <= ?', (now,))
+        self.spilled += 1
+
+    def _load(self, cache_key):
+        if self._db is None:
+            return None
+        with self._spill_lock:
+            row = self._db.get().execute(
+                'SELECT digest, body, content_type, expires FROM responses '
+                'WHERE idempotency_key = ? AND fingerprint = ? AND expires > ?',
+                cache_key + (time.time(),)).fetchone()
+        if row is None:
+            return None
+        entry = (row[0], bytes(row[1]), row[2], row[3])
+        self._memory.set(cache_key, entry, ttl=entry[3] - time.time())
+        return entry
+
+    def _check(self, entry, digest):
+        if entry[0] != digest:
+            self.conflicts += 1
+            raise IdempotencyConflict('Idempotency key was already used for a different request')
+        self.replays += 1
+        return entry[1], entry[2]
+
+    def get(self, idempotency_key, fingerprint, digest):
+        """Return the stored (body, content_type), or None if there is none yet
+
+        Raises IdempotencyConflict when the stored response answered a
+        request with a different digest.
+        """
+        cache_key = (idempotency_key, fingerprint)
+        entry = self._memory.get(cache_key) or self._load(cache_key)
+        if entry is None:
+            return None
+        return self._check(entry, digest)
+
+    def put(self, idempotency_key, fingerprint, digest, body, content_type):
+        """Store a response unless one is already stored
+
+        When a concurrent request got there first its (body, content_type)
+        is returned so both callers answer identically; otherwise None.
+        """
+        cache_key = (idempotency_key, fingerprint)
+        with self._lock:
+            entry = self._memory.get(cache_key) or self._load(cache_key)
+            if entry is not None:
+                return self._check(entry, digest)
+            self._memory.set(cache_key, (digest, body, content_type, time.time() + self.ttl))
+        return None
+
+    def stats(self):
+        stats = self._memory.stats()
+        stats.update(spilled=self.spilled, replays=self.replays, conflicts=self.conflicts)
+        return stats
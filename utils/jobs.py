@@ -0,0 +1,183 @@
+"""Background jobs for operations too slow to run inside a request
+
+A job is submitted with a function to run, gets an id straight away and
+runs on a bounded thread pool. Its status and result live in a job store
+until they expire, so clients can poll or long-poll for the outcome.
+"""
+import json
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.sqlite_conn import ProcessConnection
+from utils.ttl_cache import TTLCache
+from utils.workers import PoolSaturated
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+FINISHED = (SUCCEEDED, FAILED)
+
+# How often wait() re-reads the store for jobs run by another process
+POLL_INTERVAL = 0.25
+
+
+class MemoryJobStore:
+    """Job records held in this process, evicted by TTL and LRU"""
+
+    def __init__(self, max_entries=10000, ttl=3600):
+        self._cache = TTLCache(max_entries=max_entries, ttl=ttl)
+
+    def put(self, record):
+        self._cache.set(record['id'], dict(record))
+
+    def get(self, job_id):
+        record = self._cache.peek(job_id)
+        return None if record is None else dict(record)
+
+    def stats(self):
+        return {'size': len(self._cache), 'evictions': self._cache.evictions}
+
+
+class SQLiteJobStore:
+    """Job records in a local SQLite file, shared by every process using it
+
+    Records are stored as JSON, so results must be JSON-serializable.
+    Expired rows are deleted whenever a record is written.
+    """
+
+    def __init__(self, path, ttl=3600):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = ProcessConnection(path, (
+            'PRAGMA journal_mode=WAL',
+            'CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, record TEXT NOT NULL, expires REAL NOT NULL)',
+            'CREATE INDEX IF NOT EXISTS jobs_expires ON jobs (expires)',
+        ), isolation_level=None)
+        self._db.get()
+
+    @property
+    def _conn(self):
+        return self._db.get()
+
+    def put(self, record):
+        now = time.time()
+        with self._lock:
+            self._conn.execute('DELETE FROM jobs WHERE expires <= ?', (now,))
+            self._conn.execute('INSERT OR REPLACE INTO jobs (id, record, expires) VALUES (?, ?, ?)',
+                               (record['id'], json.dumps(record), now + self.ttl))
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute('SELECT record FROM jobs WHERE id = ? AND expires > ?',
+                                     (job_id, time.time())).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def stats(self):
+        with self._lock:
+            (size,) = self._conn.execute('SELECT COUNT(*) FROM jobs WHERE expires > ?', (time.time(),)).fetchone()
+        return {'size': size}
+
+
+class JobManager:
+    """Runs submitted jobs on a bounded thread pool
+
+    At most ``max_pending`` jobs may be queued or running at once, beyond
+    that submit() raises PoolSaturated. A job's function returns its
+    result; any exception it raises marks the job failed with the
+    exception's message.
+    """
+
+    def __init__(self, store, workers=2, max_pending=None, retry_after=1):
+        self.store = store
+        self.workers = workers
+        self.max_pending = max_pending or workers * 16
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._events = {}  # job id -> Event set when the job finishes
+        self._lock = threading.Lock()
+        self._in_flight = 0  # queued or running jobs
+        self.submitted = 0
+        self.rejected = 0
+
+    def submit(self, kind, fn, *args):
+        """Queue fn(*args) and return the new job's record"""
+        with self._lock:
+            if self._in_flight >= self.max_pending:
+                self.rejected += 1
+                raise PoolSaturated(self.retry_after)
+            self._in_flight += 1
+
+        record = {
+            'id': secrets.token_urlsafe(16),
+            'type': kind,
+            'status': QUEUED,
+            'created': time.time(),
+            'started': None,
+            'finished': None,
+            'result': None,
+            'error': None,
+        }
+        try:
+            self.store.put(record)
+            with self._lock:
+                self._events[record['id']] = threading.Event()
+            self._executor.submit(self._run, record, fn, args)
+        except BaseException:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+        self.submitted += 1
+        return record
+
+    def _run(self, record, fn, args):
+        try:
+            record = dict(record, status=RUNNING, started=time.time())
+            self.store.put(record)
+            try:
+                record.update(status=SUCCEEDED, result=fn(*args))
+            except Exception as e:
+                record.update(status=FAILED, error=str(e))
+            record['finished'] = time.time()
+            self.store.put(record)
+        finally:
+            with self._lock:
+                event = self._events.pop(record['id'], None)
+                self._in_flight -= 1
+            if event is not None:
+                event.set()
+
+    def get(self, job_id):
+        """Return a job's record, or None if it is unknown or expired"""
+        return self.store.get(job_id)
+
+    def wait(self, job_id, timeout):
+        """Return a job's record once it finishes or timeout seconds pass"""
+        deadline = time.monotonic() + timeout
+        while True:
+            record = self.store.get(job_id)
+            remaining = deadline - time.monotonic()
+            if record is None or record['status'] in FINISHED or remaining <= 0:
+                return record
+            with self._lock:
+                event = self._events.get(job_id)
+            if event is not None:
+                event.wait(remaining)
+            else:
+                # Running in another process sharing the store
+                time.sleep(min(POLL_INTERVAL, remaining))
+
+    def shutdown(self, wait=True):
+        """Stop accepting jobs, optionally waiting for running ones"""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self):
+        return dict(self.store.stats(), **{
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'in_flight': self._in_flight,
+            'submitted': self.submitted,
+            'rejected': self.rejected,
+        })
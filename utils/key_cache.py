@@ -0,0 +1,91 @@
+import hashlib
+import secrets
+import threading
+
+import rsa
+
+from utils.ttl_cache import TTLCache
+
+
+def key_fingerprint(key):
+    """Return the SHA-256 fingerprint of a key's modulus as hex"""
+    modulus = key.n.to_bytes((key.n.bit_length() + 7) // 8, 'big')
+    return hashlib.sha256(modulus).hexdigest()
+
+
+def key_kind(key):
+    """Return 'private' or 'public' for a parsed rsa key"""
+    return 'private' if isinstance(key, rsa.PrivateKey) else 'public'
+
+
+class CachedKey:
+    """A parsed key together with its opaque handle and fingerprint"""
+
+    __slots__ = ('handle', 'kind', 'fingerprint', 'key', 'bits')
+
+    def __init__(self, handle, kind, fingerprint, key):
+        self.handle = handle
+        self.kind = kind
+        self.fingerprint = fingerprint
+        self.key = key
+        self.bits = key.n.bit_length()
+
+
+class KeyCache:
+    """Bounded LRU cache of parsed keys addressed by opaque handles
+
+    Entries are keyed by (kind, modulus fingerprint) so registering the same
+    key twice returns the same handle. Handles are random tokens rather than
+    the fingerprint itself, otherwise anyone holding a public key could
+    derive the handle of the matching cached private key.
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600):
+        self._handles = {}  # handle -> (kind, fingerprint)
+        self._entries = TTLCache(max_entries, ttl, on_evict=self._forget_handle)
+        self._lock = threading.Lock()
+
+    def _forget_handle(self, cache_key, entry):
+        self._handles.pop(entry.handle, None)
+
+    @property
+    def ttl(self):
+        return self._entries.ttl
+
+    def register(self, key):
+        """Cache a parsed key and return its CachedKey entry"""
+        kind = key_kind(key)
+        fingerprint = key_fingerprint(key)
+        cache_key = (kind, fingerprint)
+        with self._lock:
+            entry = self._entries.peek(cache_key)
+            if entry is None or entry.key != key:
+                if entry is not None:
+                    # Same modulus but different key material: never let the
+                    # old handle resolve to the new key.
+                    self._handles.pop(entry.handle, None)
+                entry = CachedKey(secrets.token_urlsafe(24), kind, fingerprint, key)
+            self._entries.set(cache_key, entry)
+            self._handles[entry.handle] = cache_key
+        return entry
+
+    def get(self, handle, kind):
+        """Return the CachedKey for a handle, or None if unknown or expired"""
+        cache_key = self._handles.get(handle)
+        if cache_key is not None and cache_key[0] != kind:
+            cache_key = None
+        entry = self._entries.get(cache_key)
+        if entry is None or entry.handle != handle:
+            return None
+        return entry
+
+    def peek(self, handle):
+        """Return the CachedKey for a handle without counting a hit or miss"""
+        cache_key = self._handles.get(handle)
+        entry = self._entries.peek(cache_key)
+        if entry is None or entry.handle != handle:
+            return None
+        return entry
+
+    def stats(self):
+        return self._entries.stats()
@@ -0,0 +1,41 @@
+"""Arithmetic consistency checks for RSA key pairs
+
+A private key carries redundant values (p, q, d and the CRT exponents and
+coefficient) that must all agree with the public modulus and exponent.
+Checking them costs a few multiplications and modular reductions, far
+less than the private-key exponentiation of an encrypt/decrypt round trip.
+"""
+import hashlib
+
+
+def pair_fingerprint(public_pem, private_pem):
+    """Return a SHA-256 hex digest identifying a (public, private) PEM pair"""
+    digest = hashlib.sha256(public_pem.encode())
+    digest.update(b'\0')
+    digest.update(private_pem.encode())
+    return digest.hexdigest()
+
+
+def check_key_pair(pub_key, priv_key):
+    """Check that the private key is consistent with the public key
+
+    Returns (valid, message) in the same shape as app.validate_key_pair.
+    """
+    n, e = pub_key.n, pub_key.e
+    if priv_key.n != n or priv_key.e != e:
+        return False, "Keys do not form a valid pair"
+
+    p, q, d = priv_key.p, priv_key.q, priv_key.d
+    if p < 2 or q < 2 or p == q or p * q != n:
+        return False, "Private key primes do not match the modulus"
+
+    # d only has to invert e modulo lcm(p - 1, q - 1), so check it through
+    # its reductions, which are also the CRT exponents
+    if d % (p - 1) != priv_key.exp1 or d % (q - 1) != priv_key.exp2:
+        return False, "Private key CRT exponents do not match the private exponent"
+    if (e * priv_key.exp1) % (p - 1) != 1 or (e * priv_key.exp2) % (q - 1) != 1:
+        return False, "Private exponent does not invert the public exponent"
+    if (priv_key.coef * q) % p != 1:
+        return False, "Private key CRT coefficient is invalid"
+
+    return True, "Keys are valid and form a pair"
@@ -0,0 +1,135 @@
+import logging
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import rsa
+
+DEFAULT_TARGETS = {2048: 4, 3072: 2, 4096: 2}
+
+
+def parse_targets(spec):
+    """Parse a '2048:4,3072:2' style spec into {key_size: pool_size}"""
+    targets = {}
+    for item in spec.split(','):
+        if item.strip():
+            bits, count = item.split(':')
+            targets[int(bits)] = int(count)
+    return targets
+
+
+def new_key_pair(bits):
+    """Generate one key pair; runs in a worker process"""
+    return rsa.newkeys(bits)
+
+
+class PoolTimeout(Exception):
+    """Raised when no key pair became available in time"""
+
+
+class KeyPairPool:
+    """Keeps pre-generated key pairs ready for each supported key size
+
+    Worker processes refill each size up to its target in the background.
+    acquire() hands out a pooled pair immediately and falls back to waiting
+    for the next generated pair when the pool for that size is empty.
+    """
+
+    def __init__(self, targets=None, workers=1):
+        self.targets = dict(targets or DEFAULT_TARGETS)
+        self.workers = workers
+        self._ready = {bits: deque() for bits in self.targets}
+        self._pending = {bits: 0 for bits in self.targets}
+        self._low_water = dict(self.targets)
+        self._served = {bits: 0 for bits in self.targets}
+        self._empty_hits = {bits: 0 for bits in self.targets}
+        self._cond = threading.Condition()
+        self._executor = None
+
+    def start(self):
+        """Start the worker processes and fill every pool to its target"""
+        with self._cond:
+            if self._executor is None:
+                # Not fork: the server has other threads running by now
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('forkserver'))
+            for bits in self.targets:
+                self._refill(bits)
+
+    def shutdown(self, wait=False):
+        with self._cond:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _refill(self, bits):
+        # Caller holds self._cond
+        missing = self.targets[bits] - len(self._ready[bits]) - self._pending[bits]
+        for _ in range(max(missing, 0)):
+            self._submit(bits)
+
+    def _submit(self, bits):
+        # Caller holds self._cond
+        future = self._executor.submit(new_key_pair, bits)
+        self._pending[bits] += 1
+        future.add_done_callback(lambda f: self._collect(bits, f))
+
+    def _collect(self, bits, future):
+        with self._cond:
+            self._pending[bits] -= 1
+            if future.cancelled():
+                return
+            error = future.exception()
+            if error is not None:
+                logging.error(f"Key pool generation failed for {bits}-bit keys: {str(error)}")
+                return
+            self._ready[bits].append(future.result())
+            self._cond.notify_all()
+
+    def acquire(self, bits, timeout=None):
+        """Return (pub_key, priv_key, pooled) for a configured key size
+
+        pooled is False when the caller had to wait for generation.
+        Raises PoolTimeout if no pair arrived within timeout seconds.
+        """
+        if bits not in self.targets:
+            raise ValueError(f'Unsupported key size: {bits}')
+        if self._executor is None:
+            self.start()
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            pooled = bool(self._ready[bits])
+            if not pooled:
+                self._empty_hits[bits] += 1
+                # Make sure at least one pair is on its way for us
+                if self._pending[bits] == 0:
+                    self._submit(bits)
+            while not self._ready[bits]:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise PoolTimeout(f'No {bits}-bit key pair available')
+                self._cond.wait(remaining)
+
+            pub_key, priv_key = self._ready[bits].popleft()
+            self._served[bits] += 1
+            self._low_water[bits] = min(self._low_water[bits], len(self._ready[bits]))
+            self._refill(bits)
+        return pub_key, priv_key, pooled
+
+    def stats(self):
+        """Per key size: ready, pending, target and low-water mark"""
+        with self._cond:
+            return {
+                str(bits): {
+                    'ready': len(self._ready[bits]),
+                    'pending': self._pending[bits],
+                    'target': self.targets[bits],
+                    'low_water_mark': self._low_water[bits],
+                    'served': self._served[bits],
+                    'empty_hits': self._empty_hits[bits],
+                }
+                for bits in self.targets
+            }
@@ -0,0 +1,124 @@
+"""Indexed on-disk key store
+
+Keys live in one SQLite file, indexed by key id and by modulus
+fingerprint, with key material stored as PKCS#1 DER. Lookups are a single
+indexed query, and parsed keys are kept in an in-process LRU cache so hot
+keys are neither re-read nor re-parsed.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+import rsa
+
+from utils.key_cache import key_fingerprint
+from utils.sqlite_conn import ProcessConnection
+from utils.ttl_cache import TTLCache
+
+DEFAULT_PATH = os.path.join('user_keys', 'keys.db')
+
+_KEY_CLASSES = {'public': rsa.PublicKey, 'private': rsa.PrivateKey}
+
+
+class KeyExists(Exception):
+    """Raised when storing a key under an id that is already taken"""
+
+
+class KeyStore:
+    """SQLite-backed key store with a parsed-key cache
+
+    Each write runs in its own transaction, so a batch is stored entirely
+    or not at all and readers never see half-written keys.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, cache_size=1024, cache_ttl=3600):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = ProcessConnection(path, (
+            'PRAGMA journal_mode=WAL',
+            'CREATE TABLE IF NOT EXISTS keys ('
+            'key_id TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, bits INTEGER NOT NULL, '
+            'public_der BLOB NOT NULL, private_der BLOB, created REAL NOT NULL)',
+            'CREATE INDEX IF NOT EXISTS keys_fingerprint ON keys (fingerprint)',
+        ))
+        self._db.get()
+        self._cache = TTLCache(max_entries=cache_size, ttl=cache_ttl)  # (key_id, kind) -> key
+
+    @property
+    def _conn(self):
+        return self._db.get()
+
+    def put(self, key_id, pub_key, priv_key=None):
+        """Store a public key and optionally its private key, returning the fingerprint"""
+        return self.put_many([(key_id, pub_key, priv_key)])[0]
+
+    def put_many(self, entries):
+        """Store (key_id, pub_key, priv_key) entries in one transaction
+
+        Raises KeyExists, storing nothing, if any id is already taken.
+        """
+        now = time.time()
+        rows = []
+        for key_id, pub_key, priv_key in entries:
+            rows.append((
+                key_id,
+                key_fingerprint(pub_key),
+                pub_key.n.bit_length(),
+                pub_key.save_pkcs1('DER'),
+                None if priv_key is None else priv_key.save_pkcs1('DER'),
+                now,
+            ))
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    'INSERT INTO keys (key_id, fingerprint, bits, public_der, private_der, created) '
+                    'VALUES (?, ?, ?, ?, ?, ?)', rows)
+        except sqlite3.IntegrityError:
+            raise KeyExists('Key id already exists') from None
+        return [row[1] for row in rows]
+
+    def get(self, key_id, kind='public'):
+        """Return the parsed 'public' or 'private' key for an id, or None"""
+        key = self._cache.get((key_id, kind))
+        if key is not None:
+            return key
+
+        column = 'private_der' if kind == 'private' else 'public_der'
+        with self._lock:
+            row = self._conn.execute(f'SELECT {column} FROM keys WHERE key_id = ?', (key_id,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        key = _KEY_CLASSES[kind].load_pkcs1(row[0], 'DER')
+        self._cache.set((key_id, kind), key)
+        return key
+
+    def find(self, fingerprint):
+        """Return the ids of keys whose modulus has this fingerprint"""
+        with self._lock:
+            rows = self._conn.execute('SELECT key_id FROM keys WHERE fingerprint = ?', (fingerprint,)).fetchall()
+        return [row[0] for row in rows]
+
+    def delete(self, key_id):
+        """Remove a key, returning whether it existed"""
+        with self._lock, self._conn:
+            deleted = self._conn.execute('DELETE FROM keys WHERE key_id = ?', (key_id,)).rowcount
+        self._cache.pop((key_id, 'public'))
+        self._cache.pop((key_id, 'private'))
+        return bool(deleted)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM keys').fetchone()[0]
+
+    def stats(self):
+        cache = self._cache.stats()
+        return {
+            'keys': len(self),
+            'cached': cache['size'],
+            'cache_hits': cache['hits'],
+            'cache_misses': cache['misses'],
+        }
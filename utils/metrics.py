@@ -0,0 +1,163 @@
+import bisect
+import threading
+import time
+from contextlib import nullcontext
+
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_NOOP_STAGE = nullcontext()
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+
+class _Stage:
+    """Context manager timing one stage of a request"""
+
+    __slots__ = ('_timer', '_name', '_start')
+
+    def __init__(self, timer, name):
+        self._timer = timer
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._timer.durations.append((self._name, time.perf_counter() - self._start))
+        return False
+
+
+class RequestTimer:
+    """Collects stage durations for one request
+
+    Durations are only recorded when finish() runs, so the key size label
+    can be filled in once the key has been loaded.
+    """
+
+    def __init__(self, registry, route):
+        self._registry = registry
+        self.route = route
+        self.key_size = None
+        self.durations = []
+        self._start = time.perf_counter()
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def finish(self, status):
+        key_size = self.key_size or 'unknown'
+        registry = self._registry
+        for name, seconds in self.durations:
+            registry.observe('rsa_request_stage_seconds', seconds,
+                             route=self.route, stage=name, key_size=key_size)
+        registry.observe('rsa_request_seconds', time.perf_counter() - self._start,
+                         route=self.route, key_size=key_size)
+        registry.inc('rsa_requests_total', route=self.route, status=status, key_size=key_size)
+
+
+class _NoopTimer:
+    """Stand-in for RequestTimer when metrics are disabled"""
+
+    __slots__ = ('key_size',)
+
+    def stage(self, name):
+        return _NOOP_STAGE
+
+    def finish(self, status):
+        pass
+
+
+NOOP_TIMER = _NoopTimer()
+
+
+class MetricsRegistry:
+    """In-process counters and histograms rendered in Prometheus text format
+
+    When disabled, request_timer() returns a shared no-op timer, so the
+    instrumentation left in request handlers costs a couple of attribute
+    lookups and calls per stage.
+    """
+
+    def __init__(self, enabled=True, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._counters = {}
+        self._histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def request_timer(self, route):
+        if not self.enabled:
+            return NOOP_TIMER
+        return RequestTimer(self, route)
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = self._key(name, labels)
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            data = self._histograms.get(key)
+            if data is None:
+                data = self._histograms[key] = [0] * (len(self.buckets) + 3)
+            data[index] += 1
+            data[-2] += seconds
+            data[-1] += 1
+
+    def register_collector(self, collect):
+        """Add a callable returning (name, labels dict, value[, kind]) samples
+
+        kind is 'gauge' (the default) or 'counter'. Samples may come in any
+        order; render() groups them by name.
+        """
+        self._collectors.append(collect)
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(data) for key, data in self._histograms.items()}
+
+        lines = []
+        typed = set()
+        for (name, labels), value in sorted(counters.items()):
+            if name not in typed:
+                lines.append(f'# TYPE {name} counter')
+                typed.add(name)
+            lines.append(f'{name}{_format_labels(labels)} {value}')
+
+        for (name, labels), data in sorted(histograms.items()):
+            if name not in typed:
+                lines.append(f'# TYPE {name} histogram')
+                typed.add(name)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), data):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", bound),))} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {data[-2]}')
+            lines.append(f'{name}_count{_format_labels(labels)} {data[-1]}')
+
+        # Each family must be one contiguous group, so collect every
+        # sample before writing any
+        families = {}  # name -> (kind, [sample lines])
+        for collect in self._collectors:
+            for name, labels, value, *kind in collect():
+                family = families.setdefault(name, (kind[0] if kind else 'gauge', []))
+                family[1].append(f'{name}{_format_labels(self._key(name, labels)[1])} {value}')
+        for name, (kind, samples) in families.items():
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,104 @@
+"""Private keys with their decryption state precomputed and kept
+
+rsa.PrivateKey already decrypts with CRT and squares its blinding factor
+between calls, but that state lives on the key object: a key parsed from
+PEM for each request, or pickled to a worker process, starts over and
+pays for a fresh blinding factor and its modular inverse. It also raises
+the blinding factor to e on every call.
+
+PreparedPrivateKey keeps the blinding pair as (r^e mod n, r^-1 mod n) and
+refreshes both by squaring, which keeps the pair consistent since
+(r^2)^e = (r^e)^2. Prepared keys are cached per process, keyed by the full
+private key, so repeat decryptions with the same key reuse them whether
+they run inline or on a worker. The exponentiations go through
+utils.backend, which uses GMP when gmpy2 is installed.
+"""
+import math
+import secrets
+import threading
+from hmac import compare_digest
+
+from rsa import common, transform
+from rsa.pkcs1 import DecryptionError
+
+from utils import backend
+from utils.ttl_cache import TTLCache
+
+_prepared = TTLCache(max_entries=256, ttl=3600)
+
+
+class PreparedPrivateKey:
+    """Decrypts PKCS#1 v1.5 blocks with reusable CRT and blinding state"""
+
+    __slots__ = ('n', 'e', 'p', 'q', 'exp1', 'exp2', 'coef', 'block_size',
+                 '_blind', '_unblind', '_lock')
+
+    def __init__(self, priv_key):
+        n, e = priv_key.n, priv_key.e
+        while True:
+            r = secrets.randbelow(n - 2) + 2
+            if math.gcd(r, n) == 1:
+                break
+
+        number = backend.number
+        self.n, self.e = number(n), e
+        self.p, self.q = number(priv_key.p), number(priv_key.q)
+        self.exp1, self.exp2, self.coef = number(priv_key.exp1), number(priv_key.exp2), number(priv_key.coef)
+        self.block_size = common.byte_size(n)
+        self._lock = threading.Lock()
+        self._blind = number(pow(r, e, n))
+        self._unblind = number(pow(r, -1, n))
+
+    def _next_blinding_pair(self):
+        with self._lock:
+            n = self.n
+            self._blind = self._blind * self._blind % n
+            self._unblind = self._unblind * self._unblind % n
+            return self._blind, self._unblind
+
+    def decrypt_int(self, encrypted):
+        """Return encrypted^d mod n, blinded against timing attacks"""
+        blind, unblind = self._next_blinding_pair()
+        blinded = encrypted * blind % self.n
+        s1 = backend.powmod(blinded, self.exp1, self.p)
+        s2 = backend.powmod(blinded, self.exp2, self.q)
+        h = (s1 - s2) * self.coef % self.p
+        return int((s2 + self.q * h) * unblind % self.n)
+
+    def decrypt(self, crypto):
+        """Decrypt one block exactly as rsa.decrypt does"""
+        decrypted = self.decrypt_int(transform.bytes2int(crypto))
+        cleartext = transform.int2bytes(decrypted, self.block_size)
+
+        # Leading zero bytes are not reflected in the integer value
+        if len(crypto) > self.block_size:
+            raise DecryptionError('Decryption failed')
+
+        # Check the marker and padding length without branching on either
+        marker_bad = not compare_digest(cleartext[:2], b'\x00\x02')
+        sep_idx = cleartext.find(b'\x00', 2)
+        if marker_bad | (sep_idx < 10):
+            raise DecryptionError('Decryption failed')
+        return cleartext[sep_idx + 1:]
+
+
+def prepare(priv_key):
+    """Return the cached PreparedPrivateKey for a key, creating it if needed"""
+    # Keyed by every component, not just the modulus, so a forged key
+    # sharing n with a cached one can never reuse its state
+    cache_key = (priv_key.n, priv_key.e, priv_key.d, priv_key.p, priv_key.q)
+    prepared = _prepared.get(cache_key)
+    if prepared is None:
+        prepared = PreparedPrivateKey(priv_key)
+        _prepared.set(cache_key, prepared)
+    return prepared
+
+
+def decrypt(crypto, priv_key):
+    """Drop-in replacement for rsa.decrypt using the per-process prepared key"""
+    return prepare(priv_key).decrypt(crypto)
+
+
+def stats():
+    """Prepared key cache counters for this process"""
+    return _prepared.stats()
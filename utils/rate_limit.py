@@ -0,0 +1,148 @@
+"""Token-bucket admission control for private-key endpoints
+
+Each client has a bucket refilled at ``rate`` tokens per second up to
+``burst``. A request spends tokens in proportion to the work it causes,
+estimated from the key size before any PEM is parsed, so an over-limit
+client is turned away for the price of a dictionary lookup.
+"""
+import math
+import threading
+import time
+
+from utils.sqlite_conn import ProcessConnection
+from utils.ttl_cache import TTLCache
+
+REFERENCE_BITS = 2048
+KEYGEN_REFERENCE_COST = 10  # tokens for generating one 2048-bit key pair
+
+# PEM length grows linearly with key size: (characters per bit, overhead)
+_PEM_SIZE = {
+    'private': (0.785, 80),
+    'public': (0.174, 70),
+}
+
+
+def estimate_bits(pem, kind):
+    """Estimate a key's size in bits from its PEM text length"""
+    per_bit, overhead = _PEM_SIZE[kind]
+    return max(int((len(pem) - overhead) / per_bit), 512)
+
+
+def key_cost(bits):
+    """Tokens for one private-key operation; 1 for a 2048-bit key
+
+    Modular exponentiation time grows roughly with the cube of key size.
+    """
+    return (bits / REFERENCE_BITS) ** 3
+
+
+def _allowed(tokens, cost, burst):
+    # A cost over the burst is admitted from a full bucket and leaves it
+    # in debt, so large requests wait in proportion to their full cost
+    return tokens >= min(cost, burst)
+
+
+def keygen_cost(bits):
+    """Tokens for generating one key pair; KEYGEN_REFERENCE_COST at 2048 bits
+
+    Prime search time grows roughly with the fourth power of key size.
+    """
+    return KEYGEN_REFERENCE_COST * (bits / REFERENCE_BITS) ** 4
+
+
+class MemoryBucketStore:
+    """Buckets held in this process"""
+
+    def __init__(self, max_clients=100000):
+        self._buckets = TTLCache(max_entries=max_clients, ttl=3600)
+        self._lock = threading.Lock()
+
+    def take(self, client, cost, rate, burst):
+        """Spend cost tokens; return (allowed, seconds until enough tokens)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(client, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = _allowed(tokens, cost, burst)
+            if allowed:
+                tokens -= cost
+            # An idle bucket is full again after (burst - tokens) / rate seconds
+            self._buckets.set(client, (tokens, now), ttl=(burst - tokens) / rate)
+        return allowed, 0 if allowed else (min(cost, burst) - tokens) / rate
+
+
+class SQLiteBucketStore:
+    """Buckets in a local SQLite file shared by every worker process"""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = ProcessConnection(path, (
+            'PRAGMA journal_mode=WAL',
+            'CREATE TABLE IF NOT EXISTS buckets (client TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)',
+        ), isolation_level=None)
+        self._db.get()
+        self._writes = 0
+
+    @property
+    def _conn(self):
+        return self._db.get()
+
+    def take(self, client, cost, rate, burst):
+        """Spend cost tokens; return (allowed, seconds until enough tokens)"""
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front so concurrent
+            # processes cannot both spend the same tokens
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute('SELECT tokens, updated FROM buckets WHERE client = ?', (client,)).fetchone()
+                tokens, updated = row if row else (burst, now)
+                tokens = min(burst, tokens + max(now - updated, 0) * rate)
+                allowed = _allowed(tokens, cost, burst)
+                if allowed:
+                    tokens -= cost
+                self._conn.execute('INSERT OR REPLACE INTO buckets (client, tokens, updated) VALUES (?, ?, ?)',
+                                   (client, tokens, now))
+                self._writes += 1
+                if self._writes % 1000 == 0:
+                    # Drop buckets that have refilled completely
+                    self._conn.execute('DELETE FROM buckets WHERE updated + (? - tokens) / ? < ?', (burst, rate, now))
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        return allowed, 0 if allowed else (min(cost, burst) - tokens) / rate
+
+
+class RateLimiter:
+    """Per-client token buckets
+
+    A request costing more than ``burst`` is admitted only from a full
+    bucket and charged its whole cost, leaving the bucket in debt. Very
+    large keys and batches are slowed to the same long-run rate as single
+    requests rather than locked out.
+    """
+
+    def __init__(self, rate=5, burst=20, store=None):
+        self.rate = rate
+        self.burst = burst
+        self.store = store or MemoryBucketStore()
+        self.admitted = 0
+        self.rejected = 0
+
+    def admit(self, client, cost=1):
+        """Return (allowed, retry_after) with retry_after in whole seconds"""
+        allowed, wait = self.store.take(client, cost, self.rate, self.burst)
+        if allowed:
+            self.admitted += 1
+            return True, 0
+        self.rejected += 1
+        return False, max(math.ceil(wait), 1)
+
+    def stats(self):
+        return {
+            'rate': self.rate,
+            'burst': self.burst,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+        }
@@ -0,0 +1,68 @@
+"""PKCS#1 v1.5 signatures compatible with rsa.sign and rsa.verify
+
+Signing runs the private-key operation through a prepared key, so it can
+be sent to the worker pool with just the digest. Verification is one
+public-exponent exponentiation per signature against a SignatureVerifier
+that holds the parsed key and the expected padding for every hash.
+MD5 is not accepted in either direction.
+"""
+import hmac
+
+from rsa import common, transform
+from rsa.pkcs1 import HASH_ASN1, HASH_METHODS, VerificationError, compute_hash
+
+from utils import backend
+from utils.prepared_key import prepare
+
+SIGNATURE_HASHES = ('SHA-256', 'SHA-384', 'SHA-512', 'SHA-224', 'SHA-1')
+DEFAULT_HASH = 'SHA-256'
+
+
+def _padded_prefix(hash_method, key_length):
+    """Everything in an encoded signature block before the digest"""
+    digest_size = HASH_METHODS[hash_method]().digest_size
+    cleartext_length = len(HASH_ASN1[hash_method]) + digest_size
+    if cleartext_length + 11 > key_length:
+        raise OverflowError(f'Key is too small for {hash_method} signatures')
+    return b'\x00\x01' + b'\xff' * (key_length - cleartext_length - 3) + b'\x00' + HASH_ASN1[hash_method]
+
+
+def sign_hash(digest, priv_key, hash_method=DEFAULT_HASH):
+    """Sign a precomputed digest, returning the same bytes as rsa.sign_hash"""
+    key_length = common.byte_size(priv_key.n)
+    padded = _padded_prefix(hash_method, key_length) + digest
+    signature = prepare(priv_key).decrypt_int(transform.bytes2int(padded))
+    return transform.int2bytes(signature, key_length)
+
+
+class SignatureVerifier:
+    """Verifies many signatures against one public key"""
+
+    def __init__(self, pub_key):
+        self.key_length = common.byte_size(pub_key.n)
+        self.n = backend.number(pub_key.n)
+        self.e = pub_key.e
+        self._prefixes = {}
+        for method in SIGNATURE_HASHES:
+            try:
+                self._prefixes[method] = _padded_prefix(method, self.key_length)
+            except OverflowError:
+                pass
+
+    def verify(self, message, signature):
+        """Return the hash method used, raising VerificationError if invalid"""
+        if len(signature) != self.key_length:
+            raise VerificationError('Verification failed')
+        value = transform.bytes2int(signature)
+        if value >= self.n:
+            raise VerificationError('Verification failed')
+        block = transform.int2bytes(int(backend.powmod(value, self.e, self.n)), self.key_length)
+
+        # Each prefix pads out to the key length minus its digest size, so a
+        # matching prefix leaves exactly the digest
+        for method, prefix in self._prefixes.items():
+            if block.startswith(prefix):
+                if hmac.compare_digest(block[len(prefix):], compute_hash(message, method)):
+                    return method
+                break
+        raise VerificationError('Verification failed')
@@ -0,0 +1,40 @@
+"""SQLite connections that are never carried across fork()
+
+SQLite connections must not be used by a child process. Servers that
+import the app before forking workers (gunicorn's preload_app) would hand
+every worker the connections opened at import, so stores hold a
+ProcessConnection instead and each process opens its own on first use.
+"""
+import os
+import sqlite3
+import threading
+
+
+class ProcessConnection:
+    """One SQLite connection per process, set up with the given statements"""
+
+    def __init__(self, path, setup=(), **kwargs):
+        self.path = path
+        self._setup = setup
+        self._kwargs = kwargs
+        self._lock = threading.Lock()
+        self._pid = None
+        self._conn = None
+        self._inherited = []
+
+    def get(self):
+        """Return this process's connection, opening it if needed"""
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    if self._conn is not None:
+                        # Closing the parent's connection here could disturb
+                        # its locks, so it is just kept from being collected
+                        self._inherited.append(self._conn)
+                    conn = sqlite3.connect(self.path, check_same_thread=False, **self._kwargs)
+                    for statement in self._setup:
+                        conn.execute(statement)
+                    conn.commit()
+                    self._conn, self._pid = conn, pid
+        return self._conn
@@ -0,0 +1,104 @@
+"""Pre-rendered pages and static files served from memory
+
+Each cached body carries a strong ETag and is compressed once up front
+with gzip, and with brotli when the brotli package is installed, so a
+repeat request costs a dictionary lookup and, when the client already
+holds the bytes, a 304 Not Modified with no body at all.
+
+Static files are addressed by content-hashed URLs (``?v=<hash>``). A URL
+carrying the current hash can be cached forever, since new content gets
+a new URL.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is always available
+    brotli = None
+
+MIN_COMPRESS_SIZE = 256  # bytes; smaller bodies are only sent as-is
+ENCODINGS = ('br', 'gzip')  # in order of preference
+
+
+class CachedBody:
+    """A response body with its ETag and precompressed variants"""
+
+    __slots__ = ('content_type', 'digest', 'variants')
+
+    def __init__(self, body, content_type):
+        self.content_type = content_type
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.variants = {'identity': body}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            # mtime=0 keeps the gzip bytes identical across restarts
+            self._add_variant('gzip', gzip.compress(body, 9, mtime=0))
+            if brotli is not None:
+                self._add_variant('br', brotli.compress(body))
+
+    def _add_variant(self, encoding, body):
+        if len(body) < len(self.variants['identity']):
+            self.variants[encoding] = body
+
+    @property
+    def version(self):
+        """Short content hash used in static URLs"""
+        return self.digest[:12]
+
+    def etag(self, encoding):
+        """Strong ETag, distinct for every encoding of the same content"""
+        tag = self.digest[:32]
+        return tag if encoding == 'identity' else f'{tag}-{encoding}'
+
+    def choose_encoding(self, request):
+        for encoding in ENCODINGS:
+            if encoding in self.variants and request.accept_encodings[encoding]:
+                return encoding
+        return 'identity'
+
+
+def cached_response(cached, request, cache_control):
+    """Serve a CachedBody, answering 304 when If-None-Match already matches"""
+    encoding = cached.choose_encoding(request)
+    etag = cached.etag(encoding)
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(cached.variants[encoding], content_type=cached.content_type)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+class StaticFiles:
+    """Every file under a static folder, read and hashed once"""
+
+    def __init__(self, folder):
+        self._files = {}
+        for root, _, names in os.walk(folder):
+            for name in names:
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, folder).replace(os.sep, '/')
+                mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+                if mimetype.startswith('text/') or mimetype == 'application/javascript':
+                    mimetype += '; charset=utf-8'
+                with open(path, 'rb') as f:
+                    self._files[filename] = CachedBody(f.read(), mimetype)
+
+    def get(self, filename):
+        """Return the CachedBody for a file, or None if it was not found at startup"""
+        return self._files.get(filename)
+
+    def version(self, filename):
+        cached = self._files.get(filename)
+        return cached.version if cached else None
+
+    def __len__(self):
+        return len(self._files)
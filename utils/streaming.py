@@ -0,0 +1,164 @@
+"""Chunked envelope encryption for streams of any length
+
+Stream layout::
+
+    MAGIC (4) | RSA-wrapped session key (key size) | nonce | chunk size (4)
+    then frames of: length (4) | ciphertext (length) | tag
+
+The top bit of a frame's length marks the final frame. Each frame is
+encrypted and authenticated on its own, with its index and final flag
+bound into the tag, so frames cannot be reordered, dropped or truncated
+without detection and memory use stays at one chunk.
+
+Like envelopes, streams use AES-256-GCM when the cryptography package is
+installed (MAGIC RSF\\x02): the frame nonce is a 3-byte stream nonce,
+the frame index and the final flag, and the header is associated data,
+with a 16-byte tag. Otherwise they fall back to the SHAKE-256 keystream
+and HMAC-SHA256 construction (LEGACY_MAGIC RSF\\x01, 16-byte nonce,
+32-byte tag).
+"""
+import hashlib
+import hmac
+import os
+import struct
+
+import rsa
+from rsa import common
+
+from utils import envelope
+from utils.envelope import GCM_TAG_SIZE, NONCE_SIZE, SESSION_KEY_SIZE, TAG_SIZE, derive_keys, keystream_xor
+
+MAGIC = b'RSF\x02'
+LEGACY_MAGIC = b'RSF\x01'
+GCM_NONCE_PREFIX_SIZE = 3  # plus 8-byte index and final flag makes GCM's 12 bytes
+DEFAULT_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+_FINAL_FLAG = 0x80000000
+
+
+def _read_exactly(read, size):
+    """Read size bytes, returning fewer only at end of stream"""
+    parts = []
+    remaining = size
+    while remaining > 0:
+        part = read(remaining)
+        if not part:
+            break
+        parts.append(part)
+        remaining -= len(part)
+    return b''.join(parts)
+
+
+def _frame_nonce(nonce, index, final):
+    return nonce + struct.pack('>QB', index, final)
+
+
+def encrypt_stream(read, pub_key, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield the encrypted stream for data pulled from read(size)"""
+    session_key = os.urandom(SESSION_KEY_SIZE)
+    if envelope.AESGCM is not None:
+        aesgcm = envelope.AESGCM(session_key)
+        magic, nonce = MAGIC, os.urandom(GCM_NONCE_PREFIX_SIZE)
+    else:
+        aesgcm = None
+        enc_key, mac_key = derive_keys(session_key)
+        magic, nonce = LEGACY_MAGIC, os.urandom(NONCE_SIZE)
+    header = magic + rsa.encrypt(session_key, pub_key) + nonce + struct.pack('>I', chunk_size)
+    yield header
+
+    index = 0
+    chunk = _read_exactly(read, chunk_size)
+    while True:
+        # Read one chunk ahead so the last frame can be flagged as final
+        next_chunk = _read_exactly(read, chunk_size) if len(chunk) == chunk_size else b''
+        final = not next_chunk
+        frame_nonce = _frame_nonce(nonce, index, final)
+        if aesgcm is not None:
+            sealed = aesgcm.encrypt(frame_nonce, chunk, header)
+        else:
+            body = keystream_xor(enc_key, frame_nonce, chunk)
+            sealed = body + hmac.new(mac_key, frame_nonce + body, hashlib.sha256).digest()
+        yield struct.pack('>I', len(chunk) | (_FINAL_FLAG if final else 0)) + sealed
+        if final:
+            return
+        chunk = next_chunk
+        index += 1
+
+
+class StreamDecryptor:
+    """Decrypts a stream produced by encrypt_stream()
+
+    The header is read and the session key unwrapped on construction, so
+    a wrong key is reported before any output is produced. ``unwrap``
+    performs the RSA decryption of the session key. AES-GCM streams need
+    the cryptography package; legacy streams always decrypt.
+    """
+
+    def __init__(self, read, priv_key, unwrap=rsa.decrypt):
+        self._read = read
+        magic = _read_exactly(read, len(MAGIC))
+        if magic == MAGIC:
+            if envelope.AESGCM is None:
+                raise rsa.pkcs1.DecryptionError('AES-GCM streams require the cryptography package')
+            nonce_size, self._tag_size = GCM_NONCE_PREFIX_SIZE, GCM_TAG_SIZE
+        elif magic == LEGACY_MAGIC:
+            nonce_size, self._tag_size = NONCE_SIZE, TAG_SIZE
+        else:
+            raise rsa.pkcs1.DecryptionError('Decryption failed')
+
+        key_size = common.byte_size(priv_key.n)
+        rest = _read_exactly(read, key_size + nonce_size + 4)
+        if len(rest) < key_size + nonce_size + 4:
+            raise rsa.pkcs1.DecryptionError('Decryption failed')
+        self._header = magic + rest
+
+        wrapped_key = rest[:key_size]
+        self._nonce = rest[key_size:-4]
+        (self.chunk_size,) = struct.unpack('>I', rest[-4:])
+        if self.chunk_size > MAX_CHUNK_SIZE:
+            raise rsa.pkcs1.DecryptionError('Decryption failed')
+
+        session_key = unwrap(wrapped_key, priv_key)
+        if len(session_key) != SESSION_KEY_SIZE:
+            raise rsa.pkcs1.DecryptionError('Decryption failed')
+        if magic == MAGIC:
+            self._aesgcm = envelope.AESGCM(session_key)
+        else:
+            self._aesgcm = None
+            self._enc_key, self._mac_key = derive_keys(session_key)
+
+    def _open_frame(self, frame_nonce, frame):
+        if self._aesgcm is not None:
+            try:
+                return self._aesgcm.decrypt(frame_nonce, frame, self._header)
+            except envelope.InvalidTag:
+                raise rsa.pkcs1.DecryptionError('Decryption failed')
+
+        body, tag = frame[:-self._tag_size], frame[-self._tag_size:]
+        expected = hmac.new(self._mac_key, frame_nonce + body, hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, tag):
+            raise rsa.pkcs1.DecryptionError('Decryption failed')
+        return keystream_xor(self._enc_key, frame_nonce, body)
+
+    def chunks(self):
+        """Yield plaintext chunks, raising DecryptionError on any tampering"""
+        index = 0
+        while True:
+            prefix = _read_exactly(self._read, 4)
+            if len(prefix) < 4:
+                # The stream ended before the final frame
+                raise rsa.pkcs1.DecryptionError('Decryption failed')
+            (length,) = struct.unpack('>I', prefix)
+            final = bool(length & _FINAL_FLAG)
+            length &= ~_FINAL_FLAG
+            if length > self.chunk_size:
+                raise rsa.pkcs1.DecryptionError('Decryption failed')
+
+            frame = _read_exactly(self._read, length + self._tag_size)
+            if len(frame) < length + self._tag_size:
+                raise rsa.pkcs1.DecryptionError('Decryption failed')
+            yield self._open_frame(_frame_nonce(self._nonce, index, final), frame)
+
+            if final:
+                return
+            index += 1
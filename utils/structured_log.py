@@ -0,0 +1,131 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+def parse_levels(spec):
+    """Parse a 'encrypt=DEBUG,decrypt=WARNING' style spec into {name: level}"""
+    levels = {}
+    for item in spec.split(','):
+        if item.strip():
+            name, level = item.split('=')
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line
+
+    Fields passed with ``extra=`` are included as top-level keys.
+    """
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class LogListener:
+    """Drains the log queue on a QueueListener thread in the current process
+
+    The process that started the thread is remembered, so a forked child,
+    which inherits this object but not the thread, starts its own.
+    """
+
+    def __init__(self, log_queue, handlers):
+        self.queue = log_queue
+        self.handlers = handlers
+        self._listener = None
+        self._pid = None
+
+    @property
+    def running(self):
+        return self._pid == os.getpid()
+
+    def start(self):
+        """Start draining the queue unless this process already does"""
+        if self.running:
+            return
+        self._listener = logging.handlers.QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+        self._listener.start()
+        self._pid = os.getpid()
+
+    def stop(self):
+        """Flush queued records and stop this process's listener thread"""
+        if self.running:
+            self._listener.stop()
+            self._pid = None
+
+
+def setup_logging(path='app.log', level='INFO', max_bytes=10 * 1024 * 1024, backup_count=5,
+                  rotate_when=None, route_levels=None, console=True):
+    """Route all logging through a queue drained by a background thread
+
+    Request threads only enqueue records; formatting and file/console I/O
+    happen on the listener thread. The log file rotates by size, or by time
+    when ``rotate_when`` is set (e.g. 'midnight'); an empty ``path``
+    disables the file and logs to the console only. ``route_levels`` maps
+    route names to levels for their ``app.routes.<name>`` loggers.
+    Returns the started LogListener.
+    """
+    handlers = []
+    if not path:
+        console = True
+    elif rotate_when:
+        handlers.append(logging.handlers.TimedRotatingFileHandler(
+            path, when=rotate_when, backupCount=backup_count, encoding='utf-8'))
+    else:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'))
+    if console:
+        handlers.append(logging.StreamHandler(sys.stdout))
+    formatter = JsonFormatter()
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    listener = LogListener(log_queue, handlers)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+    for name, route_level in (route_levels or {}).items():
+        route_logger(name).setLevel(route_level)
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def ensure_listener(listener):
+    """Restart a LogListener whose thread did not survive a fork
+
+    Servers that import the app before forking workers leave each worker
+    with the listener object but no thread draining the queue.
+    """
+    listener.start()
+
+
+def route_logger(name):
+    """Return the logger for a route, configurable per route"""
+    return logging.getLogger(f'app.routes.{name}')
@@ -0,0 +1,71 @@
+import base64
+import binascii
+
+from utils import emoji_codec
+
+BINARY_MIMETYPE = 'application/octet-stream'
+JSON_MIMETYPE = 'application/json'
+
+# Text encodings that fit in a JSON or form field
+TEXT_FORMATS = ('emoji', 'base64')
+FORMATS = TEXT_FORMATS + ('binary',)
+
+
+def encode_ciphertext(data, fmt):
+    """Encode ciphertext bytes as an emoji or base64url string"""
+    if fmt == 'base64':
+        return base64.urlsafe_b64encode(data).decode('ascii')
+    return emoji_codec.encode(data)
+
+
+def decode_ciphertext(text, fmt):
+    """Decode an emoji or base64url string, raising ValueError if malformed"""
+    if fmt == 'base64':
+        text = ''.join(text.split())
+        try:
+            # Accept both padded and unpadded base64url
+            return base64.b64decode(text + '=' * (-len(text) % 4), altchars=b'-_', validate=True)
+        except (binascii.Error, ValueError) as e:
+            raise ValueError(str(e)) from None
+    return emoji_codec.decode(text)
+
+
+def is_binary_body(request):
+    """Check whether the request body is raw bytes rather than fields"""
+    return request.mimetype == BINARY_MIMETYPE
+
+
+def accepts_binary(request):
+    """Check whether the client prefers a raw octet-stream response"""
+    best = request.accept_mimetypes.best_match([JSON_MIMETYPE, BINARY_MIMETYPE])
+    return best == BINARY_MIMETYPE
+
+
+def output_format(request, data):
+    """Pick the ciphertext format for a response
+
+    An explicit ``format`` field or query parameter wins, otherwise an
+    Accept header preferring application/octet-stream selects raw bytes.
+    Returns (format, error).
+    """
+    fmt = data.get('format')
+    if fmt is None:
+        return ('binary' if accepts_binary(request) else 'emoji'), None
+    if fmt not in FORMATS:
+        return None, f"Format must be one of: {', '.join(FORMATS)}"
+    return fmt, None
+
+
+def input_format(request, data):
+    """Pick the format of the ciphertext sent in a request
+
+    A Content-Type of application/octet-stream means the body itself is the
+    ciphertext, otherwise the ``format`` field names the text encoding.
+    Returns (format, error).
+    """
+    if is_binary_body(request):
+        return 'binary', None
+    fmt = data.get('format', 'emoji')
+    if fmt not in TEXT_FORMATS:
+        return None, f"Format must be one of: {', '.join(TEXT_FORMATS)}"
+    return fmt, None
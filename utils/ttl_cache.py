@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after a time-to-live
+
+    Expired entries are dropped lazily when they are looked up or when the
+    cache needs room. ``on_evict(key, value)`` is called with the internal
+    lock held whenever an entry leaves the cache for any reason other than
+    an explicit ``pop``, so it must not call back into the cache.
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600, on_evict=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._on_evict = on_evict
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def _drop(self, key):
+        _, value = self._data.pop(key)
+        if self._on_evict is not None:
+            self._on_evict(key, value)
+
+    def get(self, key, default=None):
+        """Return the cached value and mark it as recently used"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            if item[0] <= time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def peek(self, key, default=None):
+        """Return a live value without touching LRU order or counters"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= time.monotonic():
+                return default
+            return item[1]
+
+    def set(self, key, value, ttl=None):
+        """Insert or replace a value, restarting its time-to-live"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            self._data[key] = (expires_at, value)
+            while len(self._data) > self.max_entries:
+                oldest = next(iter(self._data))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        """Remove a value without counting it as an eviction"""
+        with self._lock:
+            item = self._data.pop(key, None)
+            return default if item is None else item[1]
+
+    def purge_expired(self):
+        """Drop every expired entry and return how many were removed"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, (expires_at, _) in self._data.items() if expires_at <= now]
+            for key in expired:
+                self._drop(key)
+            self.expirations += len(expired)
+            return len(expired)
+
+    def stats(self):
+        """Return counters suitable for sizing the cache"""
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
@@ -0,0 +1,134 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class PoolSaturated(Exception):
+    """Raised when every worker slot and queue slot is already taken"""
+
+    def __init__(self, retry_after=1):
+        super().__init__('Worker pool is saturated')
+        self.retry_after = retry_after
+
+
+class CryptoWorkerPool:
+    """Bounded process pool for CPU-heavy private-key operations
+
+    rsa does its modular exponentiation in pure Python and holds the GIL
+    while doing so; running it in worker processes lets throughput scale
+    with cores. At most ``max_pending`` calls may be queued or running at
+    once, beyond that run() raises PoolSaturated instead of queueing.
+    With ``workers=0`` calls run inline in the calling thread.
+    """
+
+    def __init__(self, workers=None, max_pending=None, retry_after=1):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending or max(self.workers, 1) * 4
+        self.retry_after = retry_after
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Forking this multithreaded server could leave children
+                # stuck on locks other threads held at fork time
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('forkserver'))
+            return self._executor
+
+    def _reset_executor(self, broken):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _acquire(self, count=1):
+        """Take count slots at once, or raise PoolSaturated and take none"""
+        with self._lock:
+            if self._in_flight + count > self.max_pending:
+                self.rejected += 1
+                raise PoolSaturated(self.retry_after)
+            self._in_flight += count
+
+    def _release_slots(self, count=1):
+        with self._lock:
+            self._in_flight -= count
+
+    def _release(self, future):
+        with self._lock:
+            self.completed += 1
+            self._in_flight -= 1
+
+    def _submit(self, fn, args):
+        # Caller holds a slot, which is released when the call completes
+        executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool for this and later calls
+            self._reset_executor(executor)
+            try:
+                future = self._get_executor().submit(fn, *args)
+            except BaseException:
+                self._release_slots()
+                raise
+        except BaseException:
+            self._release_slots()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def run(self, fn, *args):
+        """Run fn(*args) on the pool and wait for its result"""
+        if self.workers == 0:
+            return fn(*args)
+
+        self._acquire()
+        return self._submit(fn, args).result()
+
+    def run_all(self, fn, arg_tuples):
+        """Run fn(*args) for each args tuple in parallel, returning results in order
+
+        Slots for every call are taken up front, so either all calls run or
+        PoolSaturated is raised and none do.
+        """
+        if self.workers == 0:
+            return [fn(*args) for args in arg_tuples]
+
+        self._acquire(len(arg_tuples))
+        futures = []
+        try:
+            for args in arg_tuples:
+                futures.append(self._submit(fn, args))
+        except BaseException:
+            # Slots of calls that were never submitted
+            self._release_slots(len(arg_tuples) - len(futures) - 1)
+            raise
+        return [future.result() for future in futures]
+
+    def available(self):
+        """Return the number of calls that could be started right now"""
+        with self._lock:
+            return self.max_pending - self._in_flight
+
+    def shutdown(self, wait=True):
+        """Stop the worker processes"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'in_flight': self._in_flight,
+            'completed': self.completed,
+            'rejected': self.rejected,
+        }